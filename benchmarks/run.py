@@ -0,0 +1,169 @@
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+from economics.auctions import create_auctions, perform_auctions
+from economics.clearing import vector_auction, vector_perform, order_auctions, perform_orders
+from economics.table import Orders
+from benchmarks.scenarios import SCENARIOS, QUICK_SCENARIOS, create_scenario
+
+# time every phase of Economy.single_cycle on synthetic economies of several sizes
+# every scenario runs in its own process so that the peak memory is for that scenario alone
+# run from the top of the repo with: python -m benchmarks.run --output results.json
+# and compare two runs with: python -m benchmarks.run --compare old.json new.json
+
+PHASES = ['update_producers', 'produce', 'get_all_buys', 'get_all_sells', 'create_auctions', 'clearing',
+          'update_history', 'post_cycle']
+
+# for each engine, the function given to the economy and the function that clears grouped auctions
+ENGINES = {
+    'python': (None, perform_auctions),
+    'vector': (vector_auction, vector_perform),
+}
+
+
+def timed_cycle(economy, perform, timings):
+    start = time.perf_counter()
+    economy.update_producers()
+    mark = time.perf_counter()
+    timings['update_producers'] += mark - start
+    economy.produce()
+    start, mark = mark, time.perf_counter()
+    timings['produce'] += mark - start
+    buys = economy.get_all_buys()
+    start, mark = mark, time.perf_counter()
+    timings['get_all_buys'] += mark - start
+    sells = economy.get_all_sells()
+    start, mark = mark, time.perf_counter()
+    timings['get_all_sells'] += mark - start
+    # a table cleared with arrays gives its orders as arrays, and they are never made into offers
+    if isinstance(sells, Orders):
+        auctions = order_auctions(economy.table, sells, buys, economy.auctions)
+    else:
+        auctions = create_auctions(sells, buys, economy.auctions)
+    start, mark = mark, time.perf_counter()
+    timings['create_auctions'] += mark - start
+    if isinstance(sells, Orders):
+        all_auctions = perform_orders(economy.table, auctions)
+    else:
+        all_auctions = perform(auctions)
+    start, mark = mark, time.perf_counter()
+    timings['clearing'] += mark - start
+    economy.update_history(all_auctions)
+    start, mark = mark, time.perf_counter()
+    timings['update_history'] += mark - start
+    economy.post_cycle()
+    start, mark = mark, time.perf_counter()
+    timings['post_cycle'] += mark - start
+    return len(buys) + len(sells), sum([len(x.transactions) for x in all_auctions])
+
+
+def run_scenario(name, engine, vectorized, cycles=None):
+    scenario = SCENARIOS[name]
+    if cycles is None:
+        cycles = scenario.cycles
+    options = {'vectorized': vectorized}
+    if ENGINES[engine][0] is not None:
+        options['engine'] = ENGINES[engine][0]
+    start = time.perf_counter()
+    economy = create_scenario(scenario, **options)
+    load_time = time.perf_counter() - start
+    timings = {x: 0.0 for x in PHASES}
+    offers = 0
+    fills = 0
+    for _ in range(cycles):
+        cycle_offers, cycle_fills = timed_cycle(economy, ENGINES[engine][1], timings)
+        offers += cycle_offers
+        fills += cycle_fills
+    total = sum(timings.values())
+    return {'scenario': name,
+            'engine': engine,
+            'vectorized': vectorized,
+            'producers': scenario.producers,
+            'products': scenario.products,
+            'cycles': cycles,
+            'load_seconds': load_time,
+            'phase_seconds': timings,
+            'cycle_seconds': total / cycles,
+            'producer_cycles_per_second': scenario.producers * cycles / total,
+            'offers_per_second': offers / total,
+            'fills_per_second': fills / total,
+            # on linux this is in kilobytes
+            'peak_memory_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+def run_in_process(name, engine, vectorized, cycles):
+    command = [sys.executable, '-m', 'benchmarks.run', '--child', name, '--engine', engine]
+    if vectorized:
+        command.append('--vectorized')
+    if cycles is not None:
+        command.extend(['--cycles', str(cycles)])
+    result = subprocess.run(command, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+
+def print_result(result):
+    backend = 'table' if result['vectorized'] else 'objects'
+    print(f"{result['scenario']} ({result['producers']} producers, {result['products']} products, "
+          f"{result['engine']} engine, {backend}): {result['cycle_seconds'] * 1000:.1f}ms per cycle, "
+          f"{result['producer_cycles_per_second']:.0f} producer cycles/s, "
+          f"peak {result['peak_memory_mb']:.0f}MB")
+    for phase in PHASES:
+        print(f"    {phase}: {result['phase_seconds'][phase] / result['cycles'] * 1000:.2f}ms")
+
+
+def compare(old_filepath, new_filepath):
+    with open(old_filepath) as old_file:
+        old = {(x['scenario'], x['engine'], x['vectorized']): x for x in json.load(old_file)['results']}
+    with open(new_filepath) as new_file:
+        new = json.load(new_file)['results']
+    for result in new:
+        key = (result['scenario'], result['engine'], result['vectorized'])
+        if key not in old:
+            continue
+        ratio = result['cycle_seconds'] / old[key]['cycle_seconds']
+        print(f'{key[0]} {key[1]} {"table" if key[2] else "objects"}: {ratio:.2f}x the time of the old run')
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Benchmark the phases of an economy cycle')
+    parser.add_argument('scenarios', nargs='*', help=f'any of {", ".join(SCENARIOS)}')
+    parser.add_argument('--engine', choices=list(ENGINES), action='append', help='the auction engines to use')
+    parser.add_argument('--vectorized', action='store_true', help='only use a ProducerTable')
+    parser.add_argument('--objects', action='store_true', help='only use Producer objects')
+    parser.add_argument('--cycles', type=int, help='cycles to run instead of the scenario default')
+    parser.add_argument('--output', help='save the results to this json file')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two saved results')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    options = parser.parse_args(args)
+    if options.compare is not None:
+        compare(*options.compare)
+        return
+    engines = options.engine or list(ENGINES)
+    if options.child is not None:
+        print(json.dumps(run_scenario(options.child, engines[0], options.vectorized, options.cycles)))
+        return
+    backends = [False, True]
+    if options.vectorized:
+        backends = [True]
+    elif options.objects:
+        backends = [False]
+    results = []
+    for name in options.scenarios or QUICK_SCENARIOS:
+        for engine in engines:
+            for vectorized in backends:
+                result = run_in_process(name, engine, vectorized, options.cycles)
+                print_result(result)
+                results.append(result)
+    if options.output is not None:
+        with open(options.output, 'w') as output_file:
+            json.dump({'time': time.time(), 'python': platform.python_version(), 'results': results},
+                      output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+import random
+
+from economics.loader import create_economy
+
+# synthetic economies for benchmarking, built as config data in the same format as examples/*.json
+# products form chains: every product needs labor and up to two products made before it
+# with depth set, every product needs the one before it, so the chain is that many products deep
+
+
+class Scenario:
+    def __init__(self, name, producers, products, depth=None, cycles=5):
+        self.name = name
+        self.producers = producers
+        self.products = products
+        self.depth = depth
+        self.cycles = cycles
+
+
+SCENARIOS = {x.name: x for x in [
+    Scenario('small', 1000, 10),
+    Scenario('wide', 1000, 1000),
+    Scenario('deep', 10000, 50, depth=50),
+    Scenario('medium', 100000, 10),
+    Scenario('large', 1000000, 10, cycles=3),
+]}
+
+# the scenarios run when none are asked for; the others take minutes and gigabytes
+QUICK_SCENARIOS = ['small', 'wide', 'deep']
+
+
+def product_names(total):
+    return ['labor', 'food'] + [f'product{x}' for x in range(total - 2)]
+
+
+def synthetic_config(producers, products, depth=None, seed=0):
+    rng = random.Random(seed)
+    names = product_names(max(products, 2))
+    product_data = [{'name': 'labor'}, {'name': 'food', 'requires': [{'labor': 1}]}]
+    for index, name in enumerate(names[2:], start=2):
+        requires = [{'labor': rng.randint(1, 3)}]
+        if depth is not None:
+            requires.append({names[index - 1]: 1})
+        else:
+            for required in rng.sample(names[1:index], min(2, index - 1)):
+                requires.append({required: rng.randint(1, 2)})
+        product_data.append({'name': name, 'requires': requires})
+    producer_data = []
+    for index in range(producers):
+        product = product_data[1 + index % (len(product_data) - 1)]
+        # enough stock to make a few units
+        stock = {}
+        for requirement in product['requires']:
+            for name, quantity in requirement.items():
+                stock[name] = quantity * rng.randint(2, 10)
+        producer_data.append({'product': product['name'], 'money': rng.randint(10, 100), 'stock': stock})
+    return {'workers': {'total': producers * 5, 'money': producers * 10},
+            'products': product_data,
+            'producers': producer_data}
+
+
+def create_scenario(scenario, seed=0, **options):
+    data = synthetic_config(scenario.producers, scenario.products, scenario.depth, seed)
+    return create_economy(data, **options)
@@ -0,0 +1,56 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# measure how long it takes to import the simulation, in a fresh interpreter every time
+# and check that the modules only some runs need are not imported with it
+# run from the top of the repo with: python -m benchmarks.startup
+# the exit status is 1 if any of those modules were imported
+
+MODULES = ['economics.economy', 'economics.loader']
+REPEATS = 10
+
+# imported when first used, by the graphs, checkpoints, fast forwarding and the vectorized engines
+DEFERRED = ['matplotlib', 'economics.reporting', 'economics.checkpoint', 'economics.clearing',
+            'economics.fastforward']
+
+TIMING_CODE = '''
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, [x for x in {deferred} if x in sys.modules]]))
+'''
+
+
+def time_import(module):
+    # the seconds taken, and the deferred modules that were imported
+    code = TIMING_CODE.format(module=module, deferred=DEFERRED)
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    elapsed, loaded = json.loads(result.stdout)
+    return elapsed, loaded
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Time the import of the simulation modules')
+    parser.add_argument('--repeats', type=int, default=REPEATS)
+    options = parser.parse_args(args)
+    status = 0
+    for module in MODULES:
+        timings = []
+        loaded = set()
+        for _ in range(options.repeats):
+            elapsed, imported = time_import(module)
+            timings.append(elapsed)
+            loaded.update(imported)
+        print(f'{module}: median {statistics.median(timings) * 1000:.1f}ms, '
+              f'min {min(timings) * 1000:.1f}ms, imported too soon: {sorted(loaded) or "none"}')
+        if len(loaded) > 0:
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,178 @@
+import json
+import os
+
+import numpy as np
+
+from economics.history import STAT_FIELDS
+from economics.eventlog import EventLogReader
+
+# a saved history is a directory of .npy arrays, one per statistic, indexed by [cycle, product]
+# with the money and stock of every producer as well when they were recorded:
+#     meta.json      first cycle, number of cycles, product ids and names, producer ids
+#     <field>.npy    every field in STAT_FIELDS, and traded.npy
+#     money.npy      [cycle, producer], only if producers were recorded
+#     stock.npy      [cycle, producer, product], likewise
+# save_history writes the history held by an economy, and convert_event_log the whole of an event log
+# HistoryReader maps the arrays, so a series is a view onto the file and nothing is read until it is used
+
+META_FILE = 'meta.json'
+DOWNSAMPLE_METHODS = ['mean', 'min', 'max', 'last']
+
+
+def write_meta(directory, first_cycle, cycles, product_ids, names, producer_ids=None):
+    meta = {'first_cycle': int(first_cycle),
+            'cycles': int(cycles),
+            'product_ids': [int(x) for x in product_ids],
+            'product_names': [names.get(x, str(x)) for x in product_ids],
+            'producer_ids': None if producer_ids is None else [int(x) for x in producer_ids]}
+    with open(os.path.join(directory, META_FILE), 'w') as meta_file:
+        json.dump(meta, meta_file)
+
+
+def save_history(economy, directory):
+    # save the cycles held by economy.history, oldest first
+    os.makedirs(directory, exist_ok=True)
+    history = economy.history
+    columns = history.columns
+    first_cycle = history.total_cycles - len(columns)
+    rows = [columns.row(x) for x in range(first_cycle, history.total_cycles)]
+    product_ids = list(columns.columns.keys())
+    width = len(product_ids)
+    for field in STAT_FIELDS:
+        np.save(os.path.join(directory, f'{field}.npy'), columns.data[field][rows, :width])
+    np.save(os.path.join(directory, 'traded.npy'), columns.traded[rows, :width])
+    names = {x.id: x.name for x in economy.products}
+    write_meta(directory, first_cycle, len(rows), product_ids, names)
+
+
+def convert_event_log(log_path, directory, names=None):
+    # write every cycle of an event log as a saved history, one chunk at a time
+    # names is {product_id: name}, as the log itself only holds ids
+    os.makedirs(directory, exist_ok=True)
+    if names is None:
+        names = {}
+    log = EventLogReader(log_path)
+    chunks = [log.chunk(x) for x in range(len(log.index))]
+    first_cycle = int(log.index[0, 0]) if len(chunks) > 0 else 0
+    cycles = len(log)
+    snapshots = len(chunks) > 0 and 'money' in chunks[0]
+    if snapshots:
+        # the stock columns are in this order, so the statistics use it too
+        product_ids = chunks[0]['product_ids'].tolist()
+    else:
+        product_ids = sorted(set(np.concatenate([x['stat_product'] for x in chunks] + [[]]).astype(int).tolist()))
+    lookup = {x: i for i, x in enumerate(product_ids)}
+    arrays = {}
+    for field in STAT_FIELDS:
+        arrays[field] = np.lib.format.open_memmap(os.path.join(directory, f'{field}.npy'), mode='w+',
+                                                  dtype=np.float64, shape=(cycles, len(product_ids)))
+    arrays['traded'] = np.lib.format.open_memmap(os.path.join(directory, 'traded.npy'), mode='w+',
+                                                 dtype=bool, shape=(cycles, len(product_ids)))
+    producer_ids = None
+    if snapshots:
+        producer_ids = chunks[0]['producer_ids'].tolist()
+        arrays['money'] = np.lib.format.open_memmap(os.path.join(directory, 'money.npy'), mode='w+',
+                                                    dtype=np.float64, shape=(cycles, len(producer_ids)))
+        arrays['stock'] = np.lib.format.open_memmap(os.path.join(directory, 'stock.npy'), mode='w+',
+                                                    dtype=np.float64,
+                                                    shape=(cycles, len(producer_ids), len(product_ids)))
+    for chunk in chunks:
+        rows = chunk['stat_cycle'] - first_cycle
+        columns = np.array([lookup[x] for x in chunk['stat_product'].tolist()], dtype=np.int64)
+        for field in STAT_FIELDS:
+            arrays[field][rows, columns] = chunk[f'stat_{field}']
+        arrays['traded'][rows, columns] = True
+        if snapshots:
+            rows = chunk['cycles'] - first_cycle
+            arrays['money'][rows] = chunk['money']
+            arrays['stock'][rows] = chunk['stock']
+    for array in arrays.values():
+        array.flush()
+    write_meta(directory, first_cycle, cycles, product_ids, names, producer_ids)
+
+
+def downsample(values, points, method='mean', first_cycle=0, cycles=None):
+    # reduce a series to about points values, each from a bucket of cycles
+    # returns (cycles, values), where cycles is the first cycle of each bucket
+    # cycles can give the cycle of every value, for a series that is not one value per cycle
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f'Error: Unknown downsample method {method}, expected one of {DOWNSAMPLE_METHODS}')
+    if points is not None and points < 1:
+        raise ValueError(f'Error: Cannot downsample to {points} points, expected at least 1')
+    total = len(values)
+    if cycles is None:
+        cycles = np.arange(first_cycle, first_cycle + total)
+    if points is None or total <= points:
+        return np.asarray(cycles), np.asarray(values)
+    bucket = -(-total // points)
+    starts = np.arange(0, total, bucket)
+    if method == 'last':
+        ends = np.minimum(starts + bucket, total) - 1
+        return cycles[starts], np.asarray(values[ends])
+    reduce = {'mean': np.add, 'min': np.minimum, 'max': np.maximum}[method]
+    reduced = reduce.reduceat(np.asarray(values), starts)
+    if method == 'mean':
+        reduced = reduced / np.diff(np.append(starts, total))
+    return cycles[starts], reduced
+
+
+class HistoryReader:
+    # read a history saved by save_history or convert_event_log
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE)) as meta_file:
+            meta = json.load(meta_file)
+        self.first_cycle = meta['first_cycle']
+        self.total_cycles = meta['first_cycle'] + meta['cycles']
+        self.columns = {x: i for i, x in enumerate(meta['product_ids'])}
+        self.names = dict(zip(meta['product_ids'], meta['product_names']))
+        self.producers = None
+        if meta['producer_ids'] is not None:
+            self.producers = {x: i for i, x in enumerate(meta['producer_ids'])}
+        # the arrays are only mapped when they are first used
+        self.arrays = {}
+
+    def __len__(self):
+        return self.total_cycles - self.first_cycle
+
+    def array(self, name):
+        if name not in self.arrays:
+            self.arrays[name] = np.load(os.path.join(self.directory, f'{name}.npy'), mmap_mode='r')
+        return self.arrays[name]
+
+    def product_ids(self):
+        return list(self.columns.keys())
+
+    def product_name(self, product_id):
+        return self.names[product_id]
+
+    def cycles(self):
+        return np.arange(self.first_cycle, self.total_cycles)
+
+    def series(self, product_id, field, last=None):
+        # the same as History.series, but a view onto the file
+        start = 0
+        if last is not None:
+            start = max(len(self) - last, 0)
+        if product_id not in self.columns:
+            return np.zeros(len(self) - start)
+        return self.array(field)[start:, self.columns[product_id]]
+
+    def full_series(self, product_id, field):
+        # (cycles, values), as History.full_series
+        return self.cycles(), self.series(product_id, field)
+
+    def traded(self, product_id):
+        return self.array('traded')[:, self.columns[product_id]]
+
+    def producer_series(self, producer_id, product_id=None):
+        # the money of a producer in every cycle, or the stock of product_id if it is given
+        if self.producers is None:
+            raise ValueError(f'Error: {self.directory} has no producer records')
+        row = self.producers[producer_id]
+        if product_id is None:
+            return self.array('money')[:, row]
+        return self.array('stock')[:, row, self.columns[product_id]]
+
+    def downsampled(self, product_id, field, points, method='mean'):
+        return downsample(self.series(product_id, field), points, method, self.first_cycle)
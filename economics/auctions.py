@@ -1,34 +1,142 @@
-from economics.offers import Transaction
+import numpy as np
+
+from economics.offers import Transaction, Transactions
 from economics.producer import BuyResult, SellResult
 
 
+class OrderBook:
+    # holds the offers for a single product in price priority
+    # sells are sorted by lowest ask, buys by highest bid
+    # rather than popping from the front of a list (which is O(n) each time),
+    # we walk a cursor along each side, so matching is O(n log n) in total
+    # the offers themselves are never changed; the book tracks the running totals of each side instead
+    # an offer is used up when the volume filled reaches the running total at its end, so a fill is always
+    # the step from one end to the next, which is exactly how economics.clearing finds the fills
+    # with fractional quantities the two sides can end a rounding error apart, which leaves a tiny last fill
+    def __init__(self):
+        self.sells = []
+        self.buys = []
+        self.sell_index = 0
+        self.buy_index = 0
+        # the running totals up to the end of the best sell and buy, and the volume filled so far
+        self.sell_end = 0.0
+        self.buy_end = 0.0
+        self.filled = 0.0
+
+    def load(self, sells, buys):
+        # the sorts are stable, so offers at the same price keep the order they were made in,
+        # which is the order of the producers; reversing the buys puts the last made first
+        # economics.clearing breaks ties in exactly the same way
+        self.sells = sorted(sells, key=lambda offer: offer.cost_per_unit)
+        self.buys = sorted(buys, key=lambda buy: buy.max_price)
+        self.buys.reverse()
+        self.sell_index = -1
+        self.buy_index = -1
+        self.sell_end = 0.0
+        self.buy_end = 0.0
+        self.filled = 0.0
+        self.pop_sell()
+        self.pop_buy()
+
+    def clear(self):
+        self.load([], [])
+
+    @property
+    def best_sell(self):
+        if self.sell_index < len(self.sells):
+            return self.sells[self.sell_index]
+
+    @property
+    def best_buy(self):
+        if self.buy_index < len(self.buys):
+            return self.buys[self.buy_index]
+
+    @property
+    def crossed(self):
+        # true if the highest bid can meet the lowest ask
+        sell = self.best_sell
+        buy = self.best_buy
+        if sell is None or buy is None:
+            return False
+        return buy.max_price >= sell.cost_per_unit
+
+    def pop_sell(self):
+        self.sell_index += 1
+        if self.sell_index < len(self.sells):
+            self.sell_end += self.sells[self.sell_index].total_offered
+
+    def pop_buy(self):
+        self.buy_index += 1
+        if self.buy_index < len(self.buys):
+            self.buy_end += self.buys[self.buy_index].total_wanted
+
+    def fill(self):
+        # fill the best sell and buy up to the nearer of their ends, move on from any that are done,
+        # and return the quantity filled
+        end = min(self.sell_end, self.buy_end)
+        quantity = end - self.filled
+        self.filled = end
+        if self.sell_end == end:
+            self.pop_sell()
+        if self.buy_end == end:
+            self.pop_buy()
+        return quantity
+
+    def unsold_volume(self):
+        # the volume offered that was not filled, as the running total of all sells less the volume filled
+        return sum([x.total_offered for x in self.sells]) - self.filled
+
+    def unbought_volume(self):
+        return sum([x.total_wanted for x in self.buys]) - self.filled
+
+
 class SingleAuction:
     def __init__(self, product_id):
         self.product_id = product_id
         self.sells = []
         self.buys = []
+        self.book = OrderBook()
         self.transactions = []
         # keep a list of goods that were not sold, and orders unfilled
         self.unsold = 0
         self.unfilled_orders = 0
 
+    def reset(self):
+        # prepare the auction to be used again in the next cycle
+        # new lists are made so that results handed out last cycle are unchanged
+        self.sells = []
+        self.buys = []
+        self.book.clear()
+        self.transactions = []
+        self.unsold = 0
+        self.unfilled_orders = 0
+
+    def fill_arrays(self):
+        # the (quantity, price) of every fill, as arrays
+        if isinstance(self.transactions, Transactions):
+            return self.transactions.quantity, self.transactions.price
+        quantity = np.fromiter((x.quantity for x in self.transactions), dtype=np.float64, count=len(self.transactions))
+        price = np.fromiter((x.price for x in self.transactions), dtype=np.float64, count=len(self.transactions))
+        return quantity, price
+
+    @property
+    def has_orders(self):
+        return len(self.sells) > 0 or len(self.buys) > 0
+
     @property
     def valid(self):
         # are there at least >1 buy and sell offers?
         return not (len(self.sells) == 0 or len(self.buys) == 0)
 
-    def do_transaction(self, sell, buy):
+    def do_transaction(self, sell, buy, quantity_sold):
         # buyer will buy as many as they can at this price
         # The unit cost of the product is equal to the (sell cost + buy price) / 2.0
-        quantity_sold = max(buy.total_wanted, sell.total_offered)
         unit_cost = (sell.cost_per_unit + buy.max_price) / 2.0
         total_cost = unit_cost * quantity_sold
         sell.seller.money += total_cost
         buy.buyer.money -= total_cost
         buy.buyer.add_stock(buy.product_id, quantity_sold)
         sell.seller.remove_stock(buy.product_id, quantity_sold)
-        sell.total_offered -= quantity_sold
-        buy.total_wanted -= quantity_sold
         # the 2 producers here will need some signals about their sales
         sell.seller.add_sale(SellResult(sell.cost_per_unit, unit_cost, quantity_sold, buy.product_id))
         buy.buyer.add_purchase(BuyResult(buy.max_price, unit_cost, quantity_sold, buy.product_id))
@@ -37,32 +145,29 @@ class SingleAuction:
     def perform(self):
         if not self.valid:
             return
-        # sort buys by highest bid and sells by lowest ask
-        self.sells = sorted(self.sells, key=lambda offer: offer.cost_per_unit)
-        self.buys = sorted(self.buys, key=lambda buy: buy.max_price)
-        self.buys.reverse()
+        book = self.book
+        book.load(self.sells, self.buys)
         # continue until no more buys or sells for this product
-        while len(self.buys) > 0 and len(self.sells) > 0:
-            if self.buys[0].max_price >= self.sells[0].cost_per_unit:
-                self.do_transaction(self.sells[0], self.buys[0])
-            else:
-                # max price offered is lower than the smallest ask price; we stop here
-                # this means that there is at least ONE order that was unfulfilled
-                break
-            # check if the current buy or sell is done
-            if self.sells[0].total_offered == 0:
-                self.sells.pop(0)
-            if self.buys[0].total_wanted == 0:
-                self.buys.pop(0)
+        # if the max price offered is lower than the smallest ask price we stop here
+        # this means that there is at least ONE order that was unfulfilled
+        while book.crossed:
+            sell = book.best_sell
+            buy = book.best_buy
+            self.do_transaction(sell, buy, book.fill())
         # calculate unfilled and unsold orders by volume
-        self.unsold = sum([x.total_wanted for x in self.buys])
-        self.unfilled_orders = sum([x.total_offered for x in self.sells])
+        self.unsold = book.unbought_volume()
+        self.unfilled_orders = book.unsold_volume()
 
 
-def create_auctions(sells, buys):
+def create_auctions(sells, buys, auctions=None):
     # organise an auction to match sellers with buyers
     # the auction is separate for each different type of product, so first match these
-    auctions = {}
+    # passing the auctions from the last cycle lets us reuse them instead of building new ones
+    if auctions is None:
+        auctions = {}
+    else:
+        for single_auction in auctions.values():
+            single_auction.reset()
     for sell_order in sells:
         if sell_order.product_id in auctions:
             auctions[sell_order.product_id].sells.append(sell_order)
@@ -81,10 +186,18 @@ def create_auctions(sells, buys):
     return auctions
 
 
-def auction(sells, buys):
-    auctions = create_auctions(sells, buys)
+def perform_auctions(auctions):
+    # clear the auctions made by create_auctions
     all_auctions = []
     for _, single_auction in auctions.items():
+        # a reused auction may have no orders this cycle
+        if not single_auction.has_orders:
+            continue
         single_auction.perform()
         all_auctions.append(single_auction)
     return all_auctions
+
+
+def auction(sells, buys, auctions=None):
+    auctions = create_auctions(sells, buys, auctions)
+    return perform_auctions(auctions)
@@ -0,0 +1,268 @@
+import numpy as np
+
+from economics.clearing import clear_segments
+from economics.heuristics import pricing_state
+from economics.history import History, ColumnStore, STAT_FIELDS
+from economics.loader import create_economy
+from economics.table import ProducerTable, TABLE_ARRAYS
+
+# many small economies run together as one simulation
+# the economies must have the same products; their producers are stacked into one ProducerTable,
+# economy after economy, so production, clearing and the history of every economy are a few array updates
+# the auctions of every product in every economy are cleared in one call to clear_segments
+# the results are the same as running each economy on its own with a table and economics.clearing.vector_auction
+# producers do not keep a cycle history here, as nothing in a batch reads it
+# prices are left as they are, as the per-producer heuristic does, unless a heuristics.PricingEngine is given
+# BatchedEconomy.view(index) gives one economy back, with a History that answers the usual queries
+
+
+class BatchHistory:
+    # the product statistics of every economy, indexed by [cycle, economy, product column]
+    # as with ColumnStore, the arrays grow when full, or are a ring buffer if max_cycles is set
+    def __init__(self, economies, products, max_cycles=None, capacity=64):
+        self.max_cycles = max_cycles
+        if max_cycles is not None:
+            capacity = max_cycles
+        self.data = {x: np.zeros((capacity, economies, products)) for x in STAT_FIELDS}
+        self.traded = np.zeros((capacity, economies, products), dtype=bool)
+        self.total_cycles = 0
+
+    @property
+    def capacity(self):
+        return len(self.traded)
+
+    def __len__(self):
+        return min(self.total_cycles, self.capacity)
+
+    def row(self, cycle):
+        return cycle % self.capacity
+
+    def resize(self, rows):
+        for field in STAT_FIELDS:
+            data = np.zeros((rows,) + self.traded.shape[1:])
+            data[:self.capacity] = self.data[field]
+            self.data[field] = data
+        traded = np.zeros((rows,) + self.traded.shape[1:], dtype=bool)
+        traded[:self.capacity] = self.traded
+        self.traded = traded
+
+    def append(self, stats, traded):
+        # stats is {field: economies x products}
+        if self.max_cycles is None and self.total_cycles == self.capacity:
+            self.resize(self.capacity * 2)
+        row = self.row(self.total_cycles)
+        for field in STAT_FIELDS:
+            self.data[field][row] = stats[field]
+        self.traded[row] = traded
+        self.total_cycles += 1
+
+    def view(self, index, product_ids):
+        # a History for a single economy; its columns are views onto these arrays
+        # product_ids are the products that economy has auctioned, in the order they were first seen
+        history = History(self.max_cycles)
+        columns = ColumnStore(self.max_cycles)
+        columns.data = {x: self.data[x][:, index] for x in STAT_FIELDS}
+        columns.traded = self.traded[:, index]
+        columns.columns = product_ids
+        columns.total_cycles = self.total_cycles
+        history.columns = columns
+        return history
+
+
+class EconomyView:
+    # one economy of a batch; the arrays are views onto the rows of the batch table
+    def __init__(self, batch, index):
+        self.batch = batch
+        self.index = index
+        self.products = batch.products
+        self.rows = slice(index * batch.size, (index + 1) * batch.size)
+
+    @property
+    def history(self):
+        return self.batch.history_view(self.index)
+
+    @property
+    def ids(self):
+        return self.batch.table.ids[self.rows]
+
+    @property
+    def money(self):
+        return self.batch.table.money[self.rows]
+
+    @property
+    def sale_price(self):
+        return self.batch.table.sale_price[self.rows]
+
+    @property
+    def stock(self):
+        return self.batch.table.stock[self.rows]
+
+    def get_product(self, product_id):
+        return self.batch.get_product(product_id)
+
+
+def same_products(first, second):
+    names = [x.name for x in first.products] == [x.name for x in second.products]
+    return names and np.array_equal(first.requirements.coefficients, second.requirements.coefficients)
+
+
+class BatchedEconomy:
+    def __init__(self, economies, max_cycles=None, pricing=None):
+        # every economy needs the same products and the same number of producers
+        # the product ids of the first economy are used for all of them
+        if len(economies) == 0:
+            raise ValueError('Error: A batch needs at least one economy')
+        first = economies[0]
+        tables = []
+        for economy in economies:
+            if not same_products(first, economy):
+                raise ValueError('Error: The economies in a batch must have the same products')
+            table = economy.table
+            if table is None:
+                table = ProducerTable.from_producers(economy.products, economy.producers, economy.requirements)
+            tables.append(table)
+        if len(set([len(x) for x in tables])) != 1:
+            raise ValueError('Error: The economies in a batch must have the same number of producers')
+        self.products = first.products
+        self.requirements = first.requirements
+        self.size = len(tables[0])
+        self.table = ProducerTable(self.products, self.size * len(tables), self.requirements)
+        for name in TABLE_ARRAYS:
+            setattr(self.table, name, np.concatenate([getattr(x, name) for x in tables]))
+        # the economy of every row of the table
+        self.economy = np.repeat(np.arange(len(tables)), self.size)
+        self.history = BatchHistory(len(tables), len(self.products), max_cycles)
+        # the order in which each economy first auctioned each product, or -1 if it never has
+        # an Economy clears its auctions in this order, which decides the order money is added up in
+        self.auction_rank = np.full((len(tables), len(self.products)), -1, dtype=np.int64)
+        self.auction_count = np.zeros(len(tables), dtype=np.int64)
+        # the fills of the last cycle
+        self.fills = None
+        self.pricing = pricing
+
+    @classmethod
+    def from_configs(cls, configs, **options):
+        # configs are loaded as by economics.loader.create_economy, e.g. copies of a config with other values
+        return cls([create_economy(x) for x in configs], **options)
+
+    def __len__(self):
+        return len(self.auction_count)
+
+    def get_product(self, product_id):
+        for product in self.products:
+            if product.id == product_id:
+                return product
+
+    def view(self, index):
+        return EconomyView(self, index)
+
+    def history_view(self, index):
+        ranked = np.flatnonzero(self.auction_rank[index] >= 0)
+        ranked = ranked[np.argsort(self.auction_rank[index, ranked])]
+        product_ids = {self.products[x].id: x for x in ranked.tolist()}
+        return self.history.view(index, product_ids)
+
+    def produce(self):
+        # workers eat, then everyone makes what they can
+        self.table.feed_workers()
+        self.table.produce()
+
+    def get_orders(self):
+        return self.table.get_sell_offers(), self.table.get_buy_orders()
+
+    def rank_auctions(self, economy, product):
+        # rank the products auctioned for the first time, in the order of their first order
+        books = economy * len(self.products) + product
+        books, first = np.unique(books, return_index=True)
+        economy, product = np.divmod(books, len(self.products))
+        new = self.auction_rank[economy, product] < 0
+        order = np.lexsort((first[new], economy[new]))
+        economy = economy[new][order]
+        product = product[new][order]
+        counts = np.bincount(economy, minlength=len(self))
+        position = np.arange(len(economy)) - (np.cumsum(counts) - counts)[economy]
+        self.auction_rank[economy, product] = self.auction_count[economy] + position
+        self.auction_count += counts
+
+    def clear(self, sells, buys):
+        # clear every product of every economy, and return the statistics for the history
+        table = self.table
+        total_products = len(self.products)
+        sell_economy = self.economy[sells.row]
+        buy_economy = self.economy[buys.row]
+        # the auctions are made from the sells, then the buys
+        self.rank_auctions(sell_economy, sells.product)
+        self.rank_auctions(buy_economy, buys.product)
+        # each book is an economy and the rank of a product in it, so fills come in the order an Economy makes them
+        sell_book = sell_economy * total_products + self.auction_rank[sell_economy, sells.product]
+        buy_book = buy_economy * total_products + self.auction_rank[buy_economy, buys.product]
+        fills = clear_segments(sell_book, sells.price, sells.quantity, buy_book, buys.price, buys.quantity)
+        self.fills = fills
+        sellers = sells.row[fills.sell_index]
+        buyers = buys.row[fills.buy_index]
+        product = sells.product[fills.sell_index]
+        values = fills.value
+        table.money += np.bincount(sellers, weights=values, minlength=len(table)) - \
+            np.bincount(buyers, weights=values, minlength=len(table))
+        cells = table.stock.size
+        stock = table.stock.reshape(-1)
+        stock -= np.bincount(sellers * total_products + product, weights=fills.quantity, minlength=cells)
+        stock += np.bincount(buyers * total_products + product, weights=fills.quantity, minlength=cells)
+        return self.cycle_stats(sell_book, buy_book, fills)
+
+    def cycle_stats(self, sell_book, buy_book, fills):
+        # the same statistics History.create_sales_stats makes from the auctions
+        books = len(self) * len(self.products)
+        volume = np.bincount(fills.segment, weights=fills.quantity, minlength=books)
+        value = np.bincount(fills.segment, weights=fills.value, minlength=books)
+        max_price = np.zeros(books)
+        np.maximum.at(max_price, fills.segment, fills.price)
+        min_price = np.full(books, np.inf)
+        np.minimum.at(min_price, fills.segment, fills.price)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            average = np.where(volume > 0, value / volume, 0.0)
+        unsold = np.zeros(books)
+        unsold[fills.segments] = fills.unsold
+        unfilled = np.zeros(books)
+        unfilled[fills.segments] = fills.unfilled_orders
+        traded = np.zeros(books, dtype=bool)
+        traded[sell_book] = True
+        traded[buy_book] = True
+        by_book = {'average_price': average, 'min_price': min_price, 'max_price': max_price, 'volume': volume,
+                   'unsold': unsold, 'unfilled_orders': unfilled}
+        # from economy and rank back to economy and product
+        # every product auctioned has a rank, and products that were not auctioned are zero
+        rank = np.maximum(self.auction_rank, 0)
+        economy = np.arange(len(self))[:, None]
+        traded = traded.reshape(len(self), len(self.products))[economy, rank] & (self.auction_rank >= 0)
+        stats = {'traded': traded}
+        for name, values in by_book.items():
+            stats[name] = np.where(traded, values.reshape(len(self), len(self.products))[economy, rank], 0.0)
+        return stats
+
+    def post_cycle(self, sells, stats, traded):
+        # set every price from the results of the cycle
+        if self.pricing is None:
+            return
+        table = self.table
+        fills = self.fills
+        sellers = sells.row[fills.sell_index]
+        offered = np.bincount(sells.row, weights=sells.quantity, minlength=len(table))
+        sold = np.bincount(sellers, weights=fills.quantity, minlength=len(table))
+        value = np.bincount(sellers, weights=fills.value, minlength=len(table))
+        state = pricing_state(self.requirements, table.product, table.sale_price.copy(), table.buy_limit.copy(),
+                              offered, sold, value, table.is_worker, stats, traded, self.economy)
+        table.sale_price[:], table.buy_limit[:] = self.pricing(state)
+
+    def single_cycle(self):
+        # the same phases as Economy.single_cycle
+        self.produce()
+        sells, buys = self.get_orders()
+        stats = self.clear(sells, buys)
+        traded = stats.pop('traded')
+        self.history.append(stats, traded)
+        self.post_cycle(sells, stats, traded)
+
+    def run(self, cycles):
+        for _ in range(cycles):
+            self.single_cycle()
@@ -0,0 +1,273 @@
+import itertools
+import json
+
+import numpy as np
+
+from economics.auctions import SingleAuction, auction
+from economics.clearing import vector_auction, ParallelAuction
+from economics.history import History, STAT_FIELDS
+from economics.offers import SellOffer, BuyOffer
+from economics.producer import Product, Requirement, Producer, Workers, ProducerCycleHistory, SellResult, BuyResult
+from economics.producer import new_cycle_history
+from economics.rolling import RollingWindow
+from economics.tiers import Retention
+from economics.table import ProducerTable, TABLE_ARRAYS, history_rows
+
+# save and restore the full state of an economy as a set of arrays in a single .npz file
+# nothing is pickled: producers are stored as the columns of a ProducerTable,
+# and their cycle histories, the market history and the rolling windows as flat tables
+# every float is stored as it is, so a restored economy continues exactly as the original would
+
+# version 2 keeps the squared deviations of the prices in a rolling window instead of the sum of their squares
+CHECKPOINT_VERSION = 2
+
+# the engines a checkpoint can name; any other engine is saved as None and must be given again on load
+ENGINES = {'auction': auction, 'vector': vector_auction}
+
+
+def engine_name(engine):
+    # a ParallelAuction clears exactly as vector_auction does
+    if isinstance(engine, ParallelAuction):
+        return 'vector'
+    for name, known in ENGINES.items():
+        if engine is known:
+            return name
+    return None
+
+
+# the names of the parts of a cycle history in a checkpoint
+HISTORY_ARRAYS = {'sell_offers': 'sells', 'buy_offers': 'buys', 'auction_sales': 'sales', 'auction_buys': 'purchases'}
+
+
+def save_cycle_histories(economy, arrays):
+    # every offer and result is a row, tagged with the producer and the history entry it belongs to
+    if economy.table is not None:
+        lengths, rows = economy.table.history_rows()
+    else:
+        lengths, rows = history_rows(economy.producers)
+    arrays['history_length'] = np.array(lengths, dtype=np.int64)
+    for name, part in HISTORY_ARRAYS.items():
+        arrays[name] = rows[part]
+
+
+def load_table_histories(table, arrays):
+    table.load_history(arrays['history_length'].tolist(), {y: arrays[x] for x, y in HISTORY_ARRAYS.items()})
+
+
+def load_cycle_histories(producers, arrays):
+    for producer, length in zip(producers, arrays['history_length'].tolist()):
+        producer.cycle_history = new_cycle_history()
+        producer.cycle_history.extend([ProducerCycleHistory() for _ in range(length)])
+    for index, entry, product_id, total, price in arrays['sell_offers'].tolist():
+        producer = producers[int(index)]
+        producer.cycle_history[int(entry)].add_sell_offer(SellOffer(producer, int(product_id), total, price))
+    for index, entry, product_id, total, price in arrays['buy_offers'].tolist():
+        producer = producers[int(index)]
+        producer.cycle_history[int(entry)].add_buy_offer(BuyOffer(producer, int(product_id), total, price))
+    for index, entry, product_id, quantity, asking, actual in arrays['auction_sales'].tolist():
+        result = SellResult(asking, actual, quantity, int(product_id))
+        producers[int(index)].cycle_history[int(entry)].add_sale(result)
+    for index, entry, product_id, quantity, offer, actual in arrays['auction_buys'].tolist():
+        result = BuyResult(offer, actual, quantity, int(product_id))
+        producers[int(index)].cycle_history[int(entry)].add_purchase(result)
+
+
+def save_products(products, arrays):
+    arrays['product_ids'] = np.array([x.id for x in products], dtype=np.int64)
+    arrays['product_names'] = np.array([x.name for x in products])
+    requirements = [(x.id, r.product_id, r.total) for x in products for r in x.required]
+    arrays['requirements'] = np.array(requirements, dtype=np.float64).reshape(len(requirements), 3)
+
+
+def advance_ids(owner, ids):
+    # the restored objects keep their saved ids, so the ones made from now on must start past them
+    start = next(owner.id_iter)
+    owner.id_iter = itertools.count(max([start] + [x + 1 for x in ids]))
+
+
+def load_products(arrays):
+    products = {}
+    for product_id, name in zip(arrays['product_ids'].tolist(), arrays['product_names'].tolist()):
+        product = Product(name)
+        # keep the ids of the original economy
+        product.id = product_id
+        products[product_id] = product
+    for product_id, required_id, total in arrays['requirements'].tolist():
+        products[int(product_id)].required.append(Requirement(int(required_id), total))
+    advance_ids(Product, products.keys())
+    return list(products.values())
+
+
+def save_producers(economy, arrays):
+    table = economy.table
+    if table is None:
+        table = ProducerTable.from_producers(economy.products, economy.producers, economy.requirements)
+    for name in TABLE_ARRAYS:
+        arrays[f'producer_{name}'] = getattr(table, name)
+    # plain producers only hold the products in their stock dict, so remember which those are
+    held = np.ones(table.stock.shape, dtype=bool)
+    consumed = np.ones(len(table), dtype=bool)
+    if economy.table is None:
+        for index, producer in enumerate(economy.producers):
+            held[index] = [x.id in producer.stock for x in table.products]
+            consumed[index] = len(producer.last_consumption) > 0
+    arrays['producer_held'] = held
+    arrays['producer_consumed'] = consumed
+    save_cycle_histories(economy, arrays)
+
+
+def load_table(arrays, products, requirements):
+    table = ProducerTable(products, len(arrays['producer_ids']), requirements)
+    for name in TABLE_ARRAYS:
+        # checkpoints from before buy limits were added have none, and keep the limit of 1
+        if f'producer_{name}' in arrays:
+            setattr(table, name, arrays[f'producer_{name}'].copy())
+    table.make_rows()
+    return table
+
+
+def load_producers(table, arrays):
+    # build plain Producer objects from the table arrays
+    producers = []
+    held = arrays['producer_held']
+    consumed = arrays['producer_consumed']
+    for row in table.rows:
+        index = row.index
+        stock = {x.id: float(table.stock[index, column]) for column, x in enumerate(table.products)
+                 if held[index, column]}
+        if isinstance(row, Workers):
+            producer = Workers(row.workers, row.product, row.desires[0])
+        else:
+            producer = Producer(row.product, row.money)
+        producer.id = row.id
+        producer.money = row.money
+        producer.sale_price = row.sale_price
+        producer.buy_limit = row.buy_limit
+        producer.stock = stock
+        if consumed[index]:
+            producer.last_consumption = row.last_consumption
+        producers.append(producer)
+    return producers
+
+
+def save_history(history, arrays):
+    columns = history.columns
+    for field in STAT_FIELDS:
+        arrays[f'stat_{field}'] = columns.data[field]
+    arrays['stat_traded'] = columns.traded
+    arrays['stat_columns'] = np.array(list(columns.columns.keys()), dtype=np.int64)
+    # the rolling windows: one row per product and window, and flat tables of their contents
+    windows = []
+    entries = []
+    lows = []
+    highs = []
+    for product_id, product_windows in history.rolling_stats.products.items():
+        for size, window in product_windows.items():
+            index = len(windows)
+            ewma = np.nan if window.ewma is None else window.ewma
+            windows.append((product_id, size, window.priced, window.price_total, window.deviations,
+                            window.volume, window.value, ewma))
+            entries.extend([(index, cycle, np.nan if price is None else price, volume)
+                            for cycle, price, volume in window.entries])
+            lows.extend([(index, cycle, price) for cycle, price in window.lows])
+            highs.extend([(index, cycle, price) for cycle, price in window.highs])
+    arrays['rolling_windows'] = np.array(windows, dtype=np.float64).reshape(len(windows), 8)
+    arrays['rolling_entries'] = np.array(entries, dtype=np.float64).reshape(len(entries), 4)
+    arrays['rolling_lows'] = np.array(lows, dtype=np.float64).reshape(len(lows), 3)
+    arrays['rolling_highs'] = np.array(highs, dtype=np.float64).reshape(len(highs), 3)
+    # the buckets held in memory; those written to disk stay where they are
+    if history.tiers is not None:
+        history.tiers.save(arrays)
+
+
+def load_history(arrays, meta):
+    if meta.get('retention') is not None:
+        history = History(windows=meta['windows'], retention=Retention(**meta['retention']))
+        history.tiers.load(arrays, meta['tiers'])
+    else:
+        history = History(meta['max_cycles'], meta['windows'])
+    columns = history.columns
+    for field in STAT_FIELDS:
+        columns.data[field] = arrays[f'stat_{field}'].copy()
+    columns.traded = arrays['stat_traded'].copy()
+    columns.columns = {x: i for i, x in enumerate(arrays['stat_columns'].tolist())}
+    columns.total_cycles = meta['total_cycles']
+    columns.repeats = meta.get('repeats', [])
+    columns.skipped = sum([x[2] for x in columns.repeats])
+    windows = []
+    for product_id, size, priced, total, deviations, volume, value, ewma in arrays['rolling_windows'].tolist():
+        window = RollingWindow(int(size))
+        window.priced = int(priced)
+        window.price_total = total
+        window.deviations = deviations
+        if meta['version'] < 2 and window.priced > 0:
+            # older checkpoints hold the sum of the squares of the prices
+            window.deviations = deviations - total * total / window.priced
+        window.volume = volume
+        window.value = value
+        window.ewma = None if np.isnan(ewma) else ewma
+        history.rolling_stats.products.setdefault(int(product_id), {})[int(size)] = window
+        windows.append(window)
+    for index, cycle, price, volume in arrays['rolling_entries'].tolist():
+        windows[int(index)].entries.append((int(cycle), None if np.isnan(price) else price, volume))
+    for index, cycle, price in arrays['rolling_lows'].tolist():
+        windows[int(index)].lows.append((int(cycle), price))
+    for index, cycle, price in arrays['rolling_highs'].tolist():
+        windows[int(index)].highs.append((int(cycle), price))
+    return history
+
+
+def save_checkpoint(economy, filepath):
+    arrays = {}
+    history = economy.history
+    meta = {'version': CHECKPOINT_VERSION,
+            'vectorized': economy.table is not None,
+            'engine': engine_name(economy.engine),
+            'staged': economy.staged,
+            'max_cycles': history.columns.max_cycles,
+            'windows': list(history.rolling_stats.windows),
+            'total_cycles': history.total_cycles,
+            'repeats': history.columns.repeats,
+            'retention': None if history.tiers is None else history.tiers.retention.to_dict(),
+            'tiers': None if history.tiers is None else history.tiers.meta(),
+            'rng': economy.rng.bit_generator.state}
+    arrays['meta'] = np.array(json.dumps(meta))
+    save_products(economy.products, arrays)
+    save_producers(economy, arrays)
+    save_history(history, arrays)
+    # the order of the auctions decides the order in which money changes hands
+    arrays['auction_products'] = np.array(list(economy.auctions.keys()), dtype=np.int64)
+    level_auctions = [(x, y) for x, auctions in economy.level_auctions.items() for y in auctions.keys()]
+    arrays['level_auctions'] = np.array(level_auctions, dtype=np.int64).reshape(len(level_auctions), 2)
+    with open(filepath, 'wb') as checkpoint_file:
+        np.savez(checkpoint_file, **arrays)
+
+
+def load_checkpoint(filepath, economy_class, **options):
+    with np.load(filepath, allow_pickle=False) as data:
+        arrays = {x: data[x] for x in data.files}
+    meta = json.loads(str(arrays['meta']))
+    products = load_products(arrays)
+    # the options given win over what was saved
+    if 'engine' not in options and meta.get('engine') is not None:
+        options['engine'] = ENGINES[meta['engine']]
+    if 'staged' not in options:
+        options['staged'] = meta.get('staged', False)
+    economy = economy_class(products, [], **options)
+    table = load_table(arrays, economy.products, economy.requirements)
+    producers = table.rows
+    if not meta['vectorized']:
+        producers = load_producers(table, arrays)
+    advance_ids(Producer, table.ids.tolist())
+    if meta['vectorized']:
+        load_table_histories(table, arrays)
+    else:
+        load_cycle_histories(producers, arrays)
+    economy.set_producers(table if meta['vectorized'] else producers)
+    economy.history = load_history(arrays, meta)
+    economy.auctions = {x: SingleAuction(x) for x in arrays['auction_products'].tolist()}
+    for level, product_id in arrays.get('level_auctions', np.zeros((0, 2), dtype=np.int64)).tolist():
+        economy.level_auctions.setdefault(level, {})[product_id] = SingleAuction(product_id)
+    if 'rng' in meta:
+        economy.rng.bit_generator.state = meta['rng']
+    return economy
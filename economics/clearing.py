@@ -0,0 +1,472 @@
+import functools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from economics.auctions import SingleAuction, create_auctions
+from economics.offers import Transactions
+from economics.producer import BuyResult, SellResult
+from economics.table import Results
+
+# a vectorized alternative to SingleAuction.perform
+# the offers for a product are passed as arrays of prices and quantities, and
+# every fill is found in one go instead of walking the order book one match at a time
+# the fills are exactly the same as the order book: lowest asks meet the highest bids,
+# the price is the midpoint, and ties in price keep the same order as the python auction
+# both find a fill as the step between the running totals of the offers, so they round in the same way,
+# and fractional quantities give the same fills, down to any tiny fill left by a rounding error
+
+
+class Fills:
+    # the result of clearing a single product
+    # the indices point into the sell and buy arrays that were cleared
+    def __init__(self, sell_index, buy_index, quantity, price, unsold, unfilled_orders):
+        self.sell_index = sell_index
+        self.buy_index = buy_index
+        self.quantity = quantity
+        self.price = price
+        self.unsold = unsold
+        self.unfilled_orders = unfilled_orders
+
+    def __len__(self):
+        return len(self.quantity)
+
+    @property
+    def value(self):
+        return self.quantity * self.price
+
+
+def empty_fills():
+    index = np.zeros(0, dtype=np.int64)
+    values = np.zeros(0, dtype=np.float64)
+    return Fills(index, index, values, values, 0, 0)
+
+
+def run_rank(ends):
+    # for a sorted array, the position of every value inside its run of equal values
+    first = np.searchsorted(ends, ends, side='left')
+    return np.arange(len(ends)) - first
+
+
+def clear_product(sell_price, sell_quantity, buy_price, buy_quantity):
+    # no auction is held unless there is at least one buy and one sell
+    sell_price = np.asarray(sell_price, dtype=np.float64)
+    sell_quantity = np.asarray(sell_quantity, dtype=np.float64)
+    buy_price = np.asarray(buy_price, dtype=np.float64)
+    buy_quantity = np.asarray(buy_quantity, dtype=np.float64)
+    total_sells = len(sell_price)
+    total_buys = len(buy_price)
+    if total_sells == 0 or total_buys == 0:
+        return empty_fills()
+    # sort sells by lowest ask and buys by highest bid
+    # the buys are sorted upwards and then reversed, just like the order book
+    sell_order = np.argsort(sell_price, kind='stable')
+    buy_order = np.argsort(buy_price, kind='stable')[::-1]
+    sorted_sell_price = sell_price[sell_order]
+    sorted_buy_price = buy_price[buy_order]
+    # an offer is used up when the running total of the market reaches its cumulative end
+    sell_ends = np.cumsum(sell_quantity[sell_order])
+    buy_ends = np.cumsum(buy_quantity[buy_order])
+    # merge the ends of both sides; every distinct end is a single fill
+    # a sell and a buy that end at the same point finish together in one fill
+    ends = np.concatenate([sell_ends, buy_ends])
+    ranks = np.concatenate([run_rank(sell_ends), run_rank(buy_ends)])
+    is_sell = np.concatenate([np.ones(total_sells, dtype=bool), np.zeros(total_buys, dtype=bool)])
+    events = np.lexsort((~is_sell, ranks, ends))
+    ends = ends[events]
+    ranks = ranks[events]
+    is_sell = is_sell[events]
+    new_fill = np.ones(len(events), dtype=bool)
+    new_fill[1:] = (ends[1:] != ends[:-1]) | (ranks[1:] != ranks[:-1])
+    starts = np.flatnonzero(new_fill)
+    # the offers matched in each fill are those not used up by an earlier fill
+    sells_before = np.cumsum(is_sell) - is_sell
+    buys_before = np.cumsum(~is_sell) - ~is_sell
+    sell_position = sells_before[starts]
+    buy_position = buys_before[starts]
+    fill_end = ends[starts]
+    fill_start = np.concatenate([[0.0], fill_end[:-1]])
+    # the auction stops when either side runs out or the best bid is below the best ask
+    in_book = (sell_position < total_sells) & (buy_position < total_buys)
+    ask = sorted_sell_price[np.minimum(sell_position, total_sells - 1)]
+    bid = sorted_buy_price[np.minimum(buy_position, total_buys - 1)]
+    stopped = np.flatnonzero(~(in_book & (bid >= ask)))
+    total_fills = stopped[0] if len(stopped) > 0 else len(starts)
+    sell_position = sell_position[:total_fills]
+    buy_position = buy_position[:total_fills]
+    quantity = fill_end[:total_fills] - fill_start[:total_fills]
+    price = (ask[:total_fills] + bid[:total_fills]) / 2.0
+    # the volume filled is the end of the last fill, and the totals of each side the end of their last offer
+    sold = fill_end[total_fills - 1] if total_fills > 0 else 0.0
+    # the naming matches SingleAuction: unsold is the volume of buys left over
+    unsold = buy_ends[-1] - sold
+    unfilled = sell_ends[-1] - sold
+    return Fills(sell_order[sell_position], buy_order[buy_position], quantity, price, unsold, unfilled)
+
+
+class SegmentFills:
+    # the result of clearing many order books at once
+    # every fill has the segment (order book) it came from, and indices into the arrays that were cleared
+    # segments, unsold and unfilled_orders hold the totals of every book that was cleared
+    def __init__(self, segment, sell_index, buy_index, quantity, price, segments, unsold, unfilled_orders):
+        self.segment = segment
+        self.sell_index = sell_index
+        self.buy_index = buy_index
+        self.quantity = quantity
+        self.price = price
+        self.segments = segments
+        self.unsold = unsold
+        self.unfilled_orders = unfilled_orders
+
+    def __len__(self):
+        return len(self.quantity)
+
+    @property
+    def value(self):
+        return self.quantity * self.price
+
+
+def padded(values, row, position, shape, fill):
+    result = np.full(shape, fill, dtype=values.dtype)
+    result[row, position] = values
+    return result
+
+
+def run_ranks(ends):
+    # run_rank for every row of a matrix
+    columns = np.arange(ends.shape[1])
+    new_run = np.ones(ends.shape, dtype=bool)
+    new_run[:, 1:] = ends[:, 1:] != ends[:, :-1]
+    first = np.maximum.accumulate(np.where(new_run, columns, 0), axis=1)
+    return columns - first
+
+
+def clear_segments(sell_segment, sell_price, sell_quantity, buy_segment, buy_price, buy_quantity):
+    # clear_product for many order books at once; the segment of an order is the book it belongs to
+    # within a book, the orders keep the order they are given in, so ties are broken as clear_product does
+    # each book is laid out as a row of a padded matrix, and every step of clear_product is done on all rows
+    sell_segment = np.asarray(sell_segment, dtype=np.int64)
+    buy_segment = np.asarray(buy_segment, dtype=np.int64)
+    sell_price = np.asarray(sell_price, dtype=np.float64)
+    sell_quantity = np.asarray(sell_quantity, dtype=np.float64)
+    buy_price = np.asarray(buy_price, dtype=np.float64)
+    buy_quantity = np.asarray(buy_quantity, dtype=np.float64)
+    # only books with at least one buy and one sell are cleared
+    segments = np.intersect1d(sell_segment, buy_segment)
+    total = len(segments)
+    index = np.zeros(0, dtype=np.int64)
+    if total == 0:
+        values = np.zeros(0)
+        return SegmentFills(index, index, index, values, values, segments, values, values)
+    sell_books = np.flatnonzero(np.isin(sell_segment, segments))
+    buy_books = np.flatnonzero(np.isin(buy_segment, segments))
+    # lowest asks first; the highest bids first, with ties in reverse order as the buys are reversed
+    sells = sell_books[np.lexsort((sell_books, sell_price[sell_books], sell_segment[sell_books]))]
+    buys = buy_books[np.lexsort((-buy_books, -buy_price[buy_books], buy_segment[buy_books]))]
+    sell_row = np.searchsorted(segments, sell_segment[sells])
+    buy_row = np.searchsorted(segments, buy_segment[buys])
+    sell_counts = np.bincount(sell_row, minlength=total)
+    buy_counts = np.bincount(buy_row, minlength=total)
+    sell_position = np.arange(len(sells)) - (np.cumsum(sell_counts) - sell_counts)[sell_row]
+    buy_position = np.arange(len(buys)) - (np.cumsum(buy_counts) - buy_counts)[buy_row]
+    sell_width = sell_counts.max()
+    buy_width = buy_counts.max()
+    asks = padded(sell_price[sells], sell_row, sell_position, (total, sell_width), np.inf)
+    bids = padded(buy_price[buys], buy_row, buy_position, (total, buy_width), -np.inf)
+    # the padding adds zero to the end of every row, then is pushed past every real end
+    sell_ends = np.cumsum(padded(sell_quantity[sells], sell_row, sell_position, (total, sell_width), 0.0), axis=1)
+    buy_ends = np.cumsum(padded(buy_quantity[buys], buy_row, buy_position, (total, buy_width), 0.0), axis=1)
+    sell_ends[np.arange(sell_width) >= sell_counts[:, None]] = np.inf
+    buy_ends[np.arange(buy_width) >= buy_counts[:, None]] = np.inf
+    # merge the ends of both sides of every book
+    ends = np.concatenate([sell_ends, buy_ends], axis=1)
+    ranks = np.concatenate([run_ranks(sell_ends), run_ranks(buy_ends)], axis=1)
+    is_sell = np.zeros(ends.shape, dtype=bool)
+    is_sell[:, :sell_width] = True
+    rows = np.repeat(np.arange(total), ends.shape[1])
+    events = np.lexsort((~is_sell.ravel(), ranks.ravel(), ends.ravel(), rows)).reshape(ends.shape)
+    ends = np.take_along_axis(ends, events % ends.shape[1], axis=1)
+    ranks = np.take_along_axis(ranks, events % ends.shape[1], axis=1)
+    is_sell = np.take_along_axis(is_sell, events % ends.shape[1], axis=1)
+    new_fill = np.ones(ends.shape, dtype=bool)
+    new_fill[:, 1:] = (ends[:, 1:] != ends[:, :-1]) | (ranks[:, 1:] != ranks[:, :-1])
+    sells_before = np.cumsum(is_sell, axis=1) - is_sell
+    buys_before = np.cumsum(~is_sell, axis=1) - ~is_sell
+    in_book = (sells_before < sell_counts[:, None]) & (buys_before < buy_counts[:, None])
+    book_rows = np.arange(total)[:, None]
+    ask = asks[book_rows, np.minimum(sells_before, sell_counts[:, None] - 1)]
+    bid = bids[book_rows, np.minimum(buys_before, buy_counts[:, None] - 1)]
+    # every book stops at its first fill that is out of the book or where the bid is below the ask
+    running = np.logical_and.accumulate(~new_fill | (in_book & (bid >= ask)), axis=1)
+    fill_row, fill_column = np.nonzero(new_fill & running)
+    fill_end = ends[fill_row, fill_column]
+    first_fill = np.ones(len(fill_row), dtype=bool)
+    first_fill[1:] = fill_row[1:] != fill_row[:-1]
+    fill_start = np.where(first_fill, 0.0, np.concatenate([[0.0], fill_end[:-1]]))
+    quantity = fill_end - fill_start
+    price = (ask[fill_row, fill_column] + bid[fill_row, fill_column]) / 2.0
+    sell_index = sells[(np.cumsum(sell_counts) - sell_counts)[fill_row] + sells_before[fill_row, fill_column]]
+    buy_index = buys[(np.cumsum(buy_counts) - buy_counts)[fill_row] + buys_before[fill_row, fill_column]]
+    # the totals are the same running totals clear_product uses
+    sold = np.zeros(total)
+    last_fill = np.flatnonzero(np.append(fill_row[1:] != fill_row[:-1], True)) if len(fill_row) > 0 else index
+    sold[fill_row[last_fill]] = fill_end[last_fill]
+    offered = sell_ends[np.arange(total), sell_counts - 1]
+    wanted = buy_ends[np.arange(total), buy_counts - 1]
+    return SegmentFills(segments[fill_row], sell_index, buy_index, quantity, price, segments,
+                        wanted - sold, offered - sold)
+
+
+def order_book(single_auction):
+    # the offers of a SingleAuction as (sell price, sell quantity, buy price, buy quantity) arrays
+    sells = single_auction.sells
+    buys = single_auction.buys
+    sell_price = np.fromiter((x.cost_per_unit for x in sells), dtype=np.float64, count=len(sells))
+    sell_quantity = np.fromiter((x.total_offered for x in sells), dtype=np.float64, count=len(sells))
+    buy_price = np.fromiter((x.max_price for x in buys), dtype=np.float64, count=len(buys))
+    buy_quantity = np.fromiter((x.total_wanted for x in buys), dtype=np.float64, count=len(buys))
+    return sell_price, sell_quantity, buy_price, buy_quantity
+
+
+def clear_book(book):
+    return clear_product(*book)
+
+
+def clear_books(books):
+    # clear the order books one after the other
+    return [clear_book(x) for x in books]
+
+
+def clear_auction(single_auction):
+    # clear a SingleAuction with arrays and return the fills
+    fills = clear_book(order_book(single_auction))
+    single_auction.unsold = fills.unsold
+    single_auction.unfilled_orders = fills.unfilled_orders
+    return fills
+
+
+class OwnerIndex:
+    # gives every producer taking part in the auctions a position in the delta arrays
+    def __init__(self):
+        self.owners = []
+        self.positions = {}
+
+    def index(self, owner):
+        key = id(owner)
+        if key not in self.positions:
+            self.positions[key] = len(self.owners)
+            self.owners.append(owner)
+        return self.positions[key]
+
+    def __len__(self):
+        return len(self.owners)
+
+
+def apply_deltas(owners, money, keys, stock, products):
+    # money is an array of deltas per owner; stock has a delta for every key of an owner and product,
+    # as owner * len(products) + the position of the product
+    for position in np.flatnonzero(money):
+        owners.owners[position].money += money[position]
+    for key, quantity in zip(keys.tolist(), stock[keys].tolist()):
+        owner, product = divmod(key, len(products))
+        if quantity < 0:
+            owners.owners[owner].remove_stock(products[product], -quantity)
+        else:
+            owners.owners[owner].add_stock(products[product], quantity)
+
+
+def settle(single_auctions, all_fills):
+    # record the fills of every auction and pass on the results to the producers
+    # changes to money and stock are summed per producer and product and applied once, instead of once per fill
+    # the transactions are kept as arrays; only the producers are given an object for every fill,
+    # as their cycle history keeps each sale and purchase
+    owners = OwnerIndex()
+    products = []
+    sellers = []
+    buyers = []
+    product_keys = []
+    quantities = []
+    values = []
+    for single_auction, fills in zip(single_auctions, all_fills):
+        single_auction.unsold = fills.unsold
+        single_auction.unfilled_orders = fills.unfilled_orders
+        if len(fills) == 0:
+            continue
+        product_id = single_auction.product_id
+        single_auction.transactions = Transactions(product_id, fills.quantity, fills.price)
+        fill_sells = [single_auction.sells[x] for x in fills.sell_index.tolist()]
+        fill_buys = [single_auction.buys[x] for x in fills.buy_index.tolist()]
+        seller_index = np.fromiter((owners.index(x.seller) for x in fill_sells), dtype=np.int64, count=len(fills))
+        buyer_index = np.fromiter((owners.index(x.buyer) for x in fill_buys), dtype=np.int64, count=len(fills))
+        for sell, buy, quantity, price in zip(fill_sells, fill_buys, fills.quantity.tolist(), fills.price.tolist()):
+            # the producers still need signals about their sales
+            sell.seller.add_sale(SellResult(sell.cost_per_unit, price, quantity, product_id))
+            buy.buyer.add_purchase(BuyResult(buy.max_price, price, quantity, product_id))
+        sellers.append(seller_index)
+        buyers.append(buyer_index)
+        product_keys.append(np.full(len(fills), len(products), dtype=np.int64))
+        products.append(product_id)
+        quantities.append(fills.quantity)
+        values.append(fills.value)
+    if len(values) == 0:
+        return
+    sellers = np.concatenate(sellers)
+    buyers = np.concatenate(buyers)
+    product_keys = np.concatenate(product_keys)
+    quantities = np.concatenate(quantities)
+    values = np.concatenate(values)
+    money = np.bincount(sellers, weights=values, minlength=len(owners))
+    money -= np.bincount(buyers, weights=values, minlength=len(owners))
+    sell_keys = sellers * len(products) + product_keys
+    buy_keys = buyers * len(products) + product_keys
+    cells = len(owners) * len(products)
+    stock = np.bincount(buy_keys, weights=quantities, minlength=cells)
+    stock -= np.bincount(sell_keys, weights=quantities, minlength=cells)
+    # every stock that was traded is changed, even by nothing, as the order book does
+    apply_deltas(owners, money, np.unique(np.concatenate([sell_keys, buy_keys])), stock, products)
+
+
+def vector_perform(auctions, clear=clear_books):
+    # clear the auctions made by create_auctions
+    # clear is given the order books of all products and returns their fills in the same order
+    all_auctions = []
+    valid_auctions = []
+    for single_auction in auctions.values():
+        if not single_auction.has_orders:
+            continue
+        all_auctions.append(single_auction)
+        if single_auction.valid:
+            valid_auctions.append(single_auction)
+    all_fills = clear([order_book(x) for x in valid_auctions])
+    settle(valid_auctions, all_fills)
+    return all_auctions
+
+
+def vector_auction(sells, buys, auctions=None, clear=clear_books):
+    # a drop in replacement for economics.auctions.auction()
+    auctions = create_auctions(sells, buys, auctions)
+    return vector_perform(auctions, clear)
+
+
+def order_auctions(table, sells, buys, auctions=None):
+    # create_auctions for the Orders of a ProducerTable
+    # the auctions are made in the order their products are first offered, the sells and then the buys,
+    # and the sells and buys of an auction are the Orders of its product, in the order they were made
+    if auctions is None:
+        auctions = {}
+    else:
+        for single_auction in auctions.values():
+            single_auction.reset()
+    for side, orders in [('sells', sells), ('buys', buys)]:
+        order = np.argsort(orders.product, kind='stable')
+        columns, starts = np.unique(orders.product[order], return_index=True)
+        groups = np.split(order, starts[1:])
+        # the first order of each product, as the groups keep the orders of a product in order
+        for position in np.argsort(order[starts]).tolist():
+            product_id = int(table.product_ids[columns[position]])
+            if product_id not in auctions:
+                auctions[product_id] = SingleAuction(product_id)
+            setattr(auctions[product_id], side, orders.subset(groups[position]))
+    return auctions
+
+
+def settle_orders(table, single_auctions, all_fills):
+    # the fills change the money and stock of the table as a BatchedEconomy does,
+    # and are kept in the history of the cycle as arrays
+    sales = []
+    purchases = []
+    for single_auction, fills in zip(single_auctions, all_fills):
+        single_auction.unsold = fills.unsold
+        single_auction.unfilled_orders = fills.unfilled_orders
+        if len(fills) == 0:
+            continue
+        single_auction.transactions = Transactions(single_auction.product_id, fills.quantity, fills.price)
+        sells = single_auction.sells.subset(fills.sell_index)
+        buys = single_auction.buys.subset(fills.buy_index)
+        sales.append(Results(sells.row, sells.product, fills.quantity, sells.price, fills.price))
+        purchases.append(Results(buys.row, buys.product, fills.quantity, buys.price, fills.price))
+    if len(sales) == 0:
+        return
+    sales = Results.join(sales)
+    purchases = Results.join(purchases)
+    values = sales.quantity * sales.actual
+    table.money += np.bincount(sales.row, weights=values, minlength=len(table)) - \
+        np.bincount(purchases.row, weights=values, minlength=len(table))
+    cells = table.stock.size
+    total_products = table.stock.shape[1]
+    stock = table.stock.reshape(-1)
+    stock -= np.bincount(sales.row * total_products + sales.product, weights=sales.quantity, minlength=cells)
+    stock += np.bincount(purchases.row * total_products + purchases.product, weights=purchases.quantity,
+                         minlength=cells)
+    table.cycles[-1].add('sales', sales)
+    table.cycles[-1].add('purchases', purchases)
+
+
+def perform_orders(table, auctions, clear=clear_books):
+    # clear the auctions made by order_auctions, as vector_perform does
+    all_auctions = [x for x in auctions.values() if x.has_orders]
+    valid_auctions = [x for x in all_auctions if x.valid]
+    all_fills = clear([(x.sells.price, x.sells.quantity, x.buys.price, x.buys.quantity) for x in valid_auctions])
+    settle_orders(table, valid_auctions, all_fills)
+    return all_auctions
+
+
+def clear_orders(table, sells, buys, auctions=None, clear=clear_books):
+    # vector_auction for the Orders of a ProducerTable, which are never made into offers
+    # the fills are the same, and are applied in the same order
+    auctions = order_auctions(table, sells, buys, auctions)
+    return perform_orders(table, auctions, clear)
+
+
+# below this many orders in a cycle, the auctions are cleared in this process
+PARALLEL_THRESHOLD = 50000
+
+
+class ParallelAuction:
+    # an auction engine that clears the products at the same time in a pool of processes
+    # only the price and quantity arrays of each order book are sent to the workers, and the
+    # fills come back in product order, so the results are the same as vector_auction
+    # use as Economy(..., engine=ParallelAuction()), and close() the economy or the engine when done
+    def __init__(self, max_workers=None, threshold=PARALLEL_THRESHOLD):
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        self.max_workers = max_workers
+        self.threshold = threshold
+        self.executor = None
+
+    def clear_books(self, books):
+        total_orders = sum([len(x[0]) + len(x[2]) for x in books])
+        if len(books) < 2 or total_orders < self.threshold:
+            return clear_books(books)
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(self.max_workers)
+        # send the books in chunks so that many small products do not swamp the pool
+        chunksize = max(1, len(books) // (4 * self.max_workers))
+        return list(self.executor.map(clear_book, books, chunksize=chunksize))
+
+    def __call__(self, sells, buys, auctions=None):
+        return vector_auction(sells, buys, auctions, self.clear_books)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+
+def order_clearing(engine):
+    # an engine for the Orders of a ProducerTable that clears them as the engine given does, or None
+    if engine is vector_auction:
+        clear = clear_books
+    elif isinstance(engine, ParallelAuction):
+        clear = engine.clear_books
+    else:
+        return None
+    return functools.partial(clear_orders, clear=clear)
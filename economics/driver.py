@@ -0,0 +1,185 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+
+import numpy as np
+
+# run an economy from an asyncio program, such as a game server, without blocking the event loop
+# every cycle runs in an executor thread; after each one an immutable Snapshot of the market is made
+# the latest snapshot can be read at any time, and subscribers receive every snapshot through an async iterator
+# a subscriber that falls behind either loses its oldest snapshots, or with wait=True holds back the simulation
+#     driver = AsyncDriver(economy, interval=0.5)
+#     driver.start()
+#     async for snapshot in driver.subscribe():
+#         send(snapshot.prices)
+
+
+class Snapshot:
+    # the state of the market after a cycle; nothing in it can be changed
+    __slots__ = ['cycle', 'prices', 'volumes', 'producer_ids', 'money']
+
+    def __init__(self, cycle, prices, volumes, producer_ids, money):
+        self.cycle = cycle
+        # {product_id: price} and {product_id: volume}, for the products auctioned in the cycle
+        self.prices = MappingProxyType(prices)
+        self.volumes = MappingProxyType(volumes)
+        self.producer_ids = producer_ids
+        self.money = money
+        self.producer_ids.flags.writeable = False
+        self.money.flags.writeable = False
+
+    def price(self, product_id):
+        # the same as History.get_last_price
+        return self.prices.get(product_id, -1)
+
+    def __repr__(self):
+        return f'Snapshot: cycle {self.cycle}, {len(self.prices)} prices'
+
+
+def take_snapshot(economy):
+    history = economy.history
+    columns = history.columns
+    prices = {}
+    volumes = {}
+    if history.total_cycles > 0:
+        row = columns.row(history.total_cycles - 1)
+        for product_id, column in columns.columns.items():
+            if columns.traded[row, column]:
+                prices[product_id] = float(columns.data['average_price'][row, column])
+                volumes[product_id] = float(columns.data['volume'][row, column])
+    if economy.table is not None:
+        producer_ids = economy.table.ids.copy()
+        money = economy.table.money.copy()
+    else:
+        producer_ids = np.array([x.id for x in economy.producers], dtype=np.int64)
+        money = np.array([x.money for x in economy.producers], dtype=np.float64)
+    return Snapshot(history.total_cycles, prices, volumes, producer_ids, money)
+
+
+class Subscription:
+    # an async iterator of snapshots; it ends when the driver stops
+    def __init__(self, driver, max_queue, wait):
+        self.driver = driver
+        self.queue = asyncio.Queue(max_queue)
+        self.wait = wait
+        # snapshots thrown away because this subscriber was too slow
+        self.dropped = 0
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.closed and self.queue.empty():
+            raise StopAsyncIteration
+        snapshot = await self.queue.get()
+        if snapshot is None:
+            raise StopAsyncIteration
+        return snapshot
+
+    async def put(self, snapshot):
+        if self.wait:
+            # back pressure: the next cycle waits until there is room
+            await self.queue.put(snapshot)
+            return
+        self.put_nowait(snapshot)
+
+    def put_nowait(self, snapshot):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(snapshot)
+
+    def close(self):
+        # the snapshots already queued can still be read
+        self.driver.unsubscribe(self)
+        self.closed = True
+        if not self.queue.full():
+            # wakes a reader waiting on an empty queue
+            self.queue.put_nowait(None)
+
+
+class AsyncDriver:
+    # interval is the least time in seconds from the start of one cycle to the next
+    # by default the cycles run in a thread of their own; an executor can be given instead
+    # it must run one thing at a time, as cycles change the economy and must not overlap
+    def __init__(self, economy, interval=0.0, executor=None, max_queue=8):
+        self.economy = economy
+        self.interval = interval
+        self.own_executor = executor is None
+        if executor is None:
+            executor = ThreadPoolExecutor(1, thread_name_prefix='economy')
+        self.executor = executor
+        self.max_queue = max_queue
+        self.subscriptions = []
+        self.task = None
+        # replaced, never changed, after every cycle, so it can be read without a lock
+        self.latest = take_snapshot(economy)
+
+    def subscribe(self, max_queue=None, wait=False):
+        if max_queue is None:
+            max_queue = self.max_queue
+        subscription = Subscription(self, max_queue, wait)
+        self.subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        if subscription in self.subscriptions:
+            self.subscriptions.remove(subscription)
+
+    def cycle(self):
+        # runs in the executor
+        self.economy.single_cycle()
+        return take_snapshot(self.economy)
+
+    async def step(self):
+        # run one cycle and publish the snapshot
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, self.cycle)
+        try:
+            snapshot = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # the thread cannot be stopped, so wait for the cycle to finish before giving up
+            self.latest = await future
+            raise
+        self.latest = snapshot
+        for subscription in list(self.subscriptions):
+            await subscription.put(snapshot)
+        return snapshot
+
+    async def run(self, cycles=None):
+        # run cycles on the schedule until cancelled, or until that many have run
+        loop = asyncio.get_running_loop()
+        total = 0
+        try:
+            while cycles is None or total < cycles:
+                started = loop.time()
+                await self.step()
+                total += 1
+                await asyncio.sleep(max(0.0, started + self.interval - loop.time()))
+        finally:
+            self.finish()
+
+    def start(self, cycles=None):
+        # run in a task of the current event loop
+        self.task = asyncio.get_running_loop().create_task(self.run(cycles))
+        return self.task
+
+    async def stop(self):
+        # cancel the running task; the cycle in progress is allowed to finish
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def finish(self):
+        # end every subscription
+        for subscription in list(self.subscriptions):
+            subscription.close()
+
+    def close(self):
+        if self.own_executor:
+            self.executor.shutdown()
@@ -1,15 +1,109 @@
-from economics.history import History
+import numpy as np
+
+from economics.heuristics import pricing_state
+from economics.history import History, STAT_FIELDS
+from economics.producer import Workers
 from economics.auctions import auction
+from economics.table import ProducerTable, Orders
+from economics.requirements import compile_requirements
+from economics.graph import build_graph
+
+# checkpoints, fast forwarding and the vectorized engines are imported when first used,
+# so that importing an economy stays quick
 
 
 class Economy:
-    def __init__(self, products, producers):
+    def __init__(self, products, producers, engine=auction, vectorized=False, requirements=None,
+                 history=None, pricing=None, seed=None, graph=None, staged=False):
         # sort products by id to be sure
         self.products = sorted(products, key=lambda x: x.id)
+        # the requirements of all products, normally compiled by the loader
+        if requirements is None:
+            requirements = compile_requirements(self.products)
+        self.requirements = requirements
+        # the levels and chains of the products, see economics.graph; also built by the loader
+        if graph is None:
+            graph = build_graph(self.requirements)
+        self.graph = graph
+        # when staged, a cycle produces and clears one level of the graph at a time
+        self.staged = staged
+        # the auctions of each level of a staged cycle, kept apart since clearing resets the ones it is given
+        self.level_auctions = {}
+        # when vectorized, the producers are held in a ProducerTable
+        # and self.producers is the list of views onto its rows
+        if vectorized and not isinstance(producers, ProducerTable):
+            producers = ProducerTable.from_producers(self.products, producers, self.requirements)
+        self.table = None
+        self.producers = []
+        self.set_producers(producers)
+        # a History(max_cycles=...) can be passed in to only keep the latest cycles
+        if history is None:
+            history = History()
+        self.history = history
+        # the auctions are kept between cycles so they can be reused
+        self.auctions = {}
+        # the function used to clear the auctions, e.g. economics.clearing.vector_auction
+        self.engine = engine
+        # hooks told about every phase of a cycle, see economics.metrics
+        self.hooks = []
+        # a heuristics.PricingEngine sets every price after a cycle; without one each producer sets its own
+        self.pricing = pricing
+        # nothing in a cycle is random unless it draws from here, so a seed makes a run repeat exactly
+        # the state of the generator is kept in checkpoints, so a replay draws the same numbers
+        self.rng = np.random.default_rng(seed)
+
+    def set_producers(self, producers):
+        # producers is either a list of Producers or a ProducerTable
+        self.table = None
+        if isinstance(producers, ProducerTable):
+            self.table = producers
+            producers = producers.rows
         self.producers = producers
-        self.history = History()
+
+    def close(self):
+        # stop anything the engine started, such as the worker processes of a ParallelAuction
+        # the economy can still be read, and an engine that is run again starts them again
+        if hasattr(self.engine, 'close'):
+            self.engine.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    def save_checkpoint(self, filepath):
+        # save the whole state, so that the economy can be restored with load_checkpoint
+        from economics.checkpoint import save_checkpoint
+        save_checkpoint(self, filepath)
+
+    @classmethod
+    def load_checkpoint(cls, filepath, **options):
+        # options are passed to the economy as normal, e.g. engine=vector_auction
+        from economics.checkpoint import load_checkpoint
+        return load_checkpoint(filepath, cls, **options)
+
+    def order_engine(self):
+        # with a table, an engine that clears arrays is given the orders of the table, and no offers are made
+        if self.table is None:
+            return None
+        from economics.clearing import order_clearing
+        return order_clearing(self.engine)
+
+    def table_sells(self, rows=None):
+        if self.order_engine() is not None:
+            return self.table.sell_orders(rows)
+        return self.table.sell_offers(rows)
 
     def get_all_sells(self):
+        if self.table is not None:
+            return self.table_sells()
         sells = []
         for producer in self.producers:
             sells.extend(producer.get_sell_offers())
@@ -18,13 +112,148 @@ class Economy:
     def get_all_buys(self):
         # every worker requires some food
         # since food is essential, the maximum price to buy will be the total demand / avaliable money
+        if self.table is not None:
+            if self.order_engine() is not None:
+                return self.table.buy_orders()
+            return self.table.buy_offers()
         buys = []
         for producer in self.producers:
             buys.extend(producer.get_buy_orders())
         return buys
 
     def get_product(self, product_id):
-        return self.products[product_id]
+        # product ids are global, so they do not always start at zero
+        for product in self.products:
+            if product.id == product_id:
+                return product
+
+    def update_producers(self):
+        if self.table is not None:
+            # convert_producer_stock keeps nothing of a producer yet, so no rows are made for it
+            self.history.update_producers([None] * len(self.table))
+            return
+        self.history.update_producers(self.producers)
+
+    def produce(self):
+        if self.table is not None:
+            # production for all producers is done in one batch
+            self.table.init_cycle()
+            self.table.produce()
+        else:
+            for producer in self.producers:
+                producer.init_cycle()
+                producer.produce()
+
+    def init_cycle(self):
+        if self.table is not None:
+            self.table.init_cycle()
+            return
+        for producer in self.producers:
+            producer.init_cycle()
+
+    def producers_by_level(self):
+        # the producers that make the products of each level, as rows of the table or lists of producers
+        if self.table is not None:
+            levels = self.graph.level[self.table.product]
+            return [np.flatnonzero(levels == x) for x in range(self.graph.depth)]
+        groups = [[] for _ in range(self.graph.depth)]
+        for producer in self.producers:
+            groups[self.graph.level_of(producer.product.id)].append(producer)
+        return groups
+
+    def produce_level(self, producers):
+        if self.table is not None:
+            self.table.produce(producers)
+            return
+        for producer in producers:
+            producer.produce()
+
+    def get_level_sells(self, producers):
+        if self.table is not None:
+            return self.table_sells(producers)
+        sells = []
+        for producer in producers:
+            sells.extend(producer.get_sell_offers())
+        return sells
+
+    def run_engine(self, sells, buys, auctions):
+        engine = self.order_engine()
+        if engine is not None:
+            return engine(self.table, sells, buys, auctions)
+        return self.engine(sells, buys, auctions)
+
+    def clear_level(self, level, sells, buys):
+        return self.run_engine(sells, buys, self.level_auctions.setdefault(level, {}))
+
+    def clear(self, sells, buys):
+        return self.run_engine(sells, buys, self.auctions)
+
+    def update_history(self, auctions):
+        self.history.update_auctions(auctions)
+
+    def post_cycle(self):
+        if self.pricing is not None:
+            self.set_prices()
+            return
+        if self.table is not None:
+            # adjust_price_by_sales keeps every price as it is, so the rows are left alone, as a BatchedEconomy does
+            return
+        for producer in self.producers:
+            producer.post_cycle(self.history)
+
+    def pricing_state(self):
+        # the arrays a PricingEngine needs, from the table or the producers
+        requirements = self.requirements
+        producers = self.producers
+        if self.table is not None:
+            table = self.table
+            product, price, buy_limit, is_worker = table.product, table.sale_price, table.buy_limit, table.is_worker
+            # a row only sells its own product, so its sells and sales are summed straight from the arrays
+            offered = np.zeros(len(table))
+            sold = np.zeros(len(table))
+            value = np.zeros(len(table))
+            if len(table.cycles) > 0:
+                sells = table.cycles[-1].get('sells')
+                sales = table.cycles[-1].get('sales')
+                offered = np.bincount(sells.row, weights=sells.quantity, minlength=len(table))
+                sold = np.bincount(sales.row, weights=sales.quantity, minlength=len(table))
+                value = np.bincount(sales.row, weights=sales.actual * sales.quantity, minlength=len(table))
+        else:
+            sales = []
+            for producer in producers:
+                summary = producer.cycle_history[-1].summaries.get(producer.product.id)
+                if summary is None:
+                    sales.append((0.0, 0.0, 0.0))
+                else:
+                    sales.append((summary.offered, summary.sold, summary.value))
+            offered, sold, value = np.array(sales, dtype=np.float64).reshape(len(producers), 3).T
+            product = np.array([requirements.columns[x.product.id] for x in producers], dtype=np.int64)
+            price = np.array([x.sale_price for x in producers], dtype=np.float64)
+            buy_limit = np.array([x.buy_limit for x in producers], dtype=np.float64)
+            is_worker = np.array([isinstance(x, Workers) for x in producers], dtype=bool)
+        # the product statistics of the last cycle, by the columns of the requirements
+        columns = self.history.columns
+        stats = {x: np.zeros(len(requirements.products)) for x in STAT_FIELDS}
+        traded = np.zeros(len(requirements.products), dtype=bool)
+        if columns.total_cycles > 0:
+            row = columns.row(columns.total_cycles - 1)
+            for product_id, column in columns.columns.items():
+                if columns.traded[row, column]:
+                    traded[requirements.columns[product_id]] = True
+                    for field in STAT_FIELDS:
+                        stats[field][requirements.columns[product_id]] = columns.data[field][row, column]
+        return pricing_state(requirements, product, price.copy(), buy_limit.copy(), offered, sold, value, is_worker,
+                             stats, traded)
+
+    def set_prices(self):
+        price, buy_limit = self.pricing(self.pricing_state())
+        if self.table is not None:
+            self.table.sale_price[:] = price
+            self.table.buy_limit[:] = buy_limit
+            return
+        for producer, new_price, new_limit in zip(self.producers, price.tolist(), buy_limit.tolist()):
+            producer.sale_price = new_price
+            producer.buy_limit = new_limit
 
     def single_cycle(self):
         # the cycle is as follows
@@ -33,13 +262,78 @@ class Economy:
         # because of this, we can start by producing all the goods
         # once this is done, we can get all sells and buys, and then conduct the auction
         # it may be that it is better for producers to not sell all stock to start with
-        self.history.update_producers(self.producers)
-        for producer in self.producers:
-            producer.init_cycle()
-            producer.produce()
+        if self.staged:
+            self.staged_cycle()
+            return
+        if len(self.hooks) > 0:
+            self.instrumented_cycle()
+            return
+        self.update_producers()
+        self.produce()
         buys = self.get_all_buys()
         sells = self.get_all_sells()
-        auctions = auction(sells, buys)
-        self.history.update_auctions(auctions)
-        for producer in self.producers:
-            producer.post_cycle(self.history)
+        auctions = self.clear(sells, buys)
+        self.update_history(auctions)
+        self.post_cycle()
+
+    def run(self, cycles, fast_forward=False):
+        # run a number of cycles; fast_forward=True, or a fastforward.SteadyStateDetector, skips the
+        # cycles left once the economy repeats itself, and the FastForwardReport says how many were
+        from economics.fastforward import FastForwardReport, fast_forward as run_fast_forward
+        if not fast_forward:
+            for _ in range(cycles):
+                self.single_cycle()
+            return FastForwardReport(cycles)
+        detector = None
+        if fast_forward is not True:
+            detector = fast_forward
+        return run_fast_forward(self, cycles, detector)
+
+    def run_phase(self, phase, method, *args):
+        for hook in self.hooks:
+            hook.before_phase(self, phase)
+        result = method(*args)
+        for hook in self.hooks:
+            hook.after_phase(self, phase, result)
+        return result
+
+    def instrumented_cycle(self):
+        # the same as single_cycle, with the hooks called around every phase
+        for hook in self.hooks:
+            hook.start_cycle(self)
+        self.run_phase('update_producers', self.update_producers)
+        self.run_phase('produce', self.produce)
+        buys = self.run_phase('get_all_buys', self.get_all_buys)
+        sells = self.run_phase('get_all_sells', self.get_all_sells)
+        auctions = self.run_phase('auction', self.clear, sells, buys)
+        self.run_phase('update_auctions', self.update_history, auctions)
+        self.run_phase('post_cycle', self.post_cycle)
+        for hook in self.hooks:
+            hook.end_cycle(self)
+
+    def staged_cycle(self):
+        # production and the auctions run one level of the product graph at a time, lowest first
+        # the buys are all made at the start, for what was used in the last cycle, and the inputs of a level
+        # are all made and cleared in the levels below, so what a producer buys it can use in the same cycle
+        # the phases given to the hooks are numbered by level, as in produce_0, get_sells_0, auction_0
+        for hook in self.hooks:
+            hook.start_cycle(self)
+        self.run_phase('update_producers', self.update_producers)
+        self.run_phase('init_cycle', self.init_cycle)
+        buys = self.run_phase('get_all_buys', self.get_all_buys)
+        if isinstance(buys, Orders):
+            levels = self.graph.level[buys.product]
+            level_buys = [buys.subset(np.flatnonzero(levels == x)) for x in range(self.graph.depth)]
+        else:
+            level_buys = [[] for _ in range(self.graph.depth)]
+            for buy in buys:
+                level_buys[self.graph.level_of(buy.product_id)].append(buy)
+        auctions = []
+        for level, producers in enumerate(self.producers_by_level()):
+            self.run_phase(f'produce_{level}', self.produce_level, producers)
+            sells = self.run_phase(f'get_sells_{level}', self.get_level_sells, producers)
+            auctions.extend(self.run_phase(f'auction_{level}', self.clear_level, level, sells, level_buys[level]))
+        self.run_phase('update_auctions', self.update_history, auctions)
+        self.run_phase('post_cycle', self.post_cycle)
+        for hook in self.hooks:
+            hook.end_cycle(self)
@@ -0,0 +1,240 @@
+import argparse
+import copy
+import itertools
+import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from economics.errors import EconomyLoadError
+from economics.loader import create_economy, load_data_from_file
+
+# run the same scenario many times with changed parameters, over all cores
+# every run is given its own seed, and only a small summary of arrays comes back from each run
+# the summaries are then turned into percentile bands per product and cycle
+#
+# a spec looks like this:
+# {
+#     "runs": 100,
+#     "cycles": 50,
+#     "seed": 1,
+#     "sweep": {"workers.total": [8, 10, 12]},
+#     "randomize": {
+#         "producers.*.money": {"normal": [10, 1]},
+#         "products.food.requires.labor": {"scale": [0.9, 1.1]}
+#     }
+# }
+# every value in the sweep is run "runs" times, so the above is 300 economies
+# a parameter is a path into the config; lists are indexed by position, by "*" for every item,
+# or by name, so "products.food" is the product named food and "requires.labor" the labor requirement
+
+DEFAULT_RUNS = 10
+DEFAULT_CYCLES = 20
+DEFAULT_PERCENTILES = (5, 50, 95)
+SUMMARY_FIELDS = ['average_price', 'volume']
+
+
+def find_targets(node, parts, path):
+    # all the (container, key) pairs a parameter path points to
+    part = parts[0]
+    if isinstance(node, dict):
+        if part not in node:
+            raise EconomyLoadError(f'Error: No parameter {path}')
+        if len(parts) == 1:
+            return [(node, part)]
+        return find_targets(node[part], parts[1:], path)
+    if part == '*':
+        children = node
+    elif part.isdigit():
+        children = [node[int(part)]]
+    elif len(parts) == 1:
+        # e.g. a requirement, which is a dict of {name: quantity}
+        return [(x, part) for x in node if part in x]
+    else:
+        children = [x for x in node if x.get('name') == part]
+    if len(children) == 0:
+        raise EconomyLoadError(f'Error: No parameter {path}')
+    targets = []
+    for child in children:
+        if len(parts) == 1:
+            raise EconomyLoadError(f'Error: Parameter {path} is not a value')
+        targets.extend(find_targets(child, parts[1:], path))
+    return targets
+
+
+def sample(rng, distribution, value):
+    # distribution is a dict with a single entry, e.g. {"uniform": [8, 12]}
+    (kind, args), = distribution.items()
+    if kind == 'uniform':
+        return float(rng.uniform(*args))
+    if kind == 'normal':
+        return float(rng.normal(*args))
+    if kind == 'choice':
+        return args[int(rng.integers(len(args)))]
+    if kind == 'scale':
+        return value * float(rng.uniform(*args))
+    raise EconomyLoadError(f'Error: Unknown distribution {kind}')
+
+
+def set_parameter(data, path, value):
+    for container, key in find_targets(data, path.split('.'), path):
+        container[key] = value
+
+
+def randomize_parameter(data, path, distribution, rng):
+    # every target is sampled on its own, so each producer gets a different value
+    for container, key in find_targets(data, path.split('.'), path):
+        container[key] = sample(rng, distribution, container[key])
+
+
+class Run:
+    def __init__(self, index, seed, point, data):
+        self.index = index
+        # the seed the parameters of this run were drawn with, see Ensemble.configure
+        self.seed = seed
+        # the values of the swept parameters for this run
+        self.point = point
+        self.data = data
+
+
+class Summary:
+    # what is sent back from a run: the product names and an array for each field
+    # each array is indexed by [cycle, product]
+    def __init__(self, names, fields, money):
+        self.names = names
+        self.fields = fields
+        # the money of every producer at the end of the run
+        self.money = money
+
+
+def summarise(economy):
+    history = economy.history
+    names = [x.name for x in economy.products]
+    fields = {}
+    for field in SUMMARY_FIELDS:
+        fields[field] = np.stack([np.array(history.series(x.id, field)) for x in economy.products], axis=1)
+    money = np.array([x.money for x in economy.producers])
+    return Summary(names, fields, money)
+
+
+def run_economy(data, cycles, seed=None):
+    # runs in a worker process; the economy draws from the seed of its run
+    economy = create_economy(data, seed=seed)
+    for _ in range(cycles):
+        economy.single_cycle()
+    return summarise(economy)
+
+
+class EnsembleResult:
+    def __init__(self, runs, summaries):
+        self.runs = runs
+        self.summaries = summaries
+
+    @property
+    def names(self):
+        return self.summaries[0].names
+
+    def stack(self, field, point=None):
+        # the field for every run as a [run, cycle, product] array
+        # with a point given, only the runs for those sweep values
+        selected = [s for r, s in zip(self.runs, self.summaries) if point is None or r.point == point]
+        return np.stack([x.fields[field] for x in selected])
+
+    def bands(self, field, percentiles=DEFAULT_PERCENTILES, point=None):
+        # an array of [percentile, cycle, product]
+        return np.percentile(self.stack(field, point), percentiles, axis=0)
+
+    def points(self):
+        points = []
+        for run in self.runs:
+            if run.point not in points:
+                points.append(run.point)
+        return points
+
+
+class Ensemble:
+    def __init__(self, base, spec=None):
+        # base is the config data, as loaded from examples/*.json
+        if spec is None:
+            spec = {}
+        self.base = base
+        self.runs = spec.get('runs', DEFAULT_RUNS)
+        self.cycles = spec.get('cycles', DEFAULT_CYCLES)
+        self.seed = spec.get('seed', 0)
+        self.sweep = spec.get('sweep', {})
+        self.randomize = spec.get('randomize', {})
+
+    def configure(self, point, seed):
+        # the config of a single run, so that any run can be made again from its point and seed
+        rng = np.random.default_rng(seed)
+        data = copy.deepcopy(self.base)
+        for path, value in point.items():
+            set_parameter(data, path, value)
+        for path, distribution in self.randomize.items():
+            randomize_parameter(data, path, distribution, rng)
+        return data
+
+    def configurations(self):
+        paths = list(self.sweep.keys())
+        grid = list(itertools.product(*[self.sweep[x] for x in paths]))
+        # the spawned sequences all share the entropy of the root, so each run keeps a seed drawn from its own
+        seeds = np.random.SeedSequence(self.seed).spawn(len(grid) * self.runs)
+        all_runs = []
+        for values in grid:
+            point = dict(zip(paths, values))
+            for _ in range(self.runs):
+                seed = int(seeds[len(all_runs)].generate_state(1, np.uint64)[0])
+                all_runs.append(Run(len(all_runs), seed, point, self.configure(point, seed)))
+        return all_runs
+
+    def run(self, max_workers=None, callback=None):
+        # callback(run, summary) is called as each run finishes, in any order
+        all_runs = self.configurations()
+        summaries = [None] * len(all_runs)
+        with ProcessPoolExecutor(max_workers) as executor:
+            futures = {executor.submit(run_economy, x.data, self.cycles, x.seed): x for x in all_runs}
+            for future in as_completed(futures):
+                single_run = futures[future]
+                summaries[single_run.index] = future.result()
+                if callback is not None:
+                    callback(single_run, summaries[single_run.index])
+        return EnsembleResult(all_runs, summaries)
+
+
+def save_result(result, filepath, percentiles=DEFAULT_PERCENTILES):
+    arrays = {'names': np.array(result.names), 'percentiles': np.array(percentiles)}
+    for field in SUMMARY_FIELDS:
+        arrays[field] = result.bands(field, percentiles)
+    np.savez_compressed(filepath, **arrays)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Run an economy many times with changed parameters')
+    parser.add_argument('config', help='the economy config, e.g. examples/basic.json')
+    parser.add_argument('--spec', help='a json file with the sweep and randomization spec')
+    parser.add_argument('--runs', type=int, help='runs for every sweep value')
+    parser.add_argument('--cycles', type=int, help='cycles in every run')
+    parser.add_argument('--seed', type=int, help='the seed for all runs')
+    parser.add_argument('--workers', type=int, help='the number of processes')
+    parser.add_argument('--output', help='save the percentile bands to this .npz file')
+    options = parser.parse_args(args)
+    spec = {}
+    if options.spec is not None:
+        with open(options.spec) as spec_file:
+            spec = json.load(spec_file)
+    for key in ['runs', 'cycles', 'seed']:
+        if getattr(options, key) is not None:
+            spec[key] = getattr(options, key)
+    ensemble = Ensemble(load_data_from_file(options.config), spec)
+    result = ensemble.run(options.workers)
+    bands = result.bands('average_price')
+    print(f'{len(result.runs)} runs of {ensemble.cycles} cycles')
+    for column, name in enumerate(result.names):
+        low, median, high = bands[:, -1, column]
+        print(f'{name}: final price {median:.2f} ({low:.2f}->{high:.2f})')
+    if options.output is not None:
+        save_result(result, options.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,344 @@
+import json
+import os
+import queue
+import struct
+import threading
+
+import numpy as np
+
+from economics.history import STAT_FIELDS
+from economics.metrics import CycleHook, cycle_phase
+
+# a streaming record of every cycle, for runs too long to keep in memory and for offline analysis
+# EventLog is a hook: economy.add_hook(EventLog('run.log')) and every cycle is written out
+# the log holds, for every cycle, the product statistics, every fill and the money and stock of every producer
+# cycles are collected into batches, and a background thread writes each batch as one chunk
+# a chunk is a json header followed by its arrays, one per column, so a reader can map them without copying
+# the file starts with LOG_MAGIC, and alongside it filepath.index holds (first cycle, cycles, offset) per chunk
+# EventLogReader memory maps the log and returns the series for a single product or producer
+
+LOG_MAGIC = b'ECONLOG1'
+# every header and array starts on a multiple of this
+ALIGNMENT = 8
+HEADER_LENGTH = struct.Struct('<Q')
+
+
+def index_path(filepath):
+    return f'{filepath}.index'
+
+
+def padding(length):
+    return (ALIGNMENT - length % ALIGNMENT) % ALIGNMENT
+
+
+def build_chunk(records):
+    # turn a batch of cycle records into one set of columns
+    cycles = np.array([x['cycle'] for x in records], dtype=np.int64)
+    stat_counts = [len(x['stat_product']) for x in records]
+    fill_counts = [len(x['fill_product']) for x in records]
+    columns = {'cycles': cycles,
+               'stat_cycle': np.repeat(cycles, stat_counts),
+               'stat_product': np.concatenate([x['stat_product'] for x in records]),
+               'fill_cycle': np.repeat(cycles, fill_counts),
+               'fill_product': np.concatenate([x['fill_product'] for x in records]),
+               'fill_quantity': np.concatenate([x['fill_quantity'] for x in records]),
+               'fill_price': np.concatenate([x['fill_price'] for x in records])}
+    for field in STAT_FIELDS:
+        columns[f'stat_{field}'] = np.concatenate([x[field] for x in records])
+    if 'money' in records[0]:
+        # the producers and products do not change during a run, so are stored once per chunk
+        columns['producer_ids'] = records[0]['producer_ids']
+        columns['product_ids'] = records[0]['product_ids']
+        columns['money'] = np.stack([x['money'] for x in records])
+        columns['stock'] = np.stack([x['stock'] for x in records])
+    return columns
+
+
+def write_chunk(log_file, columns, header):
+    # write the arrays after a json header; anything in header is kept in it
+    # returns the number of bytes written
+    arrays = {}
+    offset = 0
+    for name, array in columns.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += array.nbytes + padding(array.nbytes)
+    header = json.dumps(dict(header, arrays=arrays)).encode()
+    header += b' ' * padding(HEADER_LENGTH.size + len(header))
+    log_file.write(HEADER_LENGTH.pack(len(header)))
+    log_file.write(header)
+    for array in columns.values():
+        array = np.ascontiguousarray(array)
+        log_file.write(array.tobytes())
+        log_file.write(b'\0' * padding(array.nbytes))
+    return HEADER_LENGTH.size + len(header) + offset
+
+
+def read_header(data, offset):
+    # the header of the chunk at offset in data, a uint8 array; None if the chunk is not all there
+    length, = HEADER_LENGTH.unpack(bytes(data[offset:offset + HEADER_LENGTH.size]))
+    start = offset + HEADER_LENGTH.size
+    if start + length > len(data):
+        return None
+    header = json.loads(bytes(data[start:start + length]))
+    header['start'] = start + length
+    header['length'] = HEADER_LENGTH.size + length
+    for info in header['arrays'].values():
+        nbytes = int(np.prod(info['shape'])) * np.dtype(info['dtype']).itemsize
+        header['length'] += nbytes + padding(nbytes)
+    if offset + header['length'] > len(data):
+        return None
+    return header
+
+
+def chunk_array(data, header, name):
+    # a view onto data, with no copy made
+    info = header['arrays'][name]
+    return np.ndarray(info['shape'], dtype=np.dtype(info['dtype']), buffer=data, offset=header['start'] + info['offset'])
+
+
+class LogWriter:
+    # writes batches on a background thread; at most max_pending batches wait to be written
+    def __init__(self, filepath, max_pending=4):
+        self.filepath = filepath
+        self.log_file = open(filepath, 'wb')
+        self.log_file.write(LOG_MAGIC)
+        self.index_file = open(index_path(filepath), 'wb')
+        self.offset = len(LOG_MAGIC)
+        self.batches = queue.Queue(max_pending)
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            records = self.batches.get()
+            if records is None:
+                break
+            if self.error is not None:
+                # keep taking batches so the simulation is never blocked
+                continue
+            try:
+                self.write(records)
+            except Exception as error:
+                self.error = error
+
+    def write(self, records):
+        columns = build_chunk(records)
+        length = write_chunk(self.log_file, columns, {'cycles': len(records)})
+        self.log_file.flush()
+        # the index is only written once the chunk is complete
+        first_cycle = int(columns['cycles'][0])
+        self.index_file.write(np.array([first_cycle, len(records), self.offset], dtype=np.int64).tobytes())
+        self.index_file.flush()
+        self.offset += length
+
+    def check(self):
+        if self.error is not None:
+            raise self.error
+
+    def submit(self, records):
+        self.check()
+        self.batches.put(records)
+
+    def close(self):
+        self.batches.put(None)
+        self.thread.join()
+        self.log_file.close()
+        self.index_file.close()
+        self.check()
+
+
+class EventLog(CycleHook):
+    # write every cycle of an economy to filepath
+    # batch_cycles is the number of cycles in a chunk; producers=False leaves out the producer snapshots
+    def __init__(self, filepath, batch_cycles=100, producers=True, max_pending=4):
+        self.filepath = filepath
+        self.batch_cycles = batch_cycles
+        self.producers = producers
+        self.writer = LogWriter(filepath, max_pending)
+        self.records = []
+        self.auctions = []
+
+    def after_phase(self, economy, phase, result):
+        # a staged cycle has an auction for each level
+        if cycle_phase(phase) == 'auction':
+            self.auctions.extend(result)
+
+    def end_cycle(self, economy):
+        self.records.append(self.cycle_record(economy))
+        self.auctions = []
+        if len(self.records) >= self.batch_cycles:
+            self.flush()
+
+    def cycle_record(self, economy):
+        # everything in a record is a new array, so the writer can use it while the economy runs on
+        history = economy.history
+        columns = history.columns
+        row = columns.row(history.total_cycles - 1)
+        traded = np.flatnonzero(columns.traded[row])
+        product_ids = np.array(list(columns.columns.keys()), dtype=np.int64)
+        record = {'cycle': history.total_cycles - 1, 'stat_product': product_ids[traded]}
+        for field in STAT_FIELDS:
+            record[field] = columns.data[field][row, traded]
+        fills = [x.fill_arrays() for x in self.auctions]
+        record['fill_product'] = np.repeat(np.array([x.product_id for x in self.auctions], dtype=np.int64),
+                                           [len(x[0]) for x in fills])
+        record['fill_quantity'] = np.concatenate([x[0] for x in fills] + [np.zeros(0)])
+        record['fill_price'] = np.concatenate([x[1] for x in fills] + [np.zeros(0)])
+        if self.producers:
+            record.update(self.producer_snapshot(economy))
+        return record
+
+    def producer_snapshot(self, economy):
+        product_ids = [x.id for x in economy.products]
+        snapshot = {'product_ids': np.array(product_ids, dtype=np.int64)}
+        if economy.table is not None:
+            table = economy.table
+            snapshot['producer_ids'] = table.ids.copy()
+            snapshot['money'] = table.money.copy()
+            # the table columns are in the same order as the products
+            snapshot['stock'] = table.stock.copy()
+            return snapshot
+        producers = economy.producers
+        snapshot['producer_ids'] = np.array([x.id for x in producers], dtype=np.int64)
+        snapshot['money'] = np.array([x.money for x in producers], dtype=np.float64)
+        stock = [[x.stock.get(y, 0.0) for y in product_ids] for x in producers]
+        snapshot['stock'] = np.array(stock, dtype=np.float64).reshape(len(producers), len(product_ids))
+        return snapshot
+
+    def flush(self):
+        if len(self.records) > 0:
+            self.writer.submit(self.records)
+            self.records = []
+
+    def close(self):
+        # write what is left and wait for the writer to finish
+        self.flush()
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class EventLogReader:
+    # read a log written by EventLog; only the chunks that are asked for are read from disk
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.data = np.memmap(filepath, dtype=np.uint8, mode='r')
+        if bytes(self.data[:len(LOG_MAGIC)]) != LOG_MAGIC:
+            raise ValueError(f'Error: {filepath} is not an event log')
+        self.index = self.load_index()
+        # {chunk: header}
+        self.headers = {}
+
+    def load_index(self):
+        if os.path.exists(index_path(self.filepath)):
+            index = np.fromfile(index_path(self.filepath), dtype=np.int64)
+            return index[:len(index) // 3 * 3].reshape(-1, 3)
+        return self.scan_index()
+
+    def scan_index(self):
+        # without an index file, walk the chunks from the start of the log
+        entries = []
+        offset = len(LOG_MAGIC)
+        while offset + HEADER_LENGTH.size <= len(self.data):
+            header = read_header(self.data, offset)
+            if header is None:
+                # a chunk that was never finished
+                break
+            first_cycle = int(chunk_array(self.data, header, 'cycles')[0])
+            entries.append((first_cycle, header['cycles'], offset))
+            offset += header['length']
+        return np.array(entries, dtype=np.int64).reshape(len(entries), 3)
+
+    def chunk(self, number):
+        # {name: array} for a chunk
+        offset = int(self.index[number, 2])
+        if number not in self.headers:
+            self.headers[number] = read_header(self.data, offset)
+        header = self.headers[number]
+        return {x: chunk_array(self.data, header, x) for x in header['arrays']}
+
+    def __len__(self):
+        # the number of cycles in the log
+        return int(self.index[:, 1].sum())
+
+    def cycles(self):
+        return np.concatenate([self.chunk(x)['cycles'] for x in range(len(self.index))] + [np.zeros(0, np.int64)])
+
+    def chunks(self, start=None, stop=None):
+        # the chunks holding any cycles from start up to but not including stop
+        first = self.index[:, 0]
+        last = first + self.index[:, 1]
+        selected = np.ones(len(self.index), dtype=bool)
+        if start is not None:
+            selected &= last > start
+        if stop is not None:
+            selected &= first < stop
+        return np.flatnonzero(selected).tolist()
+
+    def select(self, name, start, stop, columns, mask=None):
+        # the named columns of every chunk between start and stop, joined together
+        # mask(chunk) picks out the rows wanted in each chunk
+        results = [[] for _ in columns]
+        for number in self.chunks(start, stop):
+            chunk = self.chunk(number)
+            cycles = chunk[name]
+            wanted = np.ones(len(cycles), dtype=bool)
+            if start is not None:
+                wanted &= cycles >= start
+            if stop is not None:
+                wanted &= cycles < stop
+            if mask is not None:
+                wanted &= mask(chunk)
+            for result, column in zip(results, columns):
+                result.append(chunk[column][wanted])
+        return [np.concatenate(x) if len(x) > 0 else np.zeros(0) for x in results]
+
+    def product_series(self, product_id, field, start=None, stop=None):
+        # (cycles, values) for the cycles the product was traded in
+        cycles, values = self.select('stat_cycle', start, stop, ['stat_cycle', f'stat_{field}'],
+                                     lambda x: x['stat_product'] == product_id)
+        return cycles.astype(np.int64), values
+
+    def transactions(self, product_id=None, start=None, stop=None):
+        # {'cycle', 'product', 'quantity', 'price'} for every fill
+        mask = None
+        if product_id is not None:
+            mask = lambda x: x['fill_product'] == product_id
+        names = ['fill_cycle', 'fill_product', 'fill_quantity', 'fill_price']
+        cycle, product, quantity, price = self.select('fill_cycle', start, stop, names, mask)
+        return {'cycle': cycle.astype(np.int64), 'product': product.astype(np.int64),
+                'quantity': quantity, 'price': price}
+
+    def producer_series(self, producer_id, product_id=None, start=None, stop=None):
+        # (cycles, money), or (cycles, stock of product_id) if it is given
+        cycles = []
+        values = []
+        for number in self.chunks(start, stop):
+            chunk = self.chunk(number)
+            if 'money' not in chunk:
+                raise ValueError('Error: The log has no producer snapshots')
+            wanted = np.ones(len(chunk['cycles']), dtype=bool)
+            if start is not None:
+                wanted &= chunk['cycles'] >= start
+            if stop is not None:
+                wanted &= chunk['cycles'] < stop
+            row = np.flatnonzero(chunk['producer_ids'] == producer_id)
+            if len(row) == 0:
+                continue
+            cycles.append(chunk['cycles'][wanted])
+            if product_id is None:
+                values.append(chunk['money'][wanted, row[0]])
+            else:
+                column = np.flatnonzero(chunk['product_ids'] == product_id)
+                if len(column) == 0:
+                    raise ValueError(f'Error: The log has no product {product_id}')
+                values.append(chunk['stock'][wanted, row[0], column[0]])
+        if len(cycles) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        return np.concatenate(cycles), np.concatenate(values)
@@ -0,0 +1,175 @@
+from collections import deque
+
+import numpy as np
+
+from economics.history import STAT_FIELDS
+from economics.producer import Workers
+
+# skip the cycles of an economy that has settled down
+# a cycle depends only on part of the state of the economy when it starts: the stock, prices, buy limits and
+# last consumption of the producers, the money of the workers, the product statistics of the last cycle,
+# and the random generator; this is the driving state
+# the money of producers and the stock of workers are never read by a cycle, only added to, and so can
+# keep growing or shrinking in an economy that has otherwise settled; this is the accumulated state
+# once the driving state comes back to what it was period cycles before, and the accumulated state changes
+# by the same amount every period, every later cycle repeats those period cycles
+# SteadyStateDetector watches the state after every cycle and finds the shortest period it repeats with;
+# fast_forward() then adds the remaining whole periods to the history as a single repeat entry, and moves
+# the accumulated state on by the same number of periods, instead of running them
+#     report = economy.run(100000, fast_forward=True)
+#     print(report.skipped)
+# hooks are not called for skipped cycles, and the state is only compared within a tolerance,
+# so a run that is not quite settled can come out a little different from one that runs every cycle
+
+
+def economy_state(economy):
+    # (driving state, accumulated state), as two arrays
+    if economy.table is not None:
+        table = economy.table
+        workers = table.is_worker
+        driving = [table.stock[~workers], table.money[workers], table.sale_price, table.buy_limit,
+                   table.last_consumption, table.workers]
+        accumulated = [table.money[~workers], table.stock[workers]]
+    else:
+        producers = economy.producers
+        product_ids = [x.id for x in economy.products]
+        workers = [x for x in producers if isinstance(x, Workers)]
+        others = [x for x in producers if not isinstance(x, Workers)]
+        driving = [[[x.stock.get(y, 0.0) for y in product_ids] for x in others],
+                   [x.money for x in workers],
+                   [x.sale_price for x in producers],
+                   [x.buy_limit for x in producers],
+                   [[x.last_consumption.get(y, 0.0) for y in product_ids] for x in producers],
+                   [x.workers if isinstance(x, Workers) else 0.0 for x in producers]]
+        accumulated = [[x.money for x in others], [[x.stock.get(y, 0.0) for y in product_ids] for x in workers]]
+    columns = economy.history.columns
+    if columns.total_cycles > 0:
+        row = columns.row(columns.total_cycles - 1)
+        driving.extend([columns.data[x][row, :len(columns.columns)] for x in STAT_FIELDS])
+        driving.append(columns.traded[row, :len(columns.columns)])
+    return flatten(driving), flatten(accumulated)
+
+
+def flatten(arrays):
+    return np.concatenate([np.ravel(np.asarray(x, dtype=np.float64)) for x in arrays])
+
+
+def add_accumulated(economy, change):
+    # add to the accumulated state, laid out as economy_state makes it
+    if economy.table is not None:
+        table = economy.table
+        workers = table.is_worker
+        others = int((~workers).sum())
+        table.money[~workers] += change[:others]
+        table.stock[workers] += change[others:].reshape(-1, table.stock.shape[1])
+        return
+    product_ids = [x.id for x in economy.products]
+    others = [x for x in economy.producers if not isinstance(x, Workers)]
+    workers = [x for x in economy.producers if isinstance(x, Workers)]
+    for producer, money in zip(others, change[:len(others)].tolist()):
+        producer.money += money
+    stock = change[len(others):].reshape(len(workers), len(product_ids))
+    for producer, amounts in zip(workers, stock.tolist()):
+        for product_id, amount in zip(product_ids, amounts):
+            if amount != 0.0:
+                producer.stock[product_id] = producer.stock.get(product_id, 0.0) + amount
+
+
+class SteadyStateDetector:
+    # tolerance is relative and absolute, as for np.allclose
+    # a period counts once the state has matched the state a period earlier for repeats whole periods in a row
+    def __init__(self, tolerance=1e-12, max_period=8, repeats=3):
+        self.tolerance = tolerance
+        self.max_period = max_period
+        self.repeats = repeats
+        length = max_period * (repeats + 1) + 1
+        self.driving = deque(maxlen=length)
+        self.accumulated = deque(maxlen=length)
+        self.rng_states = deque(maxlen=length)
+
+    def reset(self):
+        self.driving.clear()
+        self.accumulated.clear()
+        self.rng_states.clear()
+
+    def observe(self, economy):
+        # call after every cycle
+        driving, accumulated = economy_state(economy)
+        self.driving.append(driving)
+        self.accumulated.append(accumulated)
+        self.rng_states.append(economy.rng.bit_generator.state)
+
+    def same(self, first, second):
+        if first.shape != second.shape:
+            return False
+        return np.allclose(first, second, rtol=self.tolerance, atol=self.tolerance)
+
+    def repeats_with(self, period):
+        for back in range(self.repeats * period):
+            now = -1 - back
+            before = now - period
+            if not self.same(self.driving[now], self.driving[before]):
+                return False
+            if self.rng_states[now] != self.rng_states[before]:
+                return False
+            # the change over each cycle repeats too
+            if not self.same(self.accumulated[now] - self.accumulated[now - 1],
+                             self.accumulated[before] - self.accumulated[before - 1]):
+                return False
+        return True
+
+    def period(self):
+        # the shortest period the state repeats with, or None
+        for period in range(1, self.max_period + 1):
+            if len(self.driving) < (self.repeats + 1) * period + 1:
+                return None
+            if self.repeats_with(period):
+                return period
+
+    def drift(self, period):
+        # the change in the accumulated state over one period
+        return self.accumulated[-1] - self.accumulated[-1 - period]
+
+
+class FastForwardReport:
+    # ran is the cycles that were run, skipped those added as repeats; period is None if none were skipped
+    def __init__(self, ran=0, skipped=0, period=None, first_skipped=None):
+        self.ran = ran
+        self.skipped = skipped
+        self.period = period
+        self.first_skipped = first_skipped
+
+    @property
+    def cycles(self):
+        return self.ran + self.skipped
+
+    def __repr__(self):
+        if self.skipped == 0:
+            return f'Ran {self.ran} cycles, none skipped'
+        return f'Ran {self.ran} cycles, skipped {self.skipped} from cycle {self.first_skipped} (period {self.period})'
+
+
+def fast_forward(economy, cycles, detector=None):
+    # run the economy for some cycles, skipping them once it repeats
+    if detector is None:
+        detector = SteadyStateDetector()
+    detector.reset()
+    report = FastForwardReport()
+    while report.cycles < cycles:
+        economy.single_cycle()
+        report.ran += 1
+        if report.skipped > 0:
+            # what is left is less than a period
+            continue
+        detector.observe(economy)
+        period = detector.period()
+        if period is None:
+            continue
+        skip = (cycles - report.cycles) // period * period
+        if skip > 0:
+            report.first_skipped = economy.history.total_cycles
+            report.period = period
+            report.skipped = skip
+            economy.history.repeat(period, skip)
+            add_accumulated(economy, detector.drift(period) * (skip // period))
+    return report
@@ -0,0 +1,97 @@
+import numpy as np
+
+from economics.errors import EconomyLoadError
+
+# the products and what they are made from, as a graph that is worked out once when an economy is loaded
+# an edge goes from every input to the product that requires it, and the graph must have no cycles
+# the level of a product is the length of the longest chain of inputs below it: products made from nothing
+# are level 0, and every product is at a higher level than all of its inputs
+# an economy with staged=True produces and clears the products one level at a time within a cycle,
+# so goods made at one level are bought and used by the next in the same cycle
+# producers in the same level never trade with each other in that step, and the auctions of a level are
+# for different products, so each level can be split up and run in parallel on its own
+
+
+class ProductGraph:
+    def __init__(self, requirements):
+        # everything is by the columns of the requirements, as in the ProducerTable
+        self.products = requirements.products
+        self.columns = requirements.columns
+        coefficients = requirements.coefficients
+        total_products = len(self.products)
+        self.inputs = [np.flatnonzero(coefficients[x] > 0) for x in range(total_products)]
+        self.order = self.topological_order()
+        # level[column] is the level of the product
+        self.level = np.zeros(total_products, dtype=np.int64)
+        for column in self.order:
+            if len(self.inputs[column]) > 0:
+                self.level[column] = self.level[self.inputs[column]].max() + 1
+        # the columns of the products at each level, lowest first
+        self.levels = [np.flatnonzero(self.level == x) for x in range(int(self.level.max(initial=0)) + 1)]
+        # upstream[a, b] is true if product b goes into product a, directly or through other products
+        # total[a, b] is the amount of product b used up to make one unit of product a, counting the inputs of
+        # its inputs; inputs come before the products that need them, so each row only adds finished rows
+        self.upstream = np.zeros((total_products, total_products), dtype=bool)
+        self.total = np.zeros((total_products, total_products))
+        for column in self.order:
+            for input_column in self.inputs[column]:
+                amount = coefficients[column, input_column]
+                self.upstream[column, input_column] = True
+                self.upstream[column] |= self.upstream[input_column]
+                self.total[column, input_column] += amount
+                self.total[column] += amount * self.total[input_column]
+
+    def topological_order(self):
+        # inputs first, by Kahn's algorithm; anything left over is on a cycle
+        waiting = [len(x) for x in self.inputs]
+        users = [[] for _ in self.inputs]
+        for column, inputs in enumerate(self.inputs):
+            for input_column in inputs:
+                users[input_column].append(column)
+        ready = [x for x, count in enumerate(waiting) if count == 0]
+        order = []
+        while len(ready) > 0:
+            column = ready.pop(0)
+            order.append(column)
+            for user in users[column]:
+                waiting[user] -= 1
+                if waiting[user] == 0:
+                    ready.append(user)
+        if len(order) < len(self.inputs):
+            cycle = self.find_cycle(set(range(len(self.inputs))) - set(order))
+            names = ' -> '.join([self.products[x].name for x in cycle])
+            raise EconomyLoadError(f'Error: Products require each other in a cycle: {names}')
+        return order
+
+    def find_cycle(self, remaining):
+        # follow inputs that are left over until one comes round again
+        column = min(remaining)
+        path = []
+        while column not in path:
+            path.append(column)
+            column = [x for x in self.inputs[column].tolist() if x in remaining][0]
+        return path[path.index(column):] + [column]
+
+    @property
+    def depth(self):
+        return len(self.levels)
+
+    def level_of(self, product_id):
+        return int(self.level[self.columns[product_id]])
+
+    def upstream_of(self, product_id):
+        # the ids of every product that goes into this one, directly or not
+        return [self.products[x].id for x in np.flatnonzero(self.upstream[self.columns[product_id]])]
+
+    def downstream_of(self, product_id):
+        # the ids of every product this one goes into, directly or not
+        return [self.products[x].id for x in np.flatnonzero(self.upstream[:, self.columns[product_id]])]
+
+    def total_inputs(self, product_id):
+        # {product_id: amount} of everything used up to make one unit of the product
+        row = self.total[self.columns[product_id]]
+        return {self.products[x].id: float(row[x]) for x in np.flatnonzero(row)}
+
+
+def build_graph(requirements):
+    return ProductGraph(requirements)
@@ -1,3 +1,7 @@
+import functools
+
+import numpy as np
+
 # stratagies a producer could take
 
 
@@ -10,3 +14,137 @@ def adjust_price_by_sales(producer, history):
     producer_sales = producer.cycle_history[-1].get_sale_info(producer.product.id)
     market_sales = history.get_last_sales(producer.product.id)
     return producer.sale_price
+
+
+# the same decisions made for a whole population of producers at once
+# a strategy is a function of a PricingState, which holds one entry per producer, and returns
+# the next sale price and buy limit of every producer in it; the buy limit is the most a
+# producer will pay for a unit of any of its inputs
+# a PricingEngine runs a number of strategies side by side, each over the producers assigned to it:
+#     engine = PricingEngine([strategy('sell_through', target=0.8), strategy('cost_plus')], assignment)
+#     economy = load_economy(filepath, vectorized=True, pricing=engine)
+# without an engine, every producer still calls adjust_price_by_sales on its own
+# the lowest price any strategy will set
+PRICE_FLOOR = 0.01
+
+
+class PricingState:
+    # the sales of the last cycle, and the market of each producer's product and inputs
+    def __init__(self, price, buy_limit, offered, sold, value, is_worker, market_price, market_volume,
+                 market_unsold, market_unfilled, traded, input_cost, input_units):
+        self.price = price
+        self.buy_limit = buy_limit
+        # of the producer's own product: offered, sold and the money made
+        self.offered = offered
+        self.sold = sold
+        self.value = value
+        self.is_worker = is_worker
+        # the average price, volume, unsold and unfilled orders of the producer's product
+        # traded is false if it was not auctioned last cycle, and the others are then zero
+        self.market_price = market_price
+        self.market_volume = market_volume
+        self.market_unsold = market_unsold
+        self.market_unfilled = market_unfilled
+        self.traded = traded
+        # what the inputs of one unit cost at last cycle's prices, and how many units of input that is
+        self.input_cost = input_cost
+        self.input_units = input_units
+
+    def __len__(self):
+        return len(self.price)
+
+    def subset(self, rows):
+        return PricingState(*[getattr(self, x)[rows] for x in PRICING_FIELDS])
+
+
+PRICING_FIELDS = ['price', 'buy_limit', 'offered', 'sold', 'value', 'is_worker', 'market_price', 'market_volume',
+                  'market_unsold', 'market_unfilled', 'traded', 'input_cost', 'input_units']
+
+
+def pricing_state(requirements, product, price, buy_limit, offered, sold, value, is_worker, stats, traded,
+                  economy=None):
+    # product is the column each producer makes, and the other arguments are per producer
+    # stats is {field: economies x products} and traded the same shape, as made by BatchedEconomy.cycle_stats
+    # for a single economy they can be one dimensional, and economy is then not needed
+    traded = np.atleast_2d(traded)
+    stats = {x: np.atleast_2d(y) for x, y in stats.items()}
+    if economy is None:
+        economy = np.zeros(len(product), dtype=np.int64)
+    market = {x: y[economy, product] for x, y in stats.items()}
+    # an input that was not traded is costed at the buy limit, the most that would have been paid for it
+    inputs = requirements.inputs[product]
+    amounts = requirements.amounts[product]
+    input_prices = np.where(traded[economy[:, None], inputs], stats['average_price'][economy[:, None], inputs],
+                            buy_limit[:, None])
+    input_cost = (amounts * input_prices).sum(axis=1)
+    return PricingState(price, buy_limit, offered, sold, value, is_worker, market['average_price'],
+                        market['volume'], market['unsold'], market['unfilled_orders'], traded[economy, product],
+                        input_cost, amounts.sum(axis=1))
+
+
+def keep_price(state):
+    # the same as adjust_price_by_sales
+    return state.price.copy(), state.buy_limit.copy()
+
+
+def sell_through(state, target=0.9, step=0.05):
+    # aim to sell a target share of what is offered: raise the price when more is sold, lower it when less
+    # a producer that offered nothing keeps its price
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(state.offered > 0, state.sold / state.offered, target)
+    change = np.where(ratio > target, 1.0 + step, np.where(ratio < target, 1.0 - step, 1.0))
+    return np.maximum(state.price * change, PRICE_FLOOR), state.buy_limit.copy()
+
+
+def cost_plus(state, markup=0.1):
+    # a markup over what the inputs cost; the buy limit is what can be paid for inputs without a loss
+    makes = state.input_units > 0
+    price = np.where(makes, np.maximum(state.input_cost * (1.0 + markup), PRICE_FLOOR), state.price)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        buy_limit = np.where(makes, price / state.input_units, state.buy_limit)
+    return price, buy_limit
+
+
+def follow_market(state, weight=0.5):
+    # move part of the way towards the average price the product sold for
+    price = np.where(state.traded, state.price + weight * (state.market_price - state.price), state.price)
+    return np.maximum(price, PRICE_FLOOR), state.buy_limit.copy()
+
+
+STRATEGIES = {'keep': keep_price,
+              'sell_through': sell_through,
+              'cost_plus': cost_plus,
+              'follow_market': follow_market}
+
+
+def strategy(name, **params):
+    # a strategy by name, with its parameters set
+    if name not in STRATEGIES:
+        raise ValueError(f'Error: Unknown pricing strategy {name}')
+    return functools.partial(STRATEGIES[name], **params)
+
+
+class PricingEngine:
+    # strategies is a list of strategies; assignment gives the strategy of every producer, by index
+    # without an assignment every producer uses the first strategy
+    # workers are never priced: their labor sells at a fixed cost and they spend all they have on food
+    def __init__(self, strategies, assignment=None):
+        if callable(strategies):
+            strategies = [strategies]
+        self.strategies = strategies
+        self.assignment = assignment
+
+    def __call__(self, state):
+        # the next sale price and buy limit of every producer
+        price = state.price.copy()
+        buy_limit = state.buy_limit.copy()
+        assignment = self.assignment
+        if assignment is None:
+            assignment = np.zeros(len(state), dtype=np.int64)
+        elif len(assignment) != len(state):
+            raise ValueError('Error: A pricing assignment needs one strategy for every producer')
+        for index, pricing in enumerate(self.strategies):
+            rows = np.flatnonzero((assignment == index) & ~state.is_worker)
+            if len(rows) > 0:
+                price[rows], buy_limit[rows] = pricing(state.subset(rows))
+        return price, buy_limit
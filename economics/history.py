@@ -1,8 +1,10 @@
 import math
-import statistics
-import matplotlib
-matplotlib.use('TkAgg')
-import matplotlib.pyplot as plt
+from collections.abc import Sequence
+
+import numpy as np
+
+from economics.rolling import RollingStats
+from economics.tiers import TieredStore
 
 
 # take a step back
@@ -20,6 +22,8 @@ import matplotlib.pyplot as plt
 
 
 class PriceRange:
+    __slots__ = ['min_price', 'max_price']
+
     def __init__(self, min_price, max_price):
         self.min_price = float(min_price)
         self.max_price = float(max_price)
@@ -34,12 +38,14 @@ class PriceRange:
 
 class ProductCycleStats:
     # represents what happened to a product in a given cycle
+    __slots__ = ['price_range', 'average_price', 'volume', 'unsold', 'unfilled_orders']
+
     def __init__(self, max_p, min_p, avg, vol, unsold, unfilled):
         self.price_range = PriceRange(min_p, max_p)
         self.average_price = avg
         self.volume = vol
-        self.unsold = 0
-        self.unfilled_orders = 0
+        self.unsold = unsold
+        self.unfilled_orders = unfilled
 
     def __repr__(self):
         return f'{self.price_range}, Avg: {self.average_price:.2f}, Vol: {self.volume:.2f}'
@@ -58,26 +64,243 @@ class CycleInfo:
         self.goods = goods
 
 
+class RepeatInfo:
+    # stands for cycles skipped by fast forwarding, which repeat the last period cycles before them
+    def __init__(self, first_cycle, period, cycles):
+        self.first_cycle = first_cycle
+        self.period = period
+        self.cycles = cycles
+
+    def __repr__(self):
+        return f'Repeat: {self.cycles} cycles from {self.first_cycle}, period {self.period}'
+
+
+class CycleHistory(Sequence):
+    # the cycles held by a ColumnStore as a CycleInfo each, with a single RepeatInfo for cycles added by repeat()
+    # nothing more is stored, and each entry is made from the columns when it is read
+    # the producers of a cycle are not kept, so goods is always empty
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __len__(self):
+        columns = self.columns
+        if columns.max_cycles is not None:
+            # a ring buffer writes out repeated cycles as rows of their own
+            return len(columns)
+        return columns.total_cycles - columns.skipped + len(columns.repeats)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[x] for x in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('Error: Cycle history out of range')
+        columns = self.columns
+        cycle = columns.total_cycles - len(columns) + index
+        for first_cycle, period, cycles in columns.repeats:
+            if cycle < first_cycle:
+                break
+            if cycle == first_cycle:
+                return RepeatInfo(first_cycle, period, cycles)
+            # past the repeat, which is one entry for all of its cycles
+            cycle += cycles - 1
+        return CycleInfo(columns.trades(cycle), [])
+
+
+# the rolling windows kept by default, in cycles
+DEFAULT_WINDOWS = (10,)
+
+# the statistics kept for every product in every cycle
+STAT_FIELDS = ['average_price', 'min_price', 'max_price', 'volume', 'unsold', 'unfilled_orders']
+
+
+class ColumnStore:
+    # the product statistics as columns: one array per field, indexed by [cycle, product]
+    # the arrays double in size when full, so appending a cycle is O(1) on average
+    # if max_cycles is set the rows are used as a ring buffer and only the latest cycles are kept
+    def __init__(self, max_cycles=None, capacity=64):
+        self.max_cycles = max_cycles
+        if max_cycles is not None:
+            capacity = max_cycles
+        # product ids are global, so every product seen is given a column
+        self.columns = {}
+        self.data = {x: np.zeros((capacity, 4)) for x in STAT_FIELDS}
+        # true if the product was auctioned in this cycle
+        self.traded = np.zeros((capacity, 4), dtype=bool)
+        # the total number of cycles ever added
+        self.total_cycles = 0
+        # cycles added by repeat() that have no row of their own, as [first cycle, period, cycles]
+        self.repeats = []
+        self.skipped = 0
+
+    @property
+    def capacity(self):
+        return len(self.traded)
+
+    def __len__(self):
+        # the number of cycles held
+        if self.max_cycles is None:
+            return self.total_cycles
+        return min(self.total_cycles, self.capacity)
+
+    def resize(self, rows, columns):
+        for field in STAT_FIELDS:
+            data = np.zeros((rows, columns))
+            data[:self.capacity, :self.traded.shape[1]] = self.data[field]
+            self.data[field] = data
+        traded = np.zeros((rows, columns), dtype=bool)
+        traded[:self.capacity, :self.traded.shape[1]] = self.traded
+        self.traded = traded
+
+    def column(self, product_id):
+        if product_id not in self.columns:
+            if len(self.columns) == self.traded.shape[1]:
+                self.resize(self.capacity, self.traded.shape[1] * 2)
+            self.columns[product_id] = len(self.columns)
+        return self.columns[product_id]
+
+    def row(self, cycle):
+        # a repeated cycle is held in the row of the cycle it repeats
+        skipped = 0
+        for first_cycle, period, cycles in self.repeats:
+            if cycle < first_cycle:
+                break
+            if cycle < first_cycle + cycles:
+                return first_cycle - skipped - period + (cycle - first_cycle) % period
+            skipped += cycles
+        return (cycle - skipped) % self.capacity
+
+    def rows(self, start, stop):
+        # the rows of a range of cycles, as an array
+        cycles = np.arange(start, stop)
+        if len(self.repeats) == 0:
+            return cycles % self.capacity
+        rows = cycles.copy()
+        skipped = 0
+        for first_cycle, period, count in self.repeats:
+            repeated = (cycles >= first_cycle) & (cycles < first_cycle + count)
+            rows[repeated] = first_cycle - skipped - period + (cycles[repeated] - first_cycle) % period
+            rows[cycles >= first_cycle + count] -= count
+            skipped += count
+        return rows % self.capacity
+
+    def append(self, stats):
+        # stats is a dict of {product_id: ProductCycleStats}
+        if self.max_cycles is None and self.total_cycles - self.skipped == self.capacity:
+            self.resize(self.capacity * 2, self.traded.shape[1])
+        columns = [self.column(x) for x in stats]
+        row = (self.total_cycles - self.skipped) % self.capacity
+        for field in STAT_FIELDS:
+            self.data[field][row] = 0.0
+        self.traded[row] = False
+        for column, product_stats in zip(columns, stats.values()):
+            self.data['average_price'][row, column] = product_stats.average_price
+            self.data['min_price'][row, column] = product_stats.price_range.min_price
+            self.data['max_price'][row, column] = product_stats.price_range.max_price
+            self.data['volume'][row, column] = product_stats.volume
+            self.data['unsold'][row, column] = product_stats.unsold
+            self.data['unfilled_orders'][row, column] = product_stats.unfilled_orders
+            self.traded[row, column] = True
+        self.total_cycles += 1
+
+    def repeat(self, period, cycles):
+        # add cycles that repeat the last period cycles over and over
+        if period > len(self):
+            raise ValueError('Error: Cannot repeat more cycles than are held')
+        if self.max_cycles is not None:
+            # a ring buffer only holds its capacity, so the rows are written out
+            start = self.total_cycles
+            pattern = [self.row(start - period + x) for x in range(period)]
+            copies = {x: self.data[x][pattern].copy() for x in STAT_FIELDS}
+            traded = self.traded[pattern].copy()
+            written = np.arange(max(start, start + cycles - self.capacity), start + cycles)
+            rows = written % self.capacity
+            for field in STAT_FIELDS:
+                self.data[field][rows] = copies[field][(written - start) % period]
+            self.traded[rows] = traded[(written - start) % period]
+            self.total_cycles += cycles
+            return
+        self.repeats.append([self.total_cycles, period, cycles])
+        self.total_cycles += cycles
+        self.skipped += cycles
+
+    def trades(self, cycle):
+        # {product_id: ProductCycleStats} for a cycle that is held
+        row = self.row(cycle)
+        product_ids = list(self.columns.keys())
+        trades = {}
+        for column in np.flatnonzero(self.traded[row, :len(product_ids)]).tolist():
+            values = [float(self.data[x][row, column]) for x in STAT_FIELDS]
+            average, min_price, max_price, volume, unsold, unfilled = values
+            trades[product_ids[column]] = ProductCycleStats(max_price, min_price, average, volume, unsold, unfilled)
+        return trades
+
+    def last(self, product_id, field):
+        # the value for the last cycle, or None if the product was not traded
+        if self.total_cycles == 0 or product_id not in self.columns:
+            return None
+        row = self.row(self.total_cycles - 1)
+        column = self.columns[product_id]
+        if not self.traded[row, column]:
+            return None
+        return float(self.data[field][row, column])
+
+    def series(self, product_id, field, last=None):
+        # the values of a field over the cycles held, oldest first
+        # cycles where the product was not traded are zero
+        total = len(self)
+        if last is not None:
+            total = min(last, total)
+        if product_id not in self.columns:
+            return np.zeros(total)
+        column = self.columns[product_id]
+        if len(self.repeats) > 0:
+            return self.data[field][self.rows(self.total_cycles - total, self.total_cycles), column]
+        end = self.row(self.total_cycles - 1) + 1 if self.total_cycles > 0 else 0
+        start = end - total
+        if start >= 0:
+            # a view into the store, no copy is made
+            return self.data[field][start:end, column]
+        # the series wraps around the ring buffer
+        return np.concatenate([self.data[field][start:, column], self.data[field][:end, column]])
+
+
 class History:
-    def __init__(self):
-        self.cycle_history = []
+    def __init__(self, max_cycles=None, windows=DEFAULT_WINDOWS, retention=None):
+        # with max_cycles set, only that many of the most recent cycles are kept
+        # with a tiers.Retention, the recent cycles are kept in full and older ones in buckets of cycles
+        self.tiers = None
+        if retention is not None:
+            if max_cycles is not None:
+                raise ValueError('Error: A history takes either max_cycles or a retention')
+            max_cycles = retention.held
+            self.tiers = TieredStore(retention)
+        self.columns = ColumnStore(max_cycles)
+        # moving averages, highs, lows and volume over the last few cycles
+        self.rolling_stats = RollingStats(windows)
         self.producers_this_cycle = None
 
+    @property
+    def cycle_history(self):
+        # the cycles held, made from the columns
+        return CycleHistory(self.columns)
+
     def create_sales_stats(self, auctions):
-        transactions = []
-        [transactions.extend(x.transactions) for x in auctions]
         # now calculate the history for this cycle for each listed product
+        # the running totals add up the fills in order, as a loop over the transactions would
         stats = {}
         for auction in auctions:
+            quantity, price = auction.fill_arrays()
             quantity_sold = 0
             total_value = 0
             max_price = 0
             min_price = math.inf
-            for sale in auction.transactions:
-                quantity_sold += sale.quantity
-                total_value += sale.value
-                max_price = max(max_price, sale.price)
-                min_price = min(min_price, sale.price)
+            if len(quantity) > 0:
+                quantity_sold = float(np.cumsum(quantity)[-1])
+                total_value = float(np.cumsum(quantity * price)[-1])
+                max_price = max(max_price, float(price.max()))
+                min_price = float(price.min())
             if quantity_sold > 0:
                 avg = total_value / quantity_sold
             else:
@@ -92,77 +315,153 @@ class History:
     def update_auctions(self, auctions):
         stats = self.create_sales_stats(auctions)
         assert self.producers_this_cycle is not None
-        self.cycle_history.append(CycleInfo(stats, self.producers_this_cycle))
+        self.add_cycle(CycleInfo(stats, self.producers_this_cycle))
         self.producers_this_cycle = None
 
     def update(self, auctions, producers):
         # used to push a whole cycle in one go - useful for tests
         stats = self.create_sales_stats(auctions)
-        self.cycle_history.append(CycleInfo(stats, producers))
+        self.add_cycle(CycleInfo(stats, producers))
+
+    def add_cycle(self, cycle_info):
+        self.rolling_stats.update(self.columns.total_cycles, cycle_info.trades)
+        if self.tiers is not None:
+            self.retire(1)
+        self.columns.append(cycle_info.trades)
+
+    def retire(self, cycles):
+        # put the oldest cycles into the tiers before the next cycles are written over them
+        # they go a flush at a time, and can still be read from the columns until they are written over
+        columns = self.columns
+        tiers = self.tiers
+        while columns.total_cycles - tiers.next_cycle + cycles > columns.capacity:
+            first_cycle = tiers.next_cycle
+            count = min(tiers.retention.flush, columns.total_cycles - first_cycle)
+            rows = columns.rows(first_cycle, first_cycle + count)
+            width = len(columns.columns)
+            data = {x: columns.data[x][rows, :width] for x in STAT_FIELDS}
+            data['traded'] = columns.traded[rows, :width]
+            tiers.add(first_cycle, data, columns.columns.keys())
+
+    def repeat(self, period, cycles):
+        # the next cycles repeat the last period cycles, as found by fast forwarding
+        # they are held as a single RepeatInfo, and the columns do not grow
+        first_cycle = self.columns.total_cycles
+        if self.tiers is None:
+            self.columns.repeat(period, cycles)
+        else:
+            # as many as the columns hold at a time, so that the cycles pushed out go to the tiers
+            left = cycles
+            while left > 0:
+                count = min(left, self.columns.capacity)
+                self.retire(count)
+                self.columns.repeat(period, count)
+                left -= count
+        # the windows only need their last few cycles; earlier ones would be expired straight away
+        # though the ewma then moves on by fewer cycles, it is already at the repeating prices
+        longest = max(self.rolling_stats.windows + (1,))
+        fed = min(cycles, -(-longest // period) * period)
+        for cycle in range(first_cycle + cycles - fed, first_cycle + cycles):
+            self.rolling_stats.update(cycle, self.columns.trades(cycle))
+
+    @property
+    def total_cycles(self):
+        return self.columns.total_cycles
+
+    def product_ids(self):
+        # all products that have been auctioned, in the order they were first seen
+        return list(self.columns.columns.keys())
+
+    def series(self, product_id, field, last=None):
+        # e.g. history.series(product_id, 'average_price', last=100)
+        return self.columns.series(product_id, field, last)
+
+    def full_series(self, product_id, field):
+        # (cycles, values) over the whole run, oldest first, as the graphs draw it
+        # with a retention the older cycles come from the tiers, with a value per bucket at its first cycle
+        if self.tiers is None:
+            values = self.columns.series(product_id, field)
+            return np.arange(self.total_cycles - len(values), self.total_cycles), values
+        values = self.columns.series(product_id, field, last=self.total_cycles - self.tiers.next_cycle)
+        cycles = np.arange(self.tiers.next_cycle, self.total_cycles)
+        buckets = self.tiers.buckets()
+        product_ids = self.product_ids()
+        older = np.zeros(len(buckets))
+        if product_id in product_ids:
+            older = buckets.values(field)[:, product_ids.index(product_id)]
+        return np.concatenate([buckets.first_cycle, cycles]), np.concatenate([older, values])
+
+    def ohlc(self, product_id, size):
+        # {'cycle', 'open', 'high', 'low', 'close', 'volume'} for the buckets of a size kept by the retention
+        # cycle is the first cycle of each bucket, and volume its total
+        if self.tiers is None:
+            raise ValueError('Error: Only a history with a retention keeps buckets')
+        buckets = self.tiers.buckets(size)
+        product_ids = self.product_ids()
+        result = {'cycle': buckets.first_cycle}
+        for field in ['open', 'high', 'low', 'close', 'volume']:
+            if product_id in product_ids:
+                result[field] = buckets.fields[field][:, product_ids.index(product_id)]
+            else:
+                result[field] = np.zeros(len(buckets))
+        return result
+
+    def memory_bytes(self):
+        # the size of the arrays held in memory, which is what a retention budget covers
+        # nothing else grows with the run: the cycle history is made from the columns, and the rolling windows
+        # only hold their last few cycles
+        total = self.columns.traded.nbytes + sum([x.nbytes for x in self.columns.data.values()])
+        if self.tiers is not None:
+            total += self.tiers.nbytes
+        return total
+
+    def rolling(self, product_id, window=DEFAULT_WINDOWS[0]):
+        # the RollingWindow for a product, or None if it has never been auctioned
+        return self.rolling_stats.get(product_id, window)
 
     def get_last_sales(self, product_id):
-        last_trade = self.cycle_history[-1].trades
-        if product_id not in last_trade:
+        price = self.columns.last(product_id, 'average_price')
+        if price is None:
             return
-        return last_trade[product_id]
+        return ProductCycleStats(self.columns.last(product_id, 'max_price'),
+                                 self.columns.last(product_id, 'min_price'),
+                                 price,
+                                 self.columns.last(product_id, 'volume'),
+                                 self.columns.last(product_id, 'unsold'),
+                                 self.columns.last(product_id, 'unfilled_orders'))
 
     def get_last_price(self, product_id):
-        last_trade = self.cycle_history[-1].trades
-        if product_id not in last_trade:
+        price = self.columns.last(product_id, 'average_price')
+        if price is None:
             return -1
-        return last_trade[product_id].average_price
+        return price
 
     def get_last_volume(self, product):
-        last_trade = self.cycle_history[-1].trades
-        if product not in last_trade:
+        volume = self.columns.last(product, 'volume')
+        if volume is None:
             return -1
-        return last_trade[product].volume
+        return volume
 
     def get_last_price_range(self, product):
-        last_trade = self.cycle_history[-1].trades
-        if product not in last_trade:
+        min_price = self.columns.last(product, 'min_price')
+        if min_price is None:
             return PriceRange(-1, -1)
-        return last_trade[product].price_range
+        return PriceRange(min_price, self.columns.last(product, 'max_price'))
 
     def get_last_unsold(self, product):
-        last_trade = self.cycle_history[-1].trades
-        if product not in last_trade:
+        unsold = self.columns.last(product, 'unsold')
+        if unsold is None:
             return 0
-        return last_trade.unsold
+        return unsold
 
     def get_last_unfilled(self, product):
-        last_trade = self.cycle_history[-1].trades
-        if product not in last_trade:
+        unfilled = self.columns.last(product, 'unfilled_orders')
+        if unfilled is None:
             return 0
-        return last_trade.unfilled_orders
-
-
-def show_average_price_graph(economy):
-    # we need to calculate the entirety of prices
-    # some years may be missing a price, for this we need to save "zero"
-    # get all listed products first
-    history = economy.history
-    averages = {}
-    for i in history.cycle_history:
-        for product in i.trades.keys():
-            if product not in averages:
-                averages[product] = []
-    for i in history.cycle_history:
-        # examine every product sold over this cycle
-        for product in i.trades.keys():
-            if product in i.trades:
-                averages[product].append(i.trades[product].average_price)
-            else:
-                # this cycle has no volume for this product
-                averages[product].append(0)
-
-    # now we can generate the graph
-    # we have a dict of {product: array_of_average_prices}
-    fig, ax = plt.subplots()
-    for product_id, values in averages.items():
-        ax.plot(values, label=economy.get_product(product_id).name)
-    ax.legend()
-    ax.set_xlabel('Cycle')
-    ax.set_ylabel('Price')
-    ax.set_title('Average Prices')
-    plt.show()
+        return unfilled
+
+
+def show_average_price_graph(economy, filepath=None):
+    # the graphs live in economics.reporting, so that matplotlib is only imported when needed
+    from economics import reporting
+    reporting.show_average_price_graph(economy, filepath)
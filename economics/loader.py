@@ -4,6 +4,8 @@ import os.path
 from economics.errors import EconomyLoadError
 from economics.producer import Workers, Producer, Product, Requirement
 from economics.economy import Economy
+from economics.requirements import compile_requirements
+from economics.graph import build_graph
 
 WORKER_TAG = 'workers'
 PRODUCTS_TAG = 'products'
@@ -65,14 +67,23 @@ def validate_data(data):
             raise EconomyLoadError(f'Error: Missing {key} in data')
 
 
-def load_economy(filepath):
-    data = load_data_from_file(filepath)
+def create_economy(data, **options):
+    # build an economy from data already loaded, e.g. a config changed in code
     validate_data(data)
     try:
         products = create_products(data[PRODUCTS_TAG])
         producers = create_producers(data[PRODUCERS_TAG], products)
         workers = create_workers(data[WORKER_TAG], products)
+        requirements = compile_requirements(products.values())
     except Exception as ex:
         raise EconomyLoadError(f'Error: {ex}')
+    # raises an EconomyLoadError if the products require each other in a cycle
+    graph = build_graph(requirements)
     producers.insert(0, workers)
-    return Economy([x for x in products.values()], producers)
+    return Economy([x for x in products.values()], producers, requirements=requirements, graph=graph, **options)
+
+
+def load_economy(filepath, **options):
+    # any options are passed on to the Economy
+    data = load_data_from_file(filepath)
+    return create_economy(data, **options)
@@ -0,0 +1,138 @@
+import json
+import sys
+import time
+
+# instrumentation of Economy.single_cycle
+# a hook is told before and after every phase of a cycle; Economy.add_hook(hook) turns this on
+# with no hooks added the cycle runs exactly as before, with no extra cost
+# PhaseMetrics is a hook that records where the time goes into a MetricsRegistry,
+# which can be written to a json lines file for later analysis
+
+PHASES = ['update_producers', 'produce', 'get_all_buys', 'get_all_sells', 'auction', 'update_auctions',
+          'post_cycle']
+
+# a staged cycle runs some phases once for each level of the product graph, as produce_0, get_sells_0, auction_0
+LEVEL_PHASES = {'produce': 'produce', 'get_sells': 'get_all_sells', 'auction': 'auction'}
+
+
+def cycle_phase(phase):
+    # the phase of single_cycle that a phase is part of, e.g. auction for auction_1
+    name, _, level = phase.rpartition('_')
+    if level.isdigit() and name in LEVEL_PHASES:
+        return LEVEL_PHASES[name]
+    return phase
+
+
+class CycleHook:
+    # override any of these; result is what the phase returned, if anything
+    def start_cycle(self, economy):
+        pass
+
+    def before_phase(self, economy, phase):
+        pass
+
+    def after_phase(self, economy, phase, result):
+        pass
+
+    def end_cycle(self, economy):
+        pass
+
+
+class CycleMetrics:
+    def __init__(self, cycle):
+        self.cycle = cycle
+        # {phase: seconds}
+        self.phases = {}
+        # {phase: change in the number of memory blocks held by python}
+        self.allocated_blocks = {}
+        # offers, transactions and the like
+        self.counts = {}
+        # {product_id: [sells, buys]}
+        self.auction_sizes = {}
+
+    def to_dict(self):
+        return {'cycle': self.cycle,
+                'phases': self.phases,
+                'allocated_blocks': self.allocated_blocks,
+                'counts': self.counts,
+                'auction_sizes': {str(x): y for x, y in self.auction_sizes.items()}}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.cycles = []
+
+    def add(self, cycle_metrics):
+        self.cycles.append(cycle_metrics)
+
+    def total_time(self, phase):
+        return sum([x.phases.get(phase, 0.0) for x in self.cycles])
+
+    def summary(self):
+        # the mean time of every phase, and the total of every count
+        summary = {'cycles': len(self.cycles), 'mean_seconds': {}, 'counts': {}}
+        if len(self.cycles) == 0:
+            return summary
+        for phase in PHASES:
+            summary['mean_seconds'][phase] = self.total_time(phase) / len(self.cycles)
+        for cycle in self.cycles:
+            for name, value in cycle.counts.items():
+                summary['counts'][name] = summary['counts'].get(name, 0) + value
+        return summary
+
+    def export(self, filepath):
+        # one json object per cycle; the cycles exported are then dropped to keep memory flat
+        with open(filepath, 'a') as export_file:
+            for cycle in self.cycles:
+                export_file.write(json.dumps(cycle.to_dict()) + '\n')
+        self.cycles = []
+
+
+def load_metrics(filepath):
+    # read an exported file back as a list of dicts
+    with open(filepath) as metrics_file:
+        return [json.loads(x) for x in metrics_file if x.strip()]
+
+
+class PhaseMetrics(CycleHook):
+    def __init__(self, registry=None):
+        if registry is None:
+            registry = MetricsRegistry()
+        self.registry = registry
+        self.current = None
+        self.started = 0.0
+        self.blocks = 0
+        self.cycle = 0
+
+    def start_cycle(self, economy):
+        self.current = CycleMetrics(self.cycle)
+        self.cycle += 1
+
+    def before_phase(self, economy, phase):
+        self.blocks = sys.getallocatedblocks()
+        self.started = time.perf_counter()
+
+    def count(self, name, value):
+        self.current.counts[name] = self.current.counts.get(name, 0) + value
+
+    def after_phase(self, economy, phase, result):
+        elapsed = time.perf_counter() - self.started
+        blocks = sys.getallocatedblocks() - self.blocks
+        # the levels of a staged cycle are added up into the phase they are part of
+        phase = cycle_phase(phase)
+        self.current.phases[phase] = self.current.phases.get(phase, 0.0) + elapsed
+        self.current.allocated_blocks[phase] = self.current.allocated_blocks.get(phase, 0) + blocks
+        if phase == 'get_all_buys':
+            self.count('buys', len(result))
+        elif phase == 'get_all_sells':
+            self.count('sells', len(result))
+        elif phase == 'auction':
+            self.count('auctions', len(result))
+            self.count('transactions', sum([len(x.transactions) for x in result]))
+            for single_auction in result:
+                self.current.auction_sizes[single_auction.product_id] = [len(single_auction.sells),
+                                                                         len(single_auction.buys)]
+
+    def end_cycle(self, economy):
+        self.registry.add(self.current)
+        self.current = None
@@ -1,4 +1,11 @@
+from collections.abc import Sequence
+
+# every cycle makes many of these, so they use __slots__ to keep them small
+
+
 class SellOffer:
+    __slots__ = ['seller', 'product_id', 'total_offered', 'cost_per_unit']
+
     def __init__(self, seller, product_id, total, cost_per_unit):
         self.seller = seller
         self.product_id = product_id
@@ -18,6 +25,8 @@ class SellOffer:
 
 class BuyOffer:
     # a buy offer has a maximum price, i.e. the most that will be paid
+    __slots__ = ['buyer', 'product_id', 'total_wanted', 'max_price']
+
     def __init__(self, buyer, product_id, total, max_price):
         self.buyer = buyer
         self.product_id = product_id
@@ -32,6 +41,8 @@ class BuyOffer:
 
 
 class Transaction:
+    __slots__ = ['product_id', 'quantity', 'price']
+
     def __init__(self, product_id, quantity, price):
         self.product_id = product_id
         self.quantity = quantity
@@ -43,3 +54,20 @@ class Transaction:
 
     def __repr__(self):
         return f'{self.quantity} x {self.product_id} @ {self.price}'
+
+
+class Transactions(Sequence):
+    # the transactions of an auction cleared with arrays, as economics.clearing does
+    # quantity and price are arrays with one entry per fill, and a Transaction is only made when one is read
+    def __init__(self, product_id, quantity, price):
+        self.product_id = product_id
+        self.quantity = quantity
+        self.price = price
+
+    def __len__(self):
+        return len(self.quantity)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[x] for x in range(*index.indices(len(self)))]
+        return Transaction(self.product_id, float(self.quantity[index]), float(self.price[index]))
@@ -1,4 +1,5 @@
 import itertools
+from collections import deque
 
 from economics.offers import SellOffer, BuyOffer
 from economics.errors import EconomyNoStockToRemove
@@ -8,6 +9,8 @@ HISTORY_MAX_LENGTH = 5
 
 
 class Requirement:
+    __slots__ = ['product_id', 'total']
+
     def __init__(self, product_id, total):
         self.product_id = product_id
         self.total = total
@@ -29,6 +32,9 @@ class Product:
 
     def get_max_production(self, stock):
         # with this stock, return the most that can be produced
+        if len(self.required) == 0:
+            # nothing can be made from no requirements
+            return 0.0
         max_production = None
         for requirement in self.required:
             if requirement.product_id not in stock:
@@ -46,6 +52,8 @@ class Product:
 # we need to remember what we sold and bought in the auctions, and the results
 # therefore, we get a message every time we sell or buy something
 class SellResult:
+    __slots__ = ['asking_price', 'actual_price', 'quantity', 'product_id']
+
     def __init__(self, ask, actual, q, product):
         self.asking_price = ask
         self.actual_price = actual
@@ -54,6 +62,8 @@ class SellResult:
 
 
 class BuyResult:
+    __slots__ = ['offer_price', 'actual_price', 'quantity', 'product_id']
+
     def __init__(self, offer, actual, q, product):
         self.offer_price = offer
         self.actual_price = actual
@@ -62,6 +72,8 @@ class BuyResult:
 
 
 class ProductSaleResults:
+    __slots__ = ['offers', 'sales', 'set_price', 'average']
+
     def __init__(self, offers, sales, price, avg):
         self.offers = offers
         self.sales = sales
@@ -69,33 +81,94 @@ class ProductSaleResults:
         self.average = avg
 
 
+class ProductSummary:
+    # running totals for one product over a cycle, updated as offers and results arrive
+    __slots__ = ['offered', 'set_price', 'has_offer', 'sold', 'sales', 'price_total', 'value',
+                 'bought', 'purchases', 'spent']
+
+    def __init__(self):
+        # the first sell offer made for the product, as get_sale_info has always used
+        self.offered = 0
+        self.set_price = 0
+        self.has_offer = False
+        self.sold = 0
+        self.sales = 0
+        self.price_total = 0.0
+        self.value = 0.0
+        self.bought = 0
+        self.purchases = 0
+        self.spent = 0.0
+
+    @property
+    def average(self):
+        # the simple average of the sale prices
+        if self.sales == 0:
+            return 0.0
+        return self.price_total / self.sales
+
+    @property
+    def vwap(self):
+        # the volume weighted average sale price
+        if self.sold == 0:
+            return 0.0
+        return self.value / self.sold
+
+
 class ProducerCycleHistory:
+    # the offers are the same objects given to the auction, which never changes them
+    # the lists keep every offer and result, and summaries keeps running totals for each product
+    __slots__ = ['auction_sales', 'auction_buys', 'sell_offers', 'buy_offers', 'summaries']
+
     def __init__(self):
         self.auction_sales = []
         self.auction_buys = []
         self.sell_offers = []
         self.buy_offers = []
+        # {product_id: ProductSummary}
+        self.summaries = {}
+
+    def summary(self, product_id):
+        if product_id not in self.summaries:
+            self.summaries[product_id] = ProductSummary()
+        return self.summaries[product_id]
+
+    def add_sell_offer(self, offer):
+        self.sell_offers.append(offer)
+        summary = self.summary(offer.product_id)
+        if not summary.has_offer:
+            summary.offered = offer.total_offered
+            summary.set_price = offer.cost_per_unit
+            summary.has_offer = True
+
+    def add_buy_offer(self, offer):
+        self.buy_offers.append(offer)
+
+    def add_sale(self, sale):
+        self.auction_sales.append(sale)
+        summary = self.summary(sale.product_id)
+        summary.sold += sale.quantity
+        summary.sales += 1
+        summary.price_total += sale.actual_price
+        summary.value += sale.actual_price * sale.quantity
+
+    def add_purchase(self, purchase):
+        self.auction_buys.append(purchase)
+        summary = self.summary(purchase.product_id)
+        summary.bought += purchase.quantity
+        summary.purchases += 1
+        summary.spent += purchase.actual_price * purchase.quantity
 
     def get_sale_info(self, product_id):
         # how much we tried to sell; how many we sold; the price we set; the average sale price
-        total_offers = 0
-        set_price = 0
-        total_sales = 0
-        sale_prices = []
-        for i in self.sell_offers:
-            if i.product_id == product_id:
-                total_offers = i.total_offered
-                set_price = i.cost_per_unit
-                break
-        for i in self.auction_sales:
-            if i.product_id == product_id:
-                sale_prices.append(i.actual_price)
-                total_sales += i.quantity
-        if len(sale_prices) == 0:
-            average = 0.0
-        else:
-            average = sum(sale_prices) / len(sale_prices)
-        return ProductSaleResults(total_offers, total_sales, set_price, average)
+        summary = self.summaries.get(product_id)
+        if summary is None:
+            return ProductSaleResults(0, 0, 0, 0.0)
+        return ProductSaleResults(summary.offered, summary.sold, summary.set_price, summary.average)
+
+
+def new_cycle_history():
+    # the most recent cycles, oldest first; appending to a full one drops the oldest
+    return deque(maxlen=HISTORY_MAX_LENGTH)
 
 
 class Producer:
@@ -113,8 +186,10 @@ class Producer:
             self.stock = stock
         self.stock[self.product.id] = 0.0
         self.sale_price = 1.0
+        # the most paid for a unit of any input
+        self.buy_limit = 1.0
         self.last_consumption = {}
-        self.cycle_history = []
+        self.cycle_history = new_cycle_history()
 
     def consume_stock(self, production):
         # this has already been checked against stock
@@ -142,8 +217,6 @@ class Producer:
     def init_cycle(self):
         # called at the start of a cycle
         self.cycle_history.append(ProducerCycleHistory())
-        if len(self.cycle_history) > HISTORY_MAX_LENGTH:
-            self.cycle_history.pop(0)
 
     def produce(self):
         # produce what we can, given our resources
@@ -157,23 +230,23 @@ class Producer:
         if available_to_sell == 0:
             return []
         offer = SellOffer(self, self.product.id, available_to_sell, self.sale_price)
-        self.cycle_history[-1].sell_offers.append(offer.copy())
+        self.cycle_history[-1].add_sell_offer(offer)
         return [offer]
 
     def get_buy_orders(self):
         # look at what we consumed and buy it back
         orders = []
         for product, total in self.last_consumption.items():
-            buy = BuyOffer(self, product, total, 1.0)
-            self.cycle_history[-1].buy_offers.append(buy.copy())
+            buy = BuyOffer(self, product, total, self.buy_limit)
+            self.cycle_history[-1].add_buy_offer(buy)
             orders.append(buy)
         return orders
 
     def add_sale(self, sale):
-        self.cycle_history[-1].auction_sales.append(sale)
+        self.cycle_history[-1].add_sale(sale)
 
     def add_purchase(self, purchase):
-        self.cycle_history[-1].auction_buys.append(purchase)
+        self.cycle_history[-1].add_purchase(purchase)
 
     def post_cycle(self, history):
         self.sale_price = adjust_price_by_sales(self, history)
@@ -203,12 +276,12 @@ class Workers(Producer):
         # to start with, we handle this as a fixed cost
         # 1 unit of money per worker
         sell = SellOffer(self, self.labor_id, self.workers, 1)
-        self.cycle_history[-1].sell_offers.append(sell.copy())
-        return [SellOffer(self, self.labor_id, self.workers, 1)]
+        self.cycle_history[-1].add_sell_offer(sell)
+        return [sell]
 
     def get_buy_orders(self):
         # workers require 1 food per worker per cycle
         max_price = self.money / self.workers
         buy = BuyOffer(self, self.desires[0], self.workers, max_price)
-        self.cycle_history[-1].buy_offers.append(buy.copy())
+        self.cycle_history[-1].add_buy_offer(buy)
         return [buy]
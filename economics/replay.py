@@ -0,0 +1,306 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+
+from economics.checkpoint import ENGINES, engine_name
+from economics.economy import Economy
+from economics.loader import load_economy
+from economics.metrics import CycleHook
+
+# find the first cycle, and the phase in it, where two runs of an economy stop agreeing
+# a cycle is fully deterministic: producers keep their order, offers at the same price are matched in the
+# order they were made, and anything random draws from economy.rng, which is seeded and kept in checkpoints
+# so two runs that start from the same state must agree, unless the code running them differs
+# a HashRecorder hook reduces the money, stock and prices after every cycle to a 64 bit hash, and can
+# save a checkpoint every so many cycles; comparing the hashes of two runs finds the first cycle that differs,
+# and replaying that cycle from the checkpoint before it, with a hash after every phase, finds the phase
+#     python -m economics.replay record examples/basic.json --cycles 100000 --checkpoint-every 1000 --output a
+#     (the same with the other build, to b)
+#     python -m economics.replay compare a b
+
+HASHES_FILE = 'hashes.npy'
+PHASE_HASHES_FILE = 'phase_hashes.npy'
+META_FILE = 'meta.json'
+CHECKPOINT_NAME = re.compile(r'checkpoint_(\d+)\.npz')
+
+
+def state_arrays(economy):
+    # the money, stock, sale price and buy limit of every producer, and the prices of the last cycle
+    # an economy with a table and one without give the same arrays for the same state
+    if economy.table is not None:
+        table = economy.table
+        arrays = [table.money, table.stock, table.sale_price, table.buy_limit]
+    else:
+        producers = economy.producers
+        product_ids = [x.id for x in economy.products]
+        stock = [[x.stock.get(y, 0.0) for y in product_ids] for x in producers]
+        arrays = [np.array([x.money for x in producers], dtype=np.float64),
+                  np.array(stock, dtype=np.float64).reshape(len(producers), len(product_ids)),
+                  np.array([x.sale_price for x in producers], dtype=np.float64),
+                  np.array([x.buy_limit for x in producers], dtype=np.float64)]
+    columns = economy.history.columns
+    if columns.total_cycles > 0:
+        row = columns.row(columns.total_cycles - 1)
+        arrays.append(np.where(columns.traded[row], columns.data['average_price'][row], 0.0))
+    return arrays
+
+
+def state_hash(economy):
+    digest = hashlib.blake2b(digest_size=8)
+    for array in state_arrays(economy):
+        # adding zero turns -0.0 into 0.0, which would otherwise hash differently
+        array = np.ascontiguousarray(array, dtype=np.float64) + 0.0
+        digest.update(str(array.shape).encode())
+        digest.update(array.tobytes())
+    return int.from_bytes(digest.digest(), 'little')
+
+
+def checkpoint_path(directory, cycle):
+    # the checkpoint taken before the cycle was run
+    return os.path.join(directory, f'checkpoint_{cycle}.npz')
+
+
+class HashRecorder(CycleHook):
+    # records the state hash after every cycle; with phases=True also after every phase of it
+    # with a directory and checkpoint_every, a checkpoint is saved before every cycle that is a multiple of it
+    def __init__(self, directory=None, checkpoint_every=None, phases=False):
+        if checkpoint_every is not None and directory is None:
+            raise ValueError('checkpoints need a directory to be saved in')
+        self.directory = directory
+        self.checkpoint_every = checkpoint_every
+        self.phases = phases
+        self.first_cycle = None
+        self.hashes = []
+        # a list of hashes for every cycle, one for each of phase_names
+        self.phase_hashes = []
+        self.phase_names = []
+        self.current = []
+        # how the economy was run, as far as a checkpoint keeps it
+        self.options = {}
+
+    def start_cycle(self, economy):
+        cycle = economy.history.total_cycles
+        if self.first_cycle is None:
+            self.first_cycle = cycle
+            self.options = {'engine': engine_name(economy.engine), 'staged': economy.staged}
+        if self.checkpoint_every is not None and cycle % self.checkpoint_every == 0:
+            economy.save_checkpoint(checkpoint_path(self.directory, cycle))
+        self.current = []
+
+    def after_phase(self, economy, phase, result):
+        if self.phases:
+            if len(self.phase_hashes) == 0 and phase not in self.phase_names:
+                self.phase_names.append(phase)
+            self.current.append(state_hash(economy))
+
+    def end_cycle(self, economy):
+        self.hashes.append(state_hash(economy))
+        if self.phases:
+            self.phase_hashes.append(self.current)
+
+    def recording(self):
+        return Recording(self.first_cycle or 0, np.array(self.hashes, dtype=np.uint64),
+                         np.array(self.phase_hashes, dtype=np.uint64).reshape(len(self.phase_hashes), -1)
+                         if self.phases else None, self.phase_names, self.directory, self.options)
+
+    def save(self):
+        # write the hashes to the directory, next to the checkpoints
+        recording = self.recording()
+        np.save(os.path.join(self.directory, HASHES_FILE), recording.hashes)
+        if recording.phase_hashes is not None:
+            np.save(os.path.join(self.directory, PHASE_HASHES_FILE), recording.phase_hashes)
+        with open(os.path.join(self.directory, META_FILE), 'w') as meta_file:
+            json.dump({'first_cycle': recording.first_cycle, 'phases': recording.phases,
+                       'options': recording.options}, meta_file)
+
+
+class Recording:
+    # the hashes of a run, from first_cycle on
+    def __init__(self, first_cycle, hashes, phase_hashes=None, phases=None, directory=None, options=None):
+        self.first_cycle = first_cycle
+        self.hashes = hashes
+        self.phase_hashes = phase_hashes
+        self.phases = phases or []
+        self.directory = directory
+        self.options = options or {}
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, META_FILE)) as meta_file:
+            meta = json.load(meta_file)
+        phase_hashes = None
+        if os.path.exists(os.path.join(directory, PHASE_HASHES_FILE)):
+            phase_hashes = np.load(os.path.join(directory, PHASE_HASHES_FILE))
+        return cls(meta['first_cycle'], np.load(os.path.join(directory, HASHES_FILE)), phase_hashes,
+                   meta['phases'], directory, meta.get('options'))
+
+    @property
+    def last_cycle(self):
+        return self.first_cycle + len(self.hashes)
+
+    def checkpoints(self):
+        # the cycles there are checkpoints before, in order
+        if self.directory is None:
+            return []
+        names = [CHECKPOINT_NAME.fullmatch(x) for x in os.listdir(self.directory)]
+        return sorted([int(x.group(1)) for x in names if x is not None])
+
+    def checkpoint_before(self, cycle):
+        # the latest checkpoint from which the cycle can be replayed, or None
+        cycles = [x for x in self.checkpoints() if x <= cycle]
+        if len(cycles) == 0:
+            return None
+        return cycles[-1]
+
+
+class Divergence:
+    # phase is None when it is not known; checkpoint is the cycle of the checkpoint to replay from
+    def __init__(self, cycle, phase=None, checkpoint=None):
+        self.cycle = cycle
+        self.phase = phase
+        self.checkpoint = checkpoint
+
+    def __repr__(self):
+        where = f'cycle {self.cycle}'
+        if self.phase is not None:
+            where += f', phase {self.phase}'
+        return f'Divergence: {where}'
+
+
+def first_divergence(first, second):
+    # the first cycle both recordings have that differs, or None if they agree for as long as both ran
+    start = max(first.first_cycle, second.first_cycle)
+    stop = min(first.last_cycle, second.last_cycle)
+    if stop <= start:
+        return None
+    different = np.flatnonzero(first.hashes[start - first.first_cycle:stop - first.first_cycle] !=
+                               second.hashes[start - second.first_cycle:stop - second.first_cycle])
+    if len(different) == 0:
+        return None
+    return start + int(different[0])
+
+
+def divergent_phase(first, second, cycle):
+    # the first phase of the cycle whose hashes differ, if both recorded their phases
+    if first.phase_hashes is None or second.phase_hashes is None or first.phases != second.phases:
+        return None
+    first_hashes = first.phase_hashes[cycle - first.first_cycle]
+    second_hashes = second.phase_hashes[cycle - second.first_cycle]
+    for phase, first_hash, second_hash in zip(first.phases, first_hashes, second_hashes):
+        if first_hash != second_hash:
+            return phase
+
+
+def find_divergence(first, second):
+    # compare two recordings; the checkpoint is from the first, or else the second
+    cycle = first_divergence(first, second)
+    if cycle is None:
+        return None
+    checkpoint = first.checkpoint_before(cycle)
+    if checkpoint is None:
+        checkpoint = second.checkpoint_before(cycle)
+    return Divergence(cycle, divergent_phase(first, second, cycle), checkpoint)
+
+
+def replay(filepath, cycles, build=None, phases=True):
+    # run a checkpoint on for some cycles, recording the hashes
+    # build(filepath) loads the economy, by default with Economy.load_checkpoint, which keeps the saved engine
+    # anything a checkpoint does not keep, such as a PricingEngine, the build must set again
+    if build is None:
+        build = Economy.load_checkpoint
+    recorder = HashRecorder(phases=phases)
+    with build(filepath) as economy:
+        economy.add_hook(recorder)
+        for _ in range(cycles):
+            economy.single_cycle()
+    return recorder.recording()
+
+
+def bisect_divergence(first, second, first_build=None, second_build=None):
+    # find where two recordings differ, then replay the cycle from the nearest checkpoint with both builds
+    # to find the phase; a build loads a checkpoint as replay does, e.g. with another engine
+    divergence = find_divergence(first, second)
+    if divergence is None or divergence.phase is not None or divergence.checkpoint is None:
+        return divergence
+    directory = first.directory if divergence.checkpoint in first.checkpoints() else second.directory
+    filepath = checkpoint_path(directory, divergence.checkpoint)
+    cycles = divergence.cycle - divergence.checkpoint + 1
+    first_replay = replay(filepath, cycles, first_build)
+    second_replay = replay(filepath, cycles, second_build)
+    # a replay of another economy, e.g. one loaded without its pricing, would find a divergence that is not there
+    for name, recording, replayed in [('first', first, first_replay), ('second', second, second_replay)]:
+        cycle = first_divergence(recording, replayed)
+        if cycle is not None:
+            raise ValueError(f'the replay of the {name} run from cycle {divergence.checkpoint} differs from its '
+                             f'recording at cycle {cycle}; its build must load the economy as it was run')
+    # starting from the same state, the replays may part earlier than the recordings did
+    replayed = find_divergence(first_replay, second_replay)
+    if replayed is None:
+        return divergence
+    return Divergence(replayed.cycle, replayed.phase, divergence.checkpoint)
+
+
+def record(source, cycles, directory, checkpoint_every=None, phases=False, **options):
+    # run a config or a checkpoint for some cycles and save the recording
+    os.makedirs(directory, exist_ok=True)
+    if source.endswith('.npz'):
+        economy = Economy.load_checkpoint(source, **options)
+    else:
+        economy = load_economy(source, **options)
+    recorder = HashRecorder(directory, checkpoint_every, phases)
+    with economy:
+        economy.add_hook(recorder)
+        for _ in range(cycles):
+            economy.single_cycle()
+    recorder.save()
+    return recorder.recording()
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Record the state hashes of a run, or find where two runs differ')
+    commands = parser.add_subparsers(dest='command', required=True)
+    record_parser = commands.add_parser('record', help='run a config or checkpoint and save its hashes')
+    record_parser.add_argument('source', help='an economy config, or a checkpoint .npz to continue from')
+    record_parser.add_argument('--cycles', type=int, required=True)
+    record_parser.add_argument('--output', required=True, help='the directory for the hashes and checkpoints')
+    record_parser.add_argument('--checkpoint-every', type=int, help='save a checkpoint every so many cycles')
+    record_parser.add_argument('--phases', action='store_true', help='also hash the state after every phase')
+    record_parser.add_argument('--seed', type=int, help='the seed of the economy')
+    record_parser.add_argument('--vectorized', action='store_true', help='hold the producers in a table')
+    record_parser.add_argument('--engine', choices=list(ENGINES),
+                               help='by default auction, or the one a checkpoint saved')
+    compare_parser = commands.add_parser('compare', help='find the first cycle two recordings differ')
+    compare_parser.add_argument('first')
+    compare_parser.add_argument('second')
+    options = parser.parse_args(args)
+    if options.command == 'record':
+        economy_options = {}
+        if options.engine is not None:
+            economy_options['engine'] = ENGINES[options.engine]
+        if options.source.endswith('.json'):
+            economy_options['vectorized'] = options.vectorized
+            economy_options['seed'] = options.seed
+        recording = record(options.source, options.cycles, options.output, options.checkpoint_every,
+                           options.phases, **economy_options)
+        print(f'recorded cycles {recording.first_cycle} to {recording.last_cycle - 1} in {options.output}')
+        return
+    first = Recording.load(options.first)
+    second = Recording.load(options.second)
+    divergence = find_divergence(first, second)
+    if divergence is None:
+        print('the runs agree for every cycle they share')
+        return
+    print(divergence)
+    if divergence.checkpoint is not None and divergence.phase is None:
+        path = checkpoint_path(first.directory if divergence.checkpoint in first.checkpoints() else
+                               second.directory, divergence.checkpoint)
+        cycles = divergence.cycle - divergence.checkpoint + 1
+        print(f'to find the phase, record {path} with --cycles {cycles} --phases under each build and compare')
+
+
+if __name__ == '__main__':
+    main()
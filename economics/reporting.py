@@ -0,0 +1,57 @@
+# graphs of the economy history
+# matplotlib is only imported the first time a graph is drawn, so the simulation itself never pays for it
+# graphs are shown in a window, or with a filepath given, drawn headless and saved to that file
+# a graph is drawn from a live economy, or from a saved history opened with economics.archive.HistoryReader
+# with points given, each line is downsampled to about that many points, for runs of millions of cycles
+
+from economics.archive import HistoryReader, downsample
+
+INTERACTIVE_BACKEND = 'TkAgg'
+HEADLESS_BACKEND = 'Agg'
+
+
+def load_pyplot(headless):
+    import matplotlib
+    if headless:
+        matplotlib.use(HEADLESS_BACKEND)
+    else:
+        matplotlib.use(INTERACTIVE_BACKEND)
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def product_series(source):
+    # (history, name of a product) for an economy or a HistoryReader
+    if isinstance(source, HistoryReader):
+        return source, source.product_name
+    return source.history, lambda x: source.get_product(x).name
+
+
+def show_series_graph(source, field, title, label, filepath=None, points=None, method='mean'):
+    # draw a line for every product that has been auctioned
+    # cycles where a product had no auction are shown as zero
+    # a history with a retention draws its older cycles a bucket at a time
+    history, product_name = product_series(source)
+    plt = load_pyplot(filepath is not None)
+    fig, ax = plt.subplots()
+    for product_id in history.product_ids():
+        cycles, values = history.full_series(product_id, field)
+        cycles, values = downsample(values, points, method, cycles=cycles)
+        ax.plot(cycles, values, label=product_name(product_id))
+    ax.legend()
+    ax.set_xlabel('Cycle')
+    ax.set_ylabel(label)
+    ax.set_title(title)
+    if filepath is None:
+        plt.show()
+    else:
+        fig.savefig(filepath)
+        plt.close(fig)
+
+
+def show_average_price_graph(source, filepath=None, points=None):
+    show_series_graph(source, 'average_price', 'Average Prices', 'Price', filepath, points)
+
+
+def show_volume_graph(source, filepath=None, points=None):
+    show_series_graph(source, 'volume', 'Volume Traded', 'Volume', filepath, points)
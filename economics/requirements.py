@@ -0,0 +1,65 @@
+import numpy as np
+
+# the requirements of every product, compiled into arrays once when an economy is loaded
+# instead of walking product.required for every producer in every cycle,
+# production for a whole table of producers is a single reduction over these arrays
+# every product has a fixed number of input slots, which is the most inputs any product has
+# so the cost of production grows with the width of the requirements, not the catalogue
+
+
+class RequirementMatrix:
+    def __init__(self, products):
+        self.products = sorted(products, key=lambda x: x.id)
+        self.columns = {product.id: column for column, product in enumerate(self.products)}
+        total_products = len(self.products)
+        # coefficients[a, b] is the amount of product b needed to make one unit of product a
+        self.coefficients = np.zeros((total_products, total_products))
+        for product in self.products:
+            for requirement in product.required:
+                self.coefficients[self.columns[product.id], self.columns[requirement.product_id]] += requirement.total
+        # the same in sparse form: for each product, the columns of its inputs and the amounts
+        # the inputs are kept in the order they were required; unused slots have an amount of zero
+        input_lists = []
+        for product in self.products:
+            inputs = []
+            for requirement in product.required:
+                column = self.columns[requirement.product_id]
+                if column not in inputs:
+                    inputs.append(column)
+            input_lists.append(inputs)
+        self.width = max([len(x) for x in input_lists] + [1])
+        self.inputs = np.zeros((total_products, self.width), dtype=np.int64)
+        self.amounts = np.zeros((total_products, self.width))
+        for column, inputs in enumerate(input_lists):
+            self.inputs[column, :len(inputs)] = inputs
+            self.amounts[column, :len(inputs)] = self.coefficients[column, inputs]
+
+    def slot(self, product, input_column):
+        # the slot that holds an input of a product, or None if it is not required
+        for slot in range(self.width):
+            if self.amounts[product, slot] > 0 and self.inputs[product, slot] == input_column:
+                return slot
+
+    def max_production(self, stock, product):
+        # stock is a producers x products matrix, product the column each producer makes
+        # the most each can make is the smallest ratio of stock to requirement
+        rows = np.arange(len(product))[:, None]
+        amounts = self.amounts[product]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratios = np.where(amounts > 0, stock[rows, self.inputs[product]] / amounts, np.inf)
+        production = ratios.min(axis=1)
+        # nothing can be made from no requirements
+        production[np.isinf(production)] = 0.0
+        return production
+
+    def consume(self, stock, production, product):
+        # remove the inputs used by a production run from stock, and return what was consumed
+        # the result is a producers x width matrix, matching the input slots
+        consumed = production[:, None] * self.amounts[product]
+        rows, slots = np.nonzero(self.amounts[product] > 0)
+        stock[rows, self.inputs[product][rows, slots]] -= consumed[rows, slots]
+        return consumed
+
+
+def compile_requirements(products):
+    return RequirementMatrix(products)
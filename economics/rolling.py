@@ -0,0 +1,147 @@
+import math
+from collections import deque
+
+# market statistics over a rolling window of cycles, updated incrementally once per cycle
+# heuristics can then ask for a moving average or the recent high without walking the history
+# all queries are O(1); each cycle costs O(1) amortised per product and window
+# cycles where a product was not traded count towards the window but carry no price
+# the running totals are counted again from the entries once every window, so rounding errors cannot build up
+
+
+class RollingWindow:
+    def __init__(self, size):
+        self.size = size
+        # the smoothing factor of the ewma, the usual choice for a window of this size
+        self.alpha = 2.0 / (size + 1)
+        # every cycle in the window as (cycle, price, volume); price is None if not traded
+        self.entries = deque()
+        self.price_total = 0.0
+        # the sum of the squared differences of the prices from their mean, updated as in Welford's method
+        self.deviations = 0.0
+        self.priced = 0
+        self.volume = 0.0
+        self.value = 0.0
+        self.ewma = None
+        # monotonic deques of (cycle, price): the front is always the window low or high
+        self.lows = deque()
+        self.highs = deque()
+
+    def add(self, cycle, price=None, low=None, high=None, volume=0.0):
+        # price is the average price of the cycle, low and high its price range
+        if price is not None:
+            mean = self.moving_average
+            self.price_total += price
+            self.priced += 1
+            if mean is not None:
+                self.deviations += (price - mean) * (price - self.price_total / self.priced)
+            if self.ewma is None:
+                self.ewma = price
+            else:
+                self.ewma += self.alpha * (price - self.ewma)
+            while len(self.lows) > 0 and self.lows[-1][1] >= low:
+                self.lows.pop()
+            self.lows.append((cycle, low))
+            while len(self.highs) > 0 and self.highs[-1][1] <= high:
+                self.highs.pop()
+            self.highs.append((cycle, high))
+            self.volume += volume
+            self.value += price * volume
+        self.entries.append((cycle, price, volume))
+        self.expire(cycle)
+        if cycle % self.size == 0:
+            self.recount()
+
+    def expire(self, cycle):
+        # drop everything older than the window
+        oldest = cycle - self.size
+        while len(self.entries) > 0 and self.entries[0][0] <= oldest:
+            _, price, volume = self.entries.popleft()
+            if price is not None:
+                mean = self.price_total / self.priced
+                self.price_total -= price
+                self.priced -= 1
+                if self.priced == 0:
+                    self.deviations = 0.0
+                else:
+                    self.deviations -= (price - mean) * (price - self.price_total / self.priced)
+                self.volume -= volume
+                self.value -= price * volume
+        while len(self.lows) > 0 and self.lows[0][0] <= oldest:
+            self.lows.popleft()
+        while len(self.highs) > 0 and self.highs[0][0] <= oldest:
+            self.highs.popleft()
+
+    def recount(self):
+        # the running totals from the entries in the window
+        prices = [(price, volume) for _, price, volume in self.entries if price is not None]
+        self.priced = len(prices)
+        self.price_total = math.fsum([x for x, _ in prices])
+        self.volume = math.fsum([x for _, x in prices])
+        self.value = math.fsum([x * y for x, y in prices])
+        self.deviations = 0.0
+        if self.priced > 0:
+            mean = self.price_total / self.priced
+            self.deviations = math.fsum([(x - mean) ** 2 for x, _ in prices])
+
+    @property
+    def moving_average(self):
+        if self.priced == 0:
+            return None
+        return self.price_total / self.priced
+
+    @property
+    def volatility(self):
+        # the standard deviation of the average price over the window
+        if self.priced == 0:
+            return None
+        # rounding can leave the deviations a little below zero when the prices are all the same
+        return math.sqrt(max(self.deviations, 0.0) / self.priced)
+
+    @property
+    def low(self):
+        if len(self.lows) == 0:
+            return None
+        return self.lows[0][1]
+
+    @property
+    def high(self):
+        if len(self.highs) == 0:
+            return None
+        return self.highs[0][1]
+
+    @property
+    def vwap(self):
+        # the volume weighted average price
+        if self.volume <= 0:
+            return None
+        return self.value / self.volume
+
+    def __repr__(self):
+        return f'Window {self.size}: MA {self.moving_average}, Vol {self.volume:.2f}'
+
+
+class RollingStats:
+    # the rolling windows for every product that has been auctioned
+    def __init__(self, windows):
+        self.windows = tuple(windows)
+        # {product_id: {window_size: RollingWindow}}
+        self.products = {}
+
+    def update(self, cycle, trades):
+        # trades is a dict of {product_id: ProductCycleStats} for this cycle
+        for product_id in trades:
+            if product_id not in self.products:
+                self.products[product_id] = {x: RollingWindow(x) for x in self.windows}
+        for product_id, windows in self.products.items():
+            stats = trades.get(product_id)
+            for window in windows.values():
+                if stats is None or stats.volume <= 0:
+                    window.add(cycle)
+                else:
+                    window.add(cycle, stats.average_price, stats.price_range.min_price,
+                               stats.price_range.max_price, stats.volume)
+
+    def get(self, product_id, window):
+        if product_id not in self.products:
+            return None
+        return self.products[product_id][window]
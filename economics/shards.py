@@ -0,0 +1,140 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from economics.batch import BatchedEconomy
+from economics.table import ProducerTable, Orders, TABLE_ARRAYS
+
+# a BatchedEconomy whose producers are split across worker processes
+# the table arrays live in shared memory, and every worker process maps them
+# each worker feeds, produces and makes the orders for its own range of rows, and sends back only the orders
+# this process clears the auctions and writes the fills straight into the shared money and stock
+# every row is worked on the same way as in a single process, and the orders come back in row order,
+# so the results are identical to a BatchedEconomy, or to an Economy with a table and vector_auction
+#     with ShardedEconomy([economy], shards=4) as sharded:
+#         sharded.run(100)
+
+
+class SharedArrays:
+    # numpy arrays held in shared memory blocks, one block per array
+    def __init__(self, layout, blocks):
+        # layout is {name: (block name, dtype, shape)}
+        self.layout = layout
+        self.blocks = blocks
+        self.arrays = {}
+        for name, (block_name, dtype, shape) in layout.items():
+            self.arrays[name] = np.ndarray(shape, dtype=dtype, buffer=blocks[name].buf)
+
+    @classmethod
+    def create(cls, arrays):
+        # copy {name: array} into new blocks
+        layout = {}
+        blocks = {}
+        for name, array in arrays.items():
+            # a block cannot be empty
+            blocks[name] = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            layout[name] = (blocks[name].name, array.dtype.str, array.shape)
+        shared = cls(layout, blocks)
+        for name, array in arrays.items():
+            shared.arrays[name][...] = array
+        return shared
+
+    @classmethod
+    def attach(cls, layout):
+        # map the blocks made by another process
+        blocks = {x: shared_memory.SharedMemory(name=y[0]) for x, y in layout.items()}
+        return cls(layout, blocks)
+
+    def close(self):
+        self.arrays = {}
+        for block in self.blocks.values():
+            block.close()
+
+    def unlink(self):
+        for block in self.blocks.values():
+            block.unlink()
+
+
+# the table of this worker process, set up by attach_worker
+worker_table = None
+worker_shared = None
+
+
+def attach_worker(layout, products, requirements):
+    global worker_table, worker_shared
+    worker_shared = SharedArrays.attach(layout)
+    worker_table = ProducerTable(products, 0, requirements)
+    for name in TABLE_ARRAYS:
+        setattr(worker_table, name, worker_shared.arrays[name])
+
+
+def shard_table(start, stop):
+    # a table of the rows from start to stop; the arrays are views onto the shared arrays
+    table = ProducerTable(worker_table.products, 0, worker_table.requirements)
+    for name in TABLE_ARRAYS:
+        setattr(table, name, getattr(worker_table, name)[start:stop])
+    return table
+
+
+def produce_shard(start, stop):
+    table = shard_table(start, stop)
+    table.feed_workers()
+    table.produce()
+
+
+def shard_orders(start, stop):
+    # the sells and buys of a range of rows, with the rows counted from the start of the whole table
+    table = shard_table(start, stop)
+    sells = table.get_sell_offers()
+    buys = table.get_buy_orders()
+    return ((sells.row + start, sells.product, sells.quantity, sells.price),
+            (buys.row + start, buys.product, buys.quantity, buys.price))
+
+
+def join_orders(parts):
+    return Orders(*[np.concatenate(x) for x in zip(*parts)])
+
+
+class ShardedEconomy(BatchedEconomy):
+    # shards is the number of worker processes, by default one per cpu
+    # call close() when done, to stop the workers and free the shared memory
+    def __init__(self, economies, max_cycles=None, shards=None, pricing=None):
+        super().__init__(economies, max_cycles, pricing)
+        if shards is None:
+            shards = os.cpu_count() or 1
+        shards = max(1, min(shards, len(self.table)))
+        # the rows of each shard
+        bounds = np.linspace(0, len(self.table), shards + 1).astype(np.int64).tolist()
+        self.starts = bounds[:-1]
+        self.stops = bounds[1:]
+        self.shared = SharedArrays.create({x: getattr(self.table, x) for x in TABLE_ARRAYS})
+        for name in TABLE_ARRAYS:
+            setattr(self.table, name, self.shared.arrays[name])
+        self.executor = ProcessPoolExecutor(shards, initializer=attach_worker,
+                                            initargs=(self.shared.layout, self.products, self.requirements))
+
+    def produce(self):
+        list(self.executor.map(produce_shard, self.starts, self.stops))
+
+    def get_orders(self):
+        parts = list(self.executor.map(shard_orders, self.starts, self.stops))
+        return join_orders([x[0] for x in parts]), join_orders([x[1] for x in parts])
+
+    def close(self):
+        # the table is copied out of shared memory, so it can still be read
+        if self.executor is None:
+            return
+        self.executor.shutdown()
+        self.executor = None
+        for name in TABLE_ARRAYS:
+            setattr(self.table, name, getattr(self.table, name).copy())
+        self.shared.close()
+        self.shared.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,409 @@
+import array
+import itertools
+import json
+import os.path
+import re
+
+import numpy as np
+
+from economics.economy import Economy
+from economics.errors import EconomyLoadError
+from economics.eventlog import write_chunk, read_header, chunk_array
+from economics.loader import WORKER_TAG, PRODUCTS_TAG, PRODUCERS_TAG, REQUIRED_TAG, REQUIRED_PRODUCTS
+from economics.loader import create_workers
+from economics.producer import Product, Producer, Requirement
+from economics.requirements import compile_requirements
+from economics.table import ProducerTable, TABLE_ARRAYS
+
+# loading very large economies, with millions of producers
+# stream_economy reads a json config in the same form as load_economy, but never holds all of it:
+# the products and producers are read one at a time, checked, and the producers written straight into
+# the arrays of a ProducerTable, so the economy that comes back is vectorized
+# every mistake is found in the same pass, and reported with where it is, e.g.
+#     Error: producers[12].stock.wood at line 40, column 9: unknown product wood
+# save_scenario writes an economy as one binary file, which load_scenario memory maps
+# so a saved world loads in about the same time however large it is
+
+SCENARIO_MAGIC = b'ECONSCN1'
+SCENARIO_VERSION = 1
+# the first read from the file; every read after one that ended inside a value is twice as large
+READ_SIZE = 1 << 16
+# the producer arrays are filled this many rows at a time
+BLOCK_ROWS = 1 << 16
+# json numbers are only ever read as these; bool is left out on purpose
+NUMBER_TYPES = (int, float)
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+SEPARATOR = re.compile(r'[ \t\n\r]*,[ \t\n\r]*')
+
+
+class JsonStream:
+    # reads the values of a json file one at a time, keeping track of the line and column
+    def __init__(self, json_file, read_size=READ_SIZE):
+        self.json_file = json_file
+        self.read_size = read_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        # lines are counted up to counted in the buffer, and only when a location is asked for
+        self.counted = 0
+        self.line = 1
+        self.line_start = 0
+
+    def read(self):
+        text = self.json_file.read(self.read_size)
+        if text == '':
+            self.eof = True
+        # drop what has been read, so the buffer only holds the value being read
+        self.location()
+        self.buffer = self.buffer[self.pos:] + text
+        self.counted -= self.pos
+        self.line_start -= self.pos
+        self.pos = 0
+
+    def location(self, pos=None):
+        # (line, column) of pos in the buffer, counted from 1; locations are asked for in order
+        if pos is None:
+            pos = self.pos
+        newlines = self.buffer.count('\n', self.counted, pos)
+        if newlines > 0:
+            self.line += newlines
+            self.line_start = self.buffer.rfind('\n', self.counted, pos) + 1
+        self.counted = pos
+        return self.line, pos - self.line_start + 1
+
+    def advance(self, end):
+        self.pos = end
+
+    def error(self, message, location=None):
+        if location is None:
+            location = self.location()
+        return EconomyLoadError(f'Error: line {location[0]}, column {location[1]}: {message}')
+
+    def peek(self):
+        # the next character that is not whitespace, or '' at the end of the file
+        while True:
+            self.advance(WHITESPACE.match(self.buffer, self.pos).end())
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if self.eof:
+                return ''
+            self.read()
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise self.error(f'expected {char} but found {found or "the end of the file"}')
+        self.advance(self.pos + 1)
+
+    def decode(self):
+        # (value, end) of the next value, reading until the buffer holds all of it
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # a number at the end of the buffer may go on in the next read
+                if end < len(self.buffer) or self.eof:
+                    return value, end
+            except json.JSONDecodeError as ex:
+                if self.eof:
+                    raise self.error(ex.msg, self.location(ex.pos))
+            self.read_size *= 2
+            self.read()
+
+    def value(self):
+        # (value, location) of the next value
+        self.peek()
+        location = self.location()
+        value, end = self.decode()
+        self.advance(end)
+        return value, location
+
+    def members(self):
+        # the keys of an object, with their locations; the caller reads each value before the next key
+        self.expect('{')
+        if self.peek() == '}':
+            self.advance(self.pos + 1)
+            return
+        while True:
+            key, location = self.value()
+            if not isinstance(key, str):
+                raise self.error('expected a key', location)
+            self.expect(':')
+            yield key, location
+            if self.peek() == ',':
+                self.advance(self.pos + 1)
+                continue
+            self.expect('}')
+            return
+
+    def chunks(self):
+        # the values of an array a buffer at a time, as a list of values and a list of where each starts
+        # the starts are only good until the next chunk, and location turns them into lines and columns,
+        # so the lines are only counted when a mistake is reported
+        self.expect('[')
+        if self.peek() == ']':
+            self.advance(self.pos + 1)
+            return
+        decode = self.decoder.raw_decode
+        while True:
+            value, end = self.decode()
+            values = [value]
+            starts = [self.pos]
+            # the values after it that lie wholly in the buffer
+            buffer = self.buffer
+            size = len(buffer)
+            separator = SEPARATOR.match(buffer, end)
+            while separator is not None and separator.end() < size:
+                start = separator.end()
+                try:
+                    value, value_end = decode(buffer, start)
+                except json.JSONDecodeError:
+                    break
+                if value_end == size and not self.eof:
+                    break
+                values.append(value)
+                starts.append(start)
+                end = value_end
+                separator = SEPARATOR.match(buffer, end)
+            yield values, starts
+            self.advance(end)
+            if self.peek() == ',':
+                self.advance(self.pos + 1)
+                continue
+            self.expect(']')
+            return
+
+    def elements(self):
+        # (value, location) for each value of an array
+        for values, starts in self.chunks():
+            for value, start in zip(values, starts):
+                yield value, self.location(start)
+
+
+def load_error(path, location, message):
+    return EconomyLoadError(f'Error: {path} at line {location[0]}, column {location[1]}: {message}')
+
+
+def producer_error(index, field, location, message):
+    return load_error(f'{PRODUCERS_TAG}[{index}]{field}', location, message)
+
+
+def is_number(value):
+    return type(value) in NUMBER_TYPES
+
+
+class ProductReader:
+    # checks the products as they are read; the requirements are checked once every name is known
+    def __init__(self):
+        self.names = {}
+        self.requires = []
+
+    def add(self, data, index, location):
+        path = f'{PRODUCTS_TAG}[{index}]'
+        if not isinstance(data, dict):
+            raise load_error(path, location, 'a product must be an object')
+        name = data.get('name')
+        if not isinstance(name, str):
+            raise load_error(f'{path}.name', location, 'a product needs a name')
+        if name in self.names:
+            raise load_error(f'{path}.name', location, f'product {name} is defined twice')
+        self.names[name] = len(self.names)
+        required = data.get(REQUIRED_TAG, [])
+        if not isinstance(required, list):
+            raise load_error(f'{path}.{REQUIRED_TAG}', location, 'requirements must be a list')
+        for number, require_data in enumerate(required):
+            require_path = f'{path}.{REQUIRED_TAG}[{number}]'
+            if not isinstance(require_data, dict):
+                raise load_error(require_path, location, 'a requirement must be an object')
+            for input_name, quantity in require_data.items():
+                if not is_number(quantity):
+                    raise load_error(f'{require_path}.{input_name}', location, 'the amount must be a number')
+                self.requires.append((name, input_name, quantity, f'{require_path}.{input_name}', location))
+
+    def create_products(self, location):
+        for name in REQUIRED_PRODUCTS:
+            if name not in self.names:
+                raise load_error(PRODUCTS_TAG, location, f'missing required product {name}')
+        products = {x: Product(x) for x in self.names}
+        for name, input_name, quantity, path, input_location in self.requires:
+            if input_name not in products:
+                raise load_error(path, input_location, f'unknown product {input_name}')
+            products[name].required.append(Requirement(products[input_name].id, quantity))
+        return products
+
+
+class ProducerArrays:
+    # the product column, money and stock of every producer
+    # most producers hold a few of many products, so the stock is kept as (column, value) pairs
+    # with the number each producer holds, and only made into a dense table once, in build_table
+    def __init__(self, names):
+        self.names = names
+        self.product = array.array('q')
+        self.money = array.array('d')
+        self.held = array.array('q')
+        self.columns = array.array('q')
+        self.values = array.array('d')
+
+    def add(self, values, index, locate):
+        # values are the producers from index on; locate(number) is the (line, column) of values[number],
+        # and is only asked for to report a mistake
+        # the checks are written out in full, as this runs once for every producer
+        names = self.names
+        for number, data in enumerate(values, start=index):
+            if type(data) is not dict:
+                raise producer_error(number, '', locate(number - index), 'a producer must be an object')
+            try:
+                product = data['product']
+                money = data['money']
+                stock = data['stock']
+            except KeyError as ex:
+                raise producer_error(number, '', locate(number - index), f'missing {ex.args[0]}')
+            if type(product) is not str:
+                raise producer_error(number, '.product', locate(number - index), 'the product must be a name')
+            if product not in names:
+                raise producer_error(number, '.product', locate(number - index), f'unknown product {product}')
+            if type(money) not in NUMBER_TYPES:
+                raise producer_error(number, '.money', locate(number - index), 'money must be a number')
+            if type(stock) is not dict:
+                raise producer_error(number, '.stock', locate(number - index), 'stock must be an object')
+            for name, value in stock.items():
+                if name not in names:
+                    raise producer_error(number, f'.stock.{name}', locate(number - index), f'unknown product {name}')
+                if type(value) not in NUMBER_TYPES:
+                    raise producer_error(number, f'.stock.{name}', locate(number - index), 'stock must be a number')
+                self.columns.append(names[name])
+                self.values.append(value)
+            self.held.append(len(stock))
+            self.product.append(names[product])
+            self.money.append(money)
+
+    def arrays(self):
+        # the arrays share the memory of the ones they were filled in
+        return [np.frombuffer(x, dtype=np.int64 if x.typecode == 'q' else np.float64)
+                for x in [self.product, self.money, self.held, self.columns, self.values]]
+
+
+def reserve_ids(total):
+    # take the next total producer ids, as creating that many Producers would
+    start = next(Producer.id_iter)
+    Producer.id_iter = itertools.count(start + total)
+    return np.arange(start, start + total, dtype=np.int64)
+
+
+def check_workers(data, location):
+    if not isinstance(data, dict):
+        raise load_error(WORKER_TAG, location, 'workers must be an object')
+    if not is_number(data.get('total')):
+        raise load_error(f'{WORKER_TAG}.total', location, 'the total must be a number')
+
+
+def build_table(products, requirements, arrays, workers_data):
+    # the same economy create_economy makes, with the producers in a table
+    # the workers are the first row, and are made after the producers so the ids match
+    product, money, held, columns, values = arrays
+    ids = reserve_ids(len(product))
+    workers = create_workers(workers_data, products)
+    table = ProducerTable(requirements.products, len(product) + 1, requirements)
+    # the products were made in the order of the config, so their columns are in that order too
+    table.ids[1:] = ids
+    table.product[1:] = product
+    table.money[1:] = money
+    table.stock[np.repeat(np.arange(1, len(table)), held), columns] = values
+    # a producer never starts with any of what it makes
+    table.stock[np.arange(1, len(table)), table.product[1:]] = 0.0
+    table.ids[0] = workers.id
+    table.product[0] = table.columns[workers.labor_id]
+    table.money[0] = workers.money
+    for product_id, value in workers.stock.items():
+        table.stock[0, table.columns[product_id]] = value
+    table.workers[0] = workers.workers
+    table.desire[0] = table.columns[workers.desires[0]]
+    table.make_rows()
+    return table
+
+
+def stream_economy(filepath, **options):
+    # any options are passed on to the Economy
+    if not os.path.exists(filepath):
+        raise EconomyLoadError(f'Path {filepath} does not exist')
+    with open(filepath) as json_file:
+        stream = JsonStream(json_file)
+        product_reader = ProductReader()
+        producers = None
+        # producers that come before the products can only be checked once the products are known
+        waiting = []
+        workers_data = None
+        products = None
+        for key, location in stream.members():
+            if key == PRODUCTS_TAG:
+                for index, (data, element_location) in enumerate(stream.elements()):
+                    product_reader.add(data, index, element_location)
+                products = product_reader.create_products(location)
+                producers = ProducerArrays(product_reader.names)
+                for values, index, locations in waiting:
+                    producers.add(values, index, locations.__getitem__)
+                waiting = []
+            elif key == PRODUCERS_TAG:
+                index = 0
+                for values, starts in stream.chunks():
+                    if producers is None:
+                        waiting.append((values, index, [stream.location(x) for x in starts]))
+                    else:
+                        producers.add(values, index, lambda number: stream.location(starts[number]))
+                    index += len(values)
+            elif key == WORKER_TAG:
+                workers_data, workers_location = stream.value()
+                check_workers(workers_data, workers_location)
+            else:
+                stream.value()
+        if stream.peek() != '':
+            raise stream.error('unexpected data after the config')
+    for key, value in [(WORKER_TAG, workers_data), (PRODUCTS_TAG, products), (PRODUCERS_TAG, producers)]:
+        if value is None:
+            raise EconomyLoadError(f'Error: Missing {key} in data')
+    requirements = compile_requirements(products.values())
+    table = build_table(products, requirements, producers.arrays(), workers_data)
+    return Economy(list(products.values()), table, requirements=requirements, **options)
+
+
+def save_scenario(economy, filepath):
+    # the products and producers of an economy; the history is not kept
+    table = economy.table
+    if table is None:
+        table = ProducerTable.from_producers(economy.products, economy.producers, economy.requirements)
+    columns = table.columns
+    requirements = [(columns[x.id], columns[r.product_id], r.total) for x in table.products for r in x.required]
+    arrays = {'product_names': np.array([x.name for x in table.products]),
+              'requirements': np.array(requirements, dtype=np.float64).reshape(len(requirements), 3)}
+    for name in TABLE_ARRAYS:
+        arrays[name] = getattr(table, name)
+    with open(filepath, 'wb') as scenario_file:
+        scenario_file.write(SCENARIO_MAGIC)
+        write_chunk(scenario_file, arrays, {'version': SCENARIO_VERSION})
+
+
+def load_scenario(filepath, **options):
+    # the arrays are mapped copy on write: they are read from disk as they are used, and the file never changes
+    # the products and producers are given new ids, so a scenario can be loaded many times
+    if not os.path.exists(filepath):
+        raise EconomyLoadError(f'Path {filepath} does not exist')
+    data = np.memmap(filepath, dtype=np.uint8, mode='c')
+    if bytes(data[:len(SCENARIO_MAGIC)]) != SCENARIO_MAGIC:
+        raise EconomyLoadError(f'Error: {filepath} is not a scenario')
+    header = read_header(data, len(SCENARIO_MAGIC))
+    if header is None:
+        raise EconomyLoadError(f'Error: {filepath} is not complete')
+    if header['version'] != SCENARIO_VERSION:
+        raise EconomyLoadError(f'Error: Unknown scenario version {header["version"]}')
+    products = [Product(str(x)) for x in chunk_array(data, header, 'product_names').tolist()]
+    for product, required, total in chunk_array(data, header, 'requirements').tolist():
+        products[int(product)].required.append(Requirement(products[int(required)].id, total))
+    requirements = compile_requirements(products)
+    table = ProducerTable(products, 0, requirements)
+    for name in TABLE_ARRAYS:
+        if name in header['arrays']:
+            setattr(table, name, chunk_array(data, header, name))
+    table.ids = reserve_ids(len(table.ids))
+    table.make_rows()
+    return Economy(products, table, requirements=requirements, **options)
@@ -0,0 +1,489 @@
+from collections import deque
+from collections.abc import MutableMapping, Sequence
+
+import numpy as np
+
+from economics.offers import SellOffer, BuyOffer
+from economics.producer import Producer, Workers, ProducerCycleHistory, SellResult, BuyResult, HISTORY_MAX_LENGTH
+from economics.requirements import compile_requirements
+
+# a struct-of-arrays store for a whole population of producers
+# money, stock and prices live in numpy arrays with one row per producer, so that
+# each phase of a cycle is a handful of array operations instead of a python loop
+# every row can still be handled as a Producer through a ProducerRow view, which
+# keeps the heuristics, auctions and tests working unchanged
+# the offers and results of each cycle are kept by the table as arrays too, and a row's
+# cycle history is only made from them when it is asked for
+
+
+# the arrays that hold the state of a table, one row per producer
+TABLE_ARRAYS = ['ids', 'product', 'money', 'sale_price', 'buy_limit', 'stock', 'last_consumption', 'workers',
+                'desire']
+
+
+class Orders:
+    # sell or buy orders as arrays, one entry per order
+    # row is the producer row in the table, product is the product column
+    FIELDS = ['row', 'product', 'quantity', 'price']
+
+    def __init__(self, row, product, quantity, price):
+        self.row = row
+        self.product = product
+        self.quantity = quantity
+        self.price = price
+
+    def __len__(self):
+        return len(self.row)
+
+    def subset(self, index):
+        return type(self)(*[getattr(self, x)[index] for x in self.FIELDS])
+
+    @classmethod
+    def join(cls, parts):
+        if len(parts) == 0:
+            index = np.zeros(0, dtype=np.int64)
+            return cls(index, index, *[np.zeros(0) for _ in cls.FIELDS[2:]])
+        return cls(*[np.concatenate([getattr(x, name) for x in parts]) for name in cls.FIELDS])
+
+
+class Results(Orders):
+    # the fills of orders, one entry per fill
+    # price is what the order asked or offered, and actual is the price of the fill
+    FIELDS = ['row', 'product', 'quantity', 'price', 'actual']
+
+    def __init__(self, row, product, quantity, price, actual):
+        super().__init__(row, product, quantity, price)
+        self.actual = actual
+
+
+# the parts of a cycle of a table, and what each is held as
+CYCLE_PARTS = {'sells': Orders, 'buys': Orders, 'sales': Results, 'purchases': Results}
+
+
+class TableCycle:
+    # what the rows of a table offered, sold and bought in a cycle
+    # the parts are added as arrays while the cycle runs, or one at a time by the python auction,
+    # and are joined into a single array of each the first time they are read
+    def __init__(self):
+        self.parts = {x: [] for x in CYCLE_PARTS}
+        self.single = {x: [] for x in CYCLE_PARTS}
+        # the entries of each part by row, and the cycle histories made from them
+        self.by_row = {}
+        self.histories = {}
+
+    def changed(self):
+        self.by_row = {}
+        self.histories = {}
+
+    def add(self, name, orders):
+        self.join_single(name)
+        self.parts[name].append(orders)
+        self.changed()
+
+    def add_one(self, name, *values):
+        self.single[name].append(values)
+        self.changed()
+
+    def join_single(self, name):
+        if len(self.single[name]) == 0:
+            return
+        columns = list(zip(*self.single[name]))
+        self.single[name] = []
+        part = CYCLE_PARTS[name](np.array(columns[0], dtype=np.int64), np.array(columns[1], dtype=np.int64),
+                                 *[np.array(x, dtype=np.float64) for x in columns[2:]])
+        self.parts[name].append(part)
+
+    def get(self, name):
+        self.join_single(name)
+        if len(self.parts[name]) != 1:
+            self.parts[name] = [CYCLE_PARTS[name].join(self.parts[name])]
+        return self.parts[name][0]
+
+    def entries(self, name, row):
+        # the positions in a part of the entries of a row, in the order they were added
+        if name not in self.by_row:
+            rows = self.get(name).row
+            order = np.argsort(rows, kind='stable')
+            self.by_row[name] = (order, rows[order])
+        order, rows = self.by_row[name]
+        return order[np.searchsorted(rows, row, 'left'):np.searchsorted(rows, row, 'right')].tolist()
+
+    def history(self, table, row):
+        if row not in self.histories:
+            self.histories[row] = self.make_history(table, row)
+        return self.histories[row]
+
+    def make_history(self, table, row):
+        history = ProducerCycleHistory()
+        producer = table.rows[row]
+        product_ids = table.product_ids.tolist()
+        sells = self.get('sells')
+        for x in self.entries('sells', row):
+            history.add_sell_offer(SellOffer(producer, product_ids[sells.product[x]], float(sells.quantity[x]),
+                                             float(sells.price[x])))
+        buys = self.get('buys')
+        for x in self.entries('buys', row):
+            history.add_buy_offer(BuyOffer(producer, product_ids[buys.product[x]], float(buys.quantity[x]),
+                                           float(buys.price[x])))
+        sales = self.get('sales')
+        for x in self.entries('sales', row):
+            history.add_sale(SellResult(float(sales.price[x]), float(sales.actual[x]), float(sales.quantity[x]),
+                                        product_ids[sales.product[x]]))
+        purchases = self.get('purchases')
+        for x in self.entries('purchases', row):
+            history.add_purchase(BuyResult(float(purchases.price[x]), float(purchases.actual[x]),
+                                           float(purchases.quantity[x]), product_ids[purchases.product[x]]))
+        return history
+
+
+class RowHistory(Sequence):
+    # the cycle history of a row, made from the cycles of its table
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    def __len__(self):
+        return len(self.table.cycles)
+
+    def __getitem__(self, entry):
+        if isinstance(entry, slice):
+            return [self[x] for x in range(*entry.indices(len(self)))]
+        return self.table.cycles[entry].history(self.table, self.index)
+
+
+def history_rows(producers):
+    # the cycle histories of producers as arrays of (producer, entry, product id, quantity, price[, actual price])
+    lengths = []
+    rows = {x: [] for x in CYCLE_PARTS}
+    for index, producer in enumerate(producers):
+        lengths.append(len(producer.cycle_history))
+        for entry, cycle in enumerate(producer.cycle_history):
+            rows['sells'].extend([(index, entry, x.product_id, x.total_offered, x.cost_per_unit)
+                                  for x in cycle.sell_offers])
+            rows['buys'].extend([(index, entry, x.product_id, x.total_wanted, x.max_price) for x in cycle.buy_offers])
+            rows['sales'].extend([(index, entry, x.product_id, x.quantity, x.asking_price, x.actual_price)
+                                  for x in cycle.auction_sales])
+            rows['purchases'].extend([(index, entry, x.product_id, x.quantity, x.offer_price, x.actual_price)
+                                      for x in cycle.auction_buys])
+    # the ids are small enough to be held exactly as floats
+    arrays = {}
+    for name, values in rows.items():
+        width = len(CYCLE_PARTS[name].FIELDS) + 1
+        arrays[name] = np.array(values, dtype=np.float64).reshape(len(values), width)
+    return lengths, arrays
+
+
+class StockView(MutableMapping):
+    # a dict-like view of the stock of a single row, keyed by product id
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    def __getitem__(self, product_id):
+        return float(self.table.stock[self.index, self.table.columns[product_id]])
+
+    def __setitem__(self, product_id, value):
+        self.table.stock[self.index, self.table.columns[product_id]] = value
+
+    def __delitem__(self, product_id):
+        raise TypeError('Error: Cannot remove a product from a table row')
+
+    def __contains__(self, product_id):
+        return product_id in self.table.columns
+
+    def __iter__(self):
+        return iter(self.table.columns)
+
+    def __len__(self):
+        return len(self.table.columns)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class ProducerRow(Producer):
+    # a lightweight Producer that reads and writes a row of a ProducerTable
+    def __init__(self, table, index, producer_id, product):
+        self.table = table
+        self.index = index
+        self.id = producer_id
+        self.product = product
+
+    @property
+    def cycle_history(self):
+        return RowHistory(self.table, self.index)
+
+    @property
+    def money(self):
+        return float(self.table.money[self.index])
+
+    @money.setter
+    def money(self, value):
+        self.table.money[self.index] = value
+
+    @property
+    def sale_price(self):
+        return float(self.table.sale_price[self.index])
+
+    @sale_price.setter
+    def sale_price(self, value):
+        self.table.sale_price[self.index] = value
+
+    @property
+    def buy_limit(self):
+        return float(self.table.buy_limit[self.index])
+
+    @buy_limit.setter
+    def buy_limit(self, value):
+        self.table.buy_limit[self.index] = value
+
+    @property
+    def stock(self):
+        return StockView(self.table, self.index)
+
+    @property
+    def last_consumption(self):
+        # only the products this producer needs, in the same way as Producer.consume_stock
+        requirements = self.table.requirements
+        product = self.table.product[self.index]
+        consumed = {}
+        for slot in range(requirements.width):
+            if requirements.amounts[product, slot] > 0:
+                product_id = self.table.products[requirements.inputs[product, slot]].id
+                consumed[product_id] = float(self.table.last_consumption[self.index, slot])
+        return consumed
+
+    @last_consumption.setter
+    def last_consumption(self, consumed):
+        self.table.last_consumption[self.index] = 0.0
+        for product_id, amount in consumed.items():
+            slot = self.table.requirements.slot(self.table.product[self.index], self.table.columns[product_id])
+            self.table.last_consumption[self.index, slot] = amount
+
+    def add_sale(self, sale):
+        self.table.cycles[-1].add_one('sales', self.index, self.table.columns[sale.product_id], sale.quantity,
+                                      sale.asking_price, sale.actual_price)
+
+    def add_purchase(self, purchase):
+        self.table.cycles[-1].add_one('purchases', self.index, self.table.columns[purchase.product_id],
+                                      purchase.quantity, purchase.offer_price, purchase.actual_price)
+
+
+class WorkersRow(ProducerRow, Workers):
+    def __init__(self, table, index, producer_id, product, food_id):
+        super().__init__(table, index, producer_id, product)
+        self.labor_id = product.id
+        self.desires = [food_id]
+
+    @property
+    def workers(self):
+        return float(self.table.workers[self.index])
+
+    @workers.setter
+    def workers(self, value):
+        self.table.workers[self.index] = value
+
+
+class TableRows(Sequence):
+    # the ProducerRow views of a table, each made the first time it is used
+    # so a table of millions of rows can be loaded without making millions of objects
+    def __init__(self, table):
+        self.table = table
+        self.views = {}
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[x] for x in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('Error: Table row out of range')
+        if index not in self.views:
+            self.views[index] = self.table.make_row(index)
+        return self.views[index]
+
+
+class ProducerTable:
+    def __init__(self, products, size, requirements=None):
+        if requirements is None:
+            requirements = compile_requirements(products)
+        self.requirements = requirements
+        # product ids are global, so every product is given a column in this table
+        self.products = requirements.products
+        self.columns = requirements.columns
+        self.product_ids = np.array([x.id for x in self.products], dtype=np.int64)
+        total_products = len(self.products)
+        self.ids = np.zeros(size, dtype=np.int64)
+        self.product = np.zeros(size, dtype=np.int64)
+        self.money = np.zeros(size)
+        self.sale_price = np.ones(size)
+        self.buy_limit = np.ones(size)
+        self.stock = np.zeros((size, total_products))
+        # what was consumed in the last production run, by requirement input slot
+        self.last_consumption = np.zeros((size, requirements.width))
+        # workers are rows that sell labor and eat; for other producers this is zero
+        self.workers = np.zeros(size)
+        self.desire = np.full(size, -1, dtype=np.int64)
+        self.rows = []
+        # the most recent cycles, oldest first, as the cycle history of a producer
+        self.cycles = deque(maxlen=HISTORY_MAX_LENGTH)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_producers(cls, products, producers, requirements=None):
+        table = cls(products, len(producers), requirements)
+        for index, producer in enumerate(producers):
+            table.ids[index] = producer.id
+            table.product[index] = table.columns[producer.product.id]
+            table.money[index] = producer.money
+            table.sale_price[index] = producer.sale_price
+            table.buy_limit[index] = producer.buy_limit
+            for product_id, value in producer.stock.items():
+                table.stock[index, table.columns[product_id]] = value
+            for product_id, value in producer.last_consumption.items():
+                slot = table.requirements.slot(table.product[index], table.columns[product_id])
+                table.last_consumption[index, slot] = value
+            if isinstance(producer, Workers):
+                table.workers[index] = producer.workers
+                table.desire[index] = table.columns[producer.desires[0]]
+        table.make_rows()
+        table.load_history(*history_rows(producers))
+        return table
+
+    def make_rows(self):
+        # create the Producer views onto every row
+        self.rows = TableRows(self)
+
+    def make_row(self, index):
+        product = self.products[self.product[index]]
+        if self.desire[index] >= 0:
+            food_id = self.products[self.desire[index]].id
+            return WorkersRow(self, index, int(self.ids[index]), product, food_id)
+        return ProducerRow(self, index, int(self.ids[index]), product)
+
+    @property
+    def is_worker(self):
+        return self.desire >= 0
+
+    def history_rows(self):
+        # the same arrays as history_rows(producers); every row has a history as long as the table's
+        lengths = [len(self.cycles)] * len(self)
+        arrays = {}
+        for name, part in CYCLE_PARTS.items():
+            values = []
+            for entry, cycle in enumerate(self.cycles):
+                orders = cycle.get(name)
+                columns = [orders.row, np.full(len(orders), entry), self.product_ids[orders.product]]
+                values.append(np.column_stack(columns + [getattr(orders, x) for x in part.FIELDS[2:]]))
+            arrays[name] = np.concatenate(values + [np.zeros((0, len(part.FIELDS) + 1))]).astype(np.float64)
+        return lengths, arrays
+
+    def load_history(self, lengths, arrays):
+        # the cycles from the arrays of history_rows; a shorter history is the latest cycles of the table
+        length = max(lengths, default=0)
+        lengths = np.array(lengths, dtype=np.int64)
+        self.cycles.clear()
+        self.cycles.extend([TableCycle() for _ in range(length)])
+        for name, values in arrays.items():
+            row = values[:, 0].astype(np.int64)
+            entry = values[:, 1].astype(np.int64) + length - lengths[row]
+            product = np.array([self.columns[x] for x in values[:, 2].astype(np.int64).tolist()], dtype=np.int64)
+            for position, cycle in enumerate(self.cycles):
+                selected = entry == position
+                fields = [values[selected, x] for x in range(3, values.shape[1])]
+                cycle.add(name, CYCLE_PARTS[name](row[selected], product[selected], *fields))
+
+    def init_cycle(self):
+        # a new entry in the history of every row, and no row views are made
+        self.cycles.append(TableCycle())
+        self.feed_workers()
+
+    def feed_workers(self):
+        # workers eat food
+        workers = np.flatnonzero(self.is_worker)
+        self.stock[workers, self.desire[workers]] -= self.workers[workers]
+
+    def get_max_production(self):
+        production = self.requirements.max_production(self.stock, self.product)
+        # workers do not produce
+        production[self.is_worker] = 0.0
+        return production
+
+    def produce(self, rows=None):
+        # all producers make what they can in one step, and the inputs are removed in one update
+        # with rows, only those producers make anything, and the others keep their last consumption
+        if rows is not None:
+            self.produce_rows(rows)
+            return
+        production = self.get_max_production()
+        # written into the existing array, which may be shared with other processes
+        self.last_consumption[:] = self.requirements.consume(self.stock, production, self.product)
+        self.stock[np.arange(len(self)), self.product] += production
+
+    def produce_rows(self, rows):
+        product = self.product[rows]
+        stock = self.stock[rows]
+        production = self.requirements.max_production(stock, product)
+        production[self.is_worker[rows]] = 0.0
+        self.last_consumption[rows] = self.requirements.consume(stock, production, product)
+        stock[np.arange(len(rows)), product] += production
+        self.stock[rows] = stock
+
+    def get_sell_offers(self, rows=None):
+        # producers offer all of their stock at their price
+        # workers offer labor at a fixed cost of 1 unit of money per worker
+        # rows, in order, limits the offers to those producers
+        if rows is None:
+            rows = np.arange(len(self))
+        product = self.product[rows]
+        is_worker = self.is_worker[rows]
+        available = self.stock[rows, product]
+        quantity = np.where(is_worker, self.workers[rows], available)
+        price = np.where(is_worker, 1.0, self.sale_price[rows])
+        selling = np.flatnonzero(is_worker | (available != 0))
+        return Orders(rows[selling], product[selling], quantity[selling], price[selling])
+
+    def get_buy_orders(self):
+        # producers buy back what they consumed, paying up to their buy limit
+        amounts = self.requirements.amounts[self.product]
+        rows, slots = np.nonzero((amounts > 0) & ~self.is_worker[:, None])
+        products = self.requirements.inputs[self.product][rows, slots]
+        quantity = self.last_consumption[rows, slots]
+        price = self.buy_limit[rows]
+        # workers require 1 food per worker per cycle, and spend all their money on it
+        workers = np.flatnonzero(self.is_worker)
+        rows = np.concatenate([rows, workers])
+        products = np.concatenate([products, self.desire[workers]])
+        quantity = np.concatenate([quantity, self.workers[workers]])
+        price = np.concatenate([price, self.money[workers] / self.workers[workers]])
+        order = np.argsort(rows, kind='stable')
+        return Orders(rows[order], products[order], quantity[order], price[order])
+
+    def sell_orders(self, rows=None):
+        # the sell orders, recorded in the history of this cycle
+        orders = self.get_sell_offers(rows)
+        self.cycles[-1].add('sells', orders)
+        return orders
+
+    def buy_orders(self):
+        orders = self.get_buy_orders()
+        self.cycles[-1].add('buys', orders)
+        return orders
+
+    def sell_offers(self, rows=None):
+        # the sell orders as SellOffers from the row views, for the auctions that take offers
+        orders = self.sell_orders(rows)
+        return [SellOffer(self.rows[row], self.products[product].id, quantity, price)
+                for row, product, quantity, price in zip(orders.row.tolist(), orders.product.tolist(),
+                                                         orders.quantity.tolist(), orders.price.tolist())]
+
+    def buy_offers(self):
+        orders = self.buy_orders()
+        return [BuyOffer(self.rows[row], self.products[product].id, quantity, price)
+                for row, product, quantity, price in zip(orders.row.tolist(), orders.product.tolist(),
+                                                         orders.quantity.tolist(), orders.price.tolist())]
@@ -0,0 +1,313 @@
+import os
+
+import numpy as np
+
+# older cycles of a History at a lower resolution, so a run of any length holds a bounded amount of memory
+# the most recent cycles are held in full by the ColumnStore; before they are written over they are gathered
+# into buckets of, say, 10 cycles, and as those are pushed out in turn into buckets of 100, and so on
+# a bucket keeps the open, high, low and close price of every product and the totals of volume, value,
+# unsold and unfilled orders, so the prices and volume of any stretch of the run can still be drawn
+# the oldest buckets of the last size are written to disk when a directory is given, else dropped
+#     history = History(retention=Retention.from_budget(64 * 2 ** 20, products=len(economy.products)))
+# get_last_* and the rolling windows only look at recent cycles, and are unchanged by this
+
+# the fields of a bucket, each by [bucket, product column]; traded is the number of cycles with an auction
+BUCKET_FIELDS = ['open', 'high', 'low', 'close', 'volume', 'value', 'price_total', 'unsold', 'unfilled_orders',
+                 'traded']
+# cycles go into buckets this many at a time, so the recent cycles hold up to this many more
+FLUSH_CYCLES = 1000
+
+
+def spill_path(directory, first_cycle):
+    return os.path.join(directory, f'buckets_{first_cycle}.npz')
+
+
+def column_width(products):
+    # the columns a ColumnStore holds for this many products: it starts with 4 and doubles
+    width = 4
+    while width < products:
+        width *= 2
+    return width
+
+
+class Buckets:
+    # a run of buckets, oldest first; first_cycle and cycles are one per bucket
+    def __init__(self, first_cycle, cycles, fields):
+        self.first_cycle = first_cycle
+        self.cycles = cycles
+        self.fields = fields
+
+    @classmethod
+    def empty(cls, width=0):
+        return cls(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64),
+                   {x: np.zeros((0, width)) for x in BUCKET_FIELDS})
+
+    @classmethod
+    def from_cycles(cls, first_cycle, data, traded):
+        # a bucket for every cycle, from the arrays of History STAT_FIELDS by [cycle, product column]
+        total = len(traded)
+        price = np.where(traded, data['average_price'], 0.0)
+        fields = {'open': price,
+                  'high': np.where(traded, data['max_price'], 0.0),
+                  'low': np.where(traded, data['min_price'], 0.0),
+                  'close': price,
+                  'volume': data['volume'],
+                  'value': price * data['volume'],
+                  'price_total': price,
+                  'unsold': data['unsold'],
+                  'unfilled_orders': data['unfilled_orders'],
+                  'traded': traded.astype(np.float64)}
+        return cls(np.arange(first_cycle, first_cycle + total, dtype=np.int64), np.ones(total, dtype=np.int64),
+                   fields)
+
+    @classmethod
+    def join(cls, parts):
+        width = max([x.width for x in parts] + [0])
+        parts = [x.widen(width) for x in parts]
+        return cls(np.concatenate([x.first_cycle for x in parts]), np.concatenate([x.cycles for x in parts]),
+                   {x: np.concatenate([y.fields[x] for y in parts]) for x in BUCKET_FIELDS})
+
+    def __len__(self):
+        return len(self.first_cycle)
+
+    @property
+    def width(self):
+        return self.fields['traded'].shape[1]
+
+    @property
+    def nbytes(self):
+        return self.first_cycle.nbytes + self.cycles.nbytes + sum([x.nbytes for x in self.fields.values()])
+
+    def widen(self, width):
+        # new products get a column with no trades
+        if width <= self.width:
+            return self
+        padding = ((0, 0), (0, width - self.width))
+        return Buckets(self.first_cycle, self.cycles, {x: np.pad(y, padding) for x, y in self.fields.items()})
+
+    def take(self, start, stop):
+        # a copy, so the arrays this came from can be freed
+        return Buckets(self.first_cycle[start:stop].copy(), self.cycles[start:stop].copy(),
+                       {x: y[start:stop].copy() for x, y in self.fields.items()})
+
+    def merge(self, group):
+        # every group buckets in a row make one; the length must be a multiple of group
+        total = len(self) // group
+        shape = (total, group, self.width)
+        fields = {x: self.fields[x].reshape(shape) for x in BUCKET_FIELDS}
+        traded = fields['traded'] > 0
+        any_traded = traded.any(axis=1)
+        # the open is of the first bucket with a trade, the close of the last
+        first = traded.argmax(axis=1)[:, None]
+        last = group - 1 - traded[:, ::-1].argmax(axis=1)[:, None]
+        merged = {'open': np.take_along_axis(fields['open'], first, axis=1)[:, 0],
+                  'high': np.where(any_traded, np.where(traded, fields['high'], -np.inf).max(axis=1), 0.0),
+                  'low': np.where(any_traded, np.where(traded, fields['low'], np.inf).min(axis=1), 0.0),
+                  'close': np.take_along_axis(fields['close'], last, axis=1)[:, 0]}
+        for field in ['volume', 'value', 'price_total', 'unsold', 'unfilled_orders', 'traded']:
+            merged[field] = fields[field].sum(axis=1)
+        return Buckets(self.first_cycle[::group].copy(), self.cycles.reshape(total, group).sum(axis=1), merged)
+
+    def values(self, field):
+        # a field of History STAT_FIELDS for every bucket, by [bucket, product column]
+        # the price is the volume weighted average, and volume, unsold and unfilled orders are per cycle,
+        # so a series goes on smoothly from buckets to the cycles held in full
+        fields = self.fields
+        if field == 'average_price':
+            with np.errstate(divide='ignore', invalid='ignore'):
+                vwap = fields['value'] / fields['volume']
+                mean = fields['price_total'] / fields['traded']
+            price = np.where(fields['volume'] > 0, vwap, np.where(fields['traded'] > 0, mean, 0.0))
+            # a single cycle has its own average price, which the division could round
+            return np.where(self.cycles[:, None] == 1, fields['price_total'], price)
+        if field == 'min_price':
+            return fields['low']
+        if field == 'max_price':
+            return fields['high']
+        return fields[field] / self.cycles[:, None]
+
+    def save(self, arrays, prefix):
+        arrays[f'{prefix}_first_cycle'] = self.first_cycle
+        arrays[f'{prefix}_cycles'] = self.cycles
+        for field in BUCKET_FIELDS:
+            arrays[f'{prefix}_{field}'] = self.fields[field]
+
+    @classmethod
+    def load(cls, arrays, prefix):
+        return cls(arrays[f'{prefix}_first_cycle'].copy(), arrays[f'{prefix}_cycles'].copy(),
+                   {x: arrays[f'{prefix}_{x}'].copy() for x in BUCKET_FIELDS})
+
+
+class BucketTier:
+    # buckets of one size, the most recent capacity of them
+    def __init__(self, size, capacity):
+        self.size = size
+        self.capacity = capacity
+        self.buckets = Buckets.empty()
+        # smaller buckets that do not yet make up a whole one
+        self.pending = Buckets.empty()
+
+    @property
+    def nbytes(self):
+        return self.buckets.nbytes + self.pending.nbytes
+
+    def add(self, buckets):
+        # buckets, oldest first, of a size that divides this one
+        # returns the buckets that no longer fit, or None
+        pending = Buckets.join([self.pending, buckets])
+        if len(pending) == 0:
+            return None
+        group = self.size // int(pending.cycles[0])
+        whole = len(pending) // group * group
+        self.pending = pending.take(whole, len(pending))
+        if whole == 0:
+            return None
+        self.buckets = Buckets.join([self.buckets, pending.take(0, whole).merge(group)])
+        if len(self.buckets) <= self.capacity:
+            return None
+        # half are moved on at a time, so that it is not done for every bucket
+        keep = self.capacity // 2
+        moved = self.buckets.take(0, len(self.buckets) - keep)
+        self.buckets = self.buckets.take(len(self.buckets) - keep, len(self.buckets))
+        return moved
+
+
+class Retention:
+    # recent cycles are held in full, then buckets of each of sizes, with the given number of each
+    # every size must be a multiple of the one before; with a directory the oldest buckets are kept there
+    # the recent cycles are put into buckets flush at a time, and are held until they are written over
+    def __init__(self, recent=10000, sizes=(10, 100), buckets=1000, directory=None, flush=FLUSH_CYCLES):
+        sizes = tuple(sizes)
+        if len(sizes) == 0 or sizes[0] < 1:
+            raise ValueError('Error: A retention needs at least one bucket size')
+        for smaller, larger in zip(sizes, sizes[1:]):
+            if larger <= smaller or larger % smaller != 0:
+                raise ValueError(f'Error: Bucket size {larger} is not a multiple of {smaller}')
+        if recent < 1 or buckets < 1 or flush < 1:
+            raise ValueError('Error: A retention must hold at least one cycle and bucket of each size')
+        self.recent = recent
+        self.sizes = sizes
+        self.buckets = buckets
+        self.directory = directory
+        self.flush = flush
+
+    @classmethod
+    def from_budget(cls, memory_budget, products, sizes=(10, 100), directory=None):
+        # split a budget in bytes for the arrays of a History of this many products:
+        # half for the recent cycles, with those already in buckets, and the rest evenly between the sizes
+        from economics.history import STAT_FIELDS
+        width = column_width(products)
+        # every field is a float, and traded a bool
+        cycle_bytes = width * (len(STAT_FIELDS) * 8 + 1)
+        bucket_bytes = width * len(BUCKET_FIELDS) * 8 + 16
+        rows = memory_budget // 2 // cycle_bytes
+        flush = min(FLUSH_CYCLES, rows // 2)
+        # a tier also holds the smaller buckets that do not yet make up one of its own
+        groups = [sizes[0]] + [x // y for x, y in zip(sizes[1:], sizes)]
+        share = (memory_budget - memory_budget // 2) // len(sizes)
+        buckets = share // bucket_bytes - max(groups)
+        if flush < 1 or buckets < 1:
+            raise ValueError(f'Error: A memory budget of {memory_budget} bytes is too small for {products} products')
+        return cls(rows - flush, sizes, buckets, directory, flush)
+
+    @property
+    def held(self):
+        # the most cycles held in full
+        return self.recent + self.flush
+
+    def to_dict(self):
+        return {'recent': self.recent, 'sizes': list(self.sizes), 'buckets': self.buckets,
+                'directory': self.directory, 'flush': self.flush}
+
+
+class TieredStore:
+    # the buckets of every size
+    def __init__(self, retention):
+        self.retention = retention
+        self.tiers = [BucketTier(x, retention.buckets) for x in retention.sizes]
+        # the first cycle that has not been put into buckets
+        self.next_cycle = 0
+        self.product_ids = []
+        # the first cycles of the files written to the directory, oldest first
+        self.spilled = []
+        # cycles in buckets that were dropped, with no directory to write them to
+        self.dropped_cycles = 0
+
+    @property
+    def nbytes(self):
+        return sum([x.nbytes for x in self.tiers])
+
+    def add(self, first_cycle, data, product_ids):
+        # cycles that are to go out of the recent ones, oldest first, as {field: [cycle, product column]}
+        # for every field in History STAT_FIELDS, and traded
+        self.product_ids = list(product_ids)
+        buckets = Buckets.from_cycles(first_cycle, data, data['traded'])
+        self.next_cycle = first_cycle + len(buckets)
+        for tier in self.tiers:
+            buckets = tier.add(buckets)
+            if buckets is None:
+                return
+        self.spill(buckets)
+
+    def spill(self, buckets):
+        directory = self.retention.directory
+        if directory is None:
+            self.dropped_cycles += int(buckets.cycles.sum())
+            return
+        os.makedirs(directory, exist_ok=True)
+        first_cycle = int(buckets.first_cycle[0])
+        arrays = {'product_ids': np.array(self.product_ids[:buckets.width], dtype=np.int64)}
+        buckets.save(arrays, 'buckets')
+        with open(spill_path(directory, first_cycle), 'wb') as spill_file:
+            np.savez(spill_file, **arrays)
+        self.spilled.append(first_cycle)
+
+    def load_spilled(self):
+        # the buckets in the directory, with their columns in the order of product_ids
+        lookup = {x: i for i, x in enumerate(self.product_ids)}
+        parts = []
+        for first_cycle in self.spilled:
+            with np.load(spill_path(self.retention.directory, first_cycle)) as data:
+                buckets = Buckets.load(data, 'buckets')
+                columns = [lookup[x] for x in data['product_ids'].tolist()]
+            fields = {}
+            for field, values in buckets.fields.items():
+                fields[field] = np.zeros((len(buckets), len(self.product_ids)))
+                fields[field][:, columns] = values[:, :len(columns)]
+            parts.append(Buckets(buckets.first_cycle, buckets.cycles, fields))
+        return Buckets.join(parts + [Buckets.empty()])
+
+    def tier(self, size):
+        for tier in self.tiers:
+            if tier.size == size:
+                return tier
+        raise ValueError(f'Error: No buckets of {size} cycles, the sizes are {list(self.retention.sizes)}')
+
+    def buckets(self, size=None):
+        # the buckets of one size, with those written to disk if it is the last size
+        # or with no size, every cycle put into buckets, oldest first
+        if size is not None:
+            parts = [self.tier(size).buckets]
+            if size == self.retention.sizes[-1]:
+                parts.insert(0, self.load_spilled())
+            return Buckets.join(parts)
+        parts = [self.load_spilled()]
+        for tier in reversed(self.tiers):
+            parts.extend([tier.buckets, tier.pending])
+        return Buckets.join(parts)
+
+    def save(self, arrays):
+        for index, tier in enumerate(self.tiers):
+            tier.buckets.save(arrays, f'tier{index}')
+            tier.pending.save(arrays, f'tier{index}_pending')
+
+    def load(self, arrays, meta):
+        for name in ['next_cycle', 'product_ids', 'spilled', 'dropped_cycles']:
+            setattr(self, name, meta[name])
+        for index, tier in enumerate(self.tiers):
+            tier.buckets = Buckets.load(arrays, f'tier{index}')
+            tier.pending = Buckets.load(arrays, f'tier{index}_pending')
+
+    def meta(self):
+        return {'next_cycle': self.next_cycle, 'product_ids': self.product_ids, 'spilled': self.spilled,
+                'dropped_cycles': self.dropped_cycles}
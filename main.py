@@ -1,7 +1,7 @@
 from pathlib import Path
 
 from economics.loader import load_economy
-from economics.history import show_average_price_graph
+from economics.reporting import show_average_price_graph
 
 CONFIG_FILE = Path('./examples/basic.json')
 
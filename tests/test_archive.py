@@ -0,0 +1,89 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from economics.archive import HistoryReader, save_history, convert_event_log, downsample
+from economics.eventlog import EventLog
+from economics.history import History
+from economics.loader import load_economy
+
+BASIC_CONFIG = Path('../examples/basic.json')
+
+
+class TestDownsample(unittest.TestCase):
+    def test_short_series_unchanged(self):
+        cycles, values = downsample(np.arange(5.0), 10)
+        self.assertEqual(cycles.tolist(), [0, 1, 2, 3, 4])
+        self.assertEqual(values.tolist(), [0.0, 1.0, 2.0, 3.0, 4.0])
+
+    def test_methods(self):
+        values = np.array([1.0, 3.0, 2.0, 8.0, 5.0])
+        cycles, means = downsample(values, 3, first_cycle=10)
+        self.assertEqual(cycles.tolist(), [10, 12, 14])
+        self.assertEqual(means.tolist(), [2.0, 5.0, 5.0])
+        self.assertEqual(downsample(values, 3, 'max')[1].tolist(), [3.0, 8.0, 5.0])
+        self.assertEqual(downsample(values, 3, 'min')[1].tolist(), [1.0, 2.0, 5.0])
+        self.assertEqual(downsample(values, 3, 'last')[1].tolist(), [3.0, 8.0, 5.0])
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            downsample(np.arange(5.0), 2, 'median')
+        with self.assertRaises(ValueError):
+            downsample(np.arange(5.0), 0)
+
+
+class TestHistoryReader(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.saved = os.path.join(self.directory.name, 'history')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_saved_history(self):
+        economy = load_economy(BASIC_CONFIG)
+        for _ in range(4):
+            economy.single_cycle()
+        save_history(economy, self.saved)
+        reader = HistoryReader(self.saved)
+        self.assertEqual(len(reader), 4)
+        self.assertEqual(reader.product_ids(), economy.history.product_ids())
+        for product_id in reader.product_ids():
+            series = reader.series(product_id, 'average_price')
+            self.assertIsInstance(series.base, np.memmap)
+            self.assertEqual(series.tolist(), economy.history.series(product_id, 'average_price').tolist())
+            self.assertEqual(reader.product_name(product_id), economy.get_product(product_id).name)
+
+    def test_ring_buffer_history(self):
+        economy = load_economy(BASIC_CONFIG, history=History(max_cycles=3))
+        for _ in range(5):
+            economy.single_cycle()
+        save_history(economy, self.saved)
+        reader = HistoryReader(self.saved)
+        self.assertEqual(reader.cycles().tolist(), [2, 3, 4])
+        product_id = reader.product_ids()[0]
+        self.assertEqual(reader.series(product_id, 'volume').tolist(),
+                         economy.history.series(product_id, 'volume').tolist())
+
+    def test_converted_event_log(self):
+        economy = load_economy(BASIC_CONFIG)
+        log_path = os.path.join(self.directory.name, 'run.log')
+        money = []
+        with EventLog(log_path, batch_cycles=2) as log:
+            economy.add_hook(log)
+            for _ in range(5):
+                economy.single_cycle()
+                money.append(economy.producers[1].money)
+        convert_event_log(log_path, self.saved, {x.id: x.name for x in economy.products})
+        reader = HistoryReader(self.saved)
+        self.assertEqual(len(reader), 5)
+        for product_id in economy.history.product_ids():
+            self.assertEqual(reader.series(product_id, 'average_price').tolist(),
+                             economy.history.series(product_id, 'average_price').tolist())
+        producer = economy.producers[1]
+        self.assertEqual(reader.producer_series(producer.id).tolist(), money)
+        self.assertEqual(reader.producer_series(producer.id, producer.product.id)[-1],
+                         producer.stock[producer.product.id])
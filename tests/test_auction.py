@@ -2,7 +2,7 @@ import unittest
 
 from economics.producer import Product, Producer
 from economics.offers import SellOffer, BuyOffer
-from economics.auctions import SingleAuction, create_auctions
+from economics.auctions import SingleAuction, OrderBook, create_auctions, auction
 
 
 class TestSingleAuction(unittest.TestCase):
@@ -10,6 +10,9 @@ class TestSingleAuction(unittest.TestCase):
         self.product = Product('a')
         self.seller = Producer(self.product, 10.0)
         self.buyer = Producer(self.product, 10.0)
+        # results of the auction are stored in the producers cycle history
+        self.seller.init_cycle()
+        self.buyer.init_cycle()
 
     def test_null_auction(self):
         auction = SingleAuction(self.product.id)
@@ -55,6 +58,72 @@ class TestSingleAuction(unittest.TestCase):
         # final price should be 10 + 2 / 2 -> 6
         self.assertEqual(auction.transactions[0].price, 6.0)
 
+    def test_documented_example(self):
+        # the example given in docs/basics.md
+        auction = SingleAuction(self.product.id)
+        for total, price in [(3, 10), (4, 7), (2, 6), (7, 4)]:
+            auction.buys.append(BuyOffer(self.buyer, self.product.id, total, price))
+        for total, price in [(6, 4), (2, 5), (8, 6)]:
+            auction.sells.append(SellOffer(self.seller, self.product.id, total, price))
+        self.seller.stock[self.product.id] = 16.0
+        auction.perform()
+        fills = [(x.quantity, x.price) for x in auction.transactions]
+        self.assertEqual(fills, [(3, 7), (3, 5.5), (1, 6), (1, 5.5), (1, 6)])
+        self.assertEqual(sum([x.quantity for x in auction.transactions]), 9)
+        self.assertEqual(auction.unsold, 7)
+        self.assertEqual(auction.unfilled_orders, 7)
+
+    def test_no_crossing(self):
+        auction = SingleAuction(self.product.id)
+        auction.sells.append(SellOffer(self.seller, self.product.id, 1.0, 5.0))
+        auction.buys.append(BuyOffer(self.buyer, self.product.id, 2.0, 4.0))
+        auction.perform()
+        self.assertEqual(len(auction.transactions), 0)
+        self.assertEqual(auction.unsold, 2.0)
+        self.assertEqual(auction.unfilled_orders, 1.0)
+
+    def test_offers_are_unchanged(self):
+        # the offers are kept in the producers history, so the auction must not change them
+        auction = SingleAuction(self.product.id)
+        sell = SellOffer(self.seller, self.product.id, 3.0, 1.0)
+        buy = BuyOffer(self.buyer, self.product.id, 2.0, 1.0)
+        auction.sells.append(sell)
+        auction.buys.append(buy)
+        self.seller.stock[self.product.id] = 3.0
+        auction.perform()
+        self.assertEqual(sell.total_offered, 3.0)
+        self.assertEqual(buy.total_wanted, 2.0)
+        self.assertEqual(auction.unfilled_orders, 1.0)
+
+    def test_offers_are_slotted(self):
+        sell = SellOffer(self.seller, self.product.id, 1.0, 1.0)
+        with self.assertRaises(AttributeError):
+            sell.extra = 1.0
+
+
+class TestOrderBook(unittest.TestCase):
+    def setUp(self):
+        self.product = Product('a')
+        self.producer = Producer(self.product, 10.0)
+
+    def test_empty_book(self):
+        book = OrderBook()
+        self.assertIsNone(book.best_sell)
+        self.assertIsNone(book.best_buy)
+        self.assertFalse(book.crossed)
+
+    def test_price_priority(self):
+        book = OrderBook()
+        sells = [SellOffer(self.producer, self.product.id, 1.0, x) for x in [3.0, 1.0, 2.0]]
+        buys = [BuyOffer(self.producer, self.product.id, 1.0, x) for x in [1.0, 3.0, 2.0]]
+        book.load(sells, buys)
+        self.assertEqual(book.best_sell.cost_per_unit, 1.0)
+        self.assertEqual(book.best_buy.max_price, 3.0)
+        self.assertEqual(book.fill(), 1.0)
+        self.assertEqual(book.best_sell.cost_per_unit, 2.0)
+        self.assertEqual(book.best_buy.max_price, 2.0)
+        self.assertEqual(book.unsold_volume(), 2.0)
+
 
 class TestCreateAuctions(unittest.TestCase):
     # test a whole auction, with many products
@@ -83,3 +152,19 @@ class TestCreateAuctions(unittest.TestCase):
         buys = [BuyOffer(self.wood_seller, self.iron, 1.0, 1.0)]
         auctions = create_auctions([], buys)
         self.assertTrue(self.iron in auctions)
+
+    def test_reuse_auctions(self):
+        sells = [SellOffer(self.wood_seller, self.wood.id, 1.0, 1.0)]
+        auctions = create_auctions(sells, [])
+        old_auction = auctions[self.wood.id]
+        auctions = create_auctions([], [], auctions)
+        self.assertIs(auctions[self.wood.id], old_auction)
+        self.assertEqual(len(old_auction.sells), 0)
+
+    def test_reused_auction_without_orders_is_skipped(self):
+        sells = [SellOffer(self.wood_seller, self.wood.id, 1.0, 1.0)]
+        auctions = create_auctions(sells, [])
+        buys = [BuyOffer(self.wood_seller, self.iron.id, 1.0, 1.0)]
+        results = auction([], buys, auctions)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].product_id, self.iron.id)
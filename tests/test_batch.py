@@ -0,0 +1,96 @@
+import copy
+import random
+import unittest
+
+import numpy as np
+
+from benchmarks.scenarios import synthetic_config
+from economics.batch import BatchedEconomy
+from economics.clearing import clear_segments, clear_product, vector_auction
+from economics.history import STAT_FIELDS
+from economics.loader import create_economy
+
+
+def variants(total, producers=30, products=6):
+    # the same products, with different money and stock in every economy
+    base = synthetic_config(producers, products)
+    configs = []
+    for seed in range(total):
+        rng = random.Random(seed)
+        config = copy.deepcopy(base)
+        for producer in config['producers']:
+            producer['money'] = rng.randint(10, 100)
+            producer['stock'] = {x: y * rng.randint(1, 3) for x, y in producer['stock'].items()}
+        configs.append(config)
+    return configs
+
+
+class TestClearSegments(unittest.TestCase):
+    def test_same_as_clear_product(self):
+        rng = np.random.default_rng(3)
+        for _ in range(50):
+            sell_book = rng.integers(0, 4, 20)
+            buy_book = rng.integers(0, 4, 20)
+            sell_price = rng.integers(1, 5, 20).astype(float)
+            buy_price = rng.integers(1, 5, 20).astype(float)
+            sell_quantity = rng.integers(0, 4, 20) * 0.3
+            buy_quantity = rng.integers(0, 4, 20) * 0.7
+            fills = clear_segments(sell_book, sell_price, sell_quantity, buy_book, buy_price, buy_quantity)
+            for position, book in enumerate(fills.segments.tolist()):
+                sells = np.flatnonzero(sell_book == book)
+                buys = np.flatnonzero(buy_book == book)
+                expected = clear_product(sell_price[sells], sell_quantity[sells], buy_price[buys], buy_quantity[buys])
+                in_book = fills.segment == book
+                self.assertEqual(fills.quantity[in_book].tolist(), expected.quantity.tolist())
+                self.assertEqual(fills.price[in_book].tolist(), expected.price.tolist())
+                self.assertEqual(fills.sell_index[in_book].tolist(), sells[expected.sell_index].tolist())
+                self.assertEqual(fills.buy_index[in_book].tolist(), buys[expected.buy_index].tolist())
+                self.assertEqual(fills.unsold[position], expected.unsold)
+                self.assertEqual(fills.unfilled_orders[position], expected.unfilled_orders)
+
+    def test_no_books(self):
+        fills = clear_segments([0], [1.0], [1.0], [1], [1.0], [1.0])
+        self.assertEqual(len(fills), 0)
+        self.assertEqual(len(fills.segments), 0)
+
+
+class TestBatchedEconomy(unittest.TestCase):
+    def test_same_as_separate_economies(self):
+        configs = variants(4)
+        batch = BatchedEconomy.from_configs(configs)
+        economies = [create_economy(x, vectorized=True, engine=vector_auction) for x in configs]
+        for _ in range(6):
+            batch.single_cycle()
+            for economy in economies:
+                economy.single_cycle()
+        for index, economy in enumerate(economies):
+            view = batch.view(index)
+            self.assertEqual(view.money.tolist(), economy.table.money.tolist())
+            self.assertEqual(view.stock.tolist(), economy.table.stock.tolist())
+            history = view.history
+            self.assertEqual(history.total_cycles, 6)
+            # the product ids of a batch are those of the first economy, in the same order
+            columns = [batch.products[economy.table.columns[x]].id for x in economy.history.product_ids()]
+            self.assertEqual(history.product_ids(), columns)
+            for batch_id, product_id in zip(columns, economy.history.product_ids()):
+                for field in STAT_FIELDS:
+                    self.assertEqual(history.series(batch_id, field).tolist(),
+                                     economy.history.series(product_id, field).tolist())
+                self.assertEqual(history.get_last_price(batch_id), economy.history.get_last_price(product_id))
+
+    def test_ring_buffer_history(self):
+        batch = BatchedEconomy.from_configs(variants(2), max_cycles=3)
+        batch.run(5)
+        history = batch.view(1).history
+        self.assertEqual(history.total_cycles, 5)
+        self.assertEqual(len(history.series(history.product_ids()[0], 'volume')), 3)
+
+    def test_different_products(self):
+        configs = [synthetic_config(10, 4), synthetic_config(10, 5)]
+        with self.assertRaises(ValueError):
+            BatchedEconomy.from_configs(configs)
+
+    def test_different_sizes(self):
+        configs = [synthetic_config(10, 4), synthetic_config(12, 4)]
+        with self.assertRaises(ValueError):
+            BatchedEconomy.from_configs(configs)
@@ -0,0 +1,34 @@
+import unittest
+
+from benchmarks.run import PHASES, timed_cycle
+from benchmarks.scenarios import synthetic_config
+from benchmarks.startup import MODULES, time_import
+from economics.auctions import perform_auctions
+from economics.loader import create_economy
+
+
+class TestSyntheticEconomy(unittest.TestCase):
+    def test_config(self):
+        data = synthetic_config(20, 6)
+        self.assertEqual(len(data['producers']), 20)
+        self.assertEqual(len(data['products']), 6)
+
+    def test_deep_chain(self):
+        data = synthetic_config(20, 6, depth=6)
+        self.assertEqual(data['products'][5]['requires'][1], {'product2': 1})
+
+    def test_timed_cycle(self):
+        economy = create_economy(synthetic_config(50, 8))
+        timings = {x: 0.0 for x in PHASES}
+        offers, fills = timed_cycle(economy, perform_auctions, timings)
+        self.assertTrue(offers > 0)
+        self.assertTrue(fills > 0)
+        self.assertEqual(economy.history.total_cycles, 1)
+        self.assertTrue(all([x >= 0.0 for x in timings.values()]))
+
+
+class TestStartup(unittest.TestCase):
+    def test_nothing_deferred_is_imported(self):
+        for module in MODULES:
+            _, loaded = time_import(module)
+            self.assertEqual(loaded, [])
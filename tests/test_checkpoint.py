@@ -0,0 +1,88 @@
+import itertools
+import os
+import tempfile
+import unittest
+
+from economics.economy import Economy
+from economics.history import History, STAT_FIELDS
+from economics.clearing import vector_auction
+from economics.producer import Product, Producer, Workers, HISTORY_MAX_LENGTH
+from test_table import make_world
+
+
+def state(economy):
+    # everything that should be the same after a restore
+    producers = [(x.id, x.money, x.sale_price, sorted(x.stock.items()), x.last_consumption)
+                 for x in economy.producers]
+    history = economy.history
+    series = [history.series(x.id, field).tolist() for x in economy.products for field in STAT_FIELDS]
+    rolling = [(x.moving_average, x.ewma, x.low, x.high, x.volume, x.vwap)
+               for product in history.rolling_stats.products.values() for x in product.values()]
+    sales = [[(y.product_id, y.quantity, y.actual_price) for y in x.cycle_history[-1].auction_sales]
+             for x in economy.producers]
+    return producers, series, rolling, sales
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        handle, self.filepath = tempfile.mkstemp(suffix='.npz')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.filepath)
+
+    def check_restore(self, **options):
+        products, producers = make_world()
+        economy = Economy(products, producers, **options)
+        for _ in range(3):
+            economy.single_cycle()
+        economy.save_checkpoint(self.filepath)
+        restored = Economy.load_checkpoint(self.filepath)
+        self.assertEqual(state(restored), state(economy))
+        for _ in range(4):
+            economy.single_cycle()
+            restored.single_cycle()
+        self.assertEqual(state(restored), state(economy))
+        return restored
+
+    def test_objects(self):
+        restored = self.check_restore()
+        self.assertIsNone(restored.table)
+        self.assertTrue(isinstance(restored.producers[0], Workers))
+
+    def test_vectorized(self):
+        restored = self.check_restore(vectorized=True)
+        self.assertIsNotNone(restored.table)
+
+    def test_vectorized_orders(self):
+        # the table keeps its history as arrays when the engine clears arrays
+        restored = self.check_restore(vectorized=True, engine=vector_auction)
+        self.assertEqual(len(restored.table.cycles), HISTORY_MAX_LENGTH)
+
+    def test_ring_buffer_history(self):
+        restored = self.check_restore(history=History(max_cycles=2, windows=(2, 3)))
+        self.assertEqual(restored.history.total_cycles, 7)
+        self.assertEqual(len(restored.history.cycle_history), 2)
+
+    def test_product_ids_kept(self):
+        products, producers = make_world()
+        economy = Economy(products, producers)
+        economy.single_cycle()
+        economy.save_checkpoint(self.filepath)
+        restored = Economy.load_checkpoint(self.filepath)
+        self.assertEqual([x.id for x in restored.products], [x.id for x in economy.products])
+        self.assertEqual([x.name for x in restored.products], [x.name for x in economy.products])
+
+    def test_new_ids_are_not_reused(self):
+        products, producers = make_world()
+        economy = Economy(products, producers)
+        economy.save_checkpoint(self.filepath)
+        # as in a new process, where the counters start from zero again
+        self.addCleanup(setattr, Product, 'id_iter', Product.id_iter)
+        self.addCleanup(setattr, Producer, 'id_iter', Producer.id_iter)
+        Product.id_iter = itertools.count()
+        Producer.id_iter = itertools.count()
+        restored = Economy.load_checkpoint(self.filepath)
+        product = Product('new')
+        self.assertNotIn(product.id, [x.id for x in restored.products])
+        self.assertNotIn(Producer(product, 10).id, [x.id for x in restored.producers])
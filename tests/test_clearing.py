@@ -0,0 +1,170 @@
+import random
+import unittest
+from pathlib import Path
+
+from economics.producer import Product, Producer
+from economics.offers import SellOffer, BuyOffer
+from economics.auctions import SingleAuction, auction
+from economics.clearing import clear_product, vector_auction, ParallelAuction
+from economics.loader import load_economy
+
+BASIC_CONFIG = Path('../examples/basic.json')
+
+
+def random_offers(rng, product, producers, total_sells, total_buys, step=1.0):
+    # few prices give plenty of ties; a fractional step gives running totals with rounding errors
+    sells = []
+    buys = []
+    for _ in range(total_sells):
+        seller = rng.choice(producers)
+        sells.append(SellOffer(seller, product.id, rng.randint(0, 5) * step, rng.choice([1.0, 1.5, 2.0, 2.5, 3.0])))
+    for _ in range(total_buys):
+        buyer = rng.choice(producers)
+        buys.append(BuyOffer(buyer, product.id, rng.randint(0, 5) * step, rng.choice([1.0, 1.5, 2.0, 2.5, 3.0])))
+    return sells, buys
+
+
+def make_producers(product, total):
+    producers = [Producer(product, 100.0) for _ in range(total)]
+    for producer in producers:
+        producer.init_cycle()
+        producer.stock[product.id] = 1000.0
+    return producers
+
+
+class TestClearProduct(unittest.TestCase):
+    def test_no_buys(self):
+        fills = clear_product([1.0], [1.0], [], [])
+        self.assertEqual(len(fills), 0)
+        self.assertEqual(fills.unsold, 0)
+
+    def test_documented_example(self):
+        fills = clear_product([4, 5, 6], [6, 2, 8], [10, 7, 6, 4], [3, 4, 2, 7])
+        self.assertEqual(fills.quantity.tolist(), [3, 3, 1, 1, 1])
+        self.assertEqual(fills.price.tolist(), [7, 5.5, 6, 5.5, 6])
+        self.assertEqual(fills.sell_index.tolist(), [0, 0, 1, 1, 2])
+        self.assertEqual(fills.buy_index.tolist(), [0, 1, 1, 2, 2])
+        self.assertEqual(fills.unsold, 7)
+        self.assertEqual(fills.unfilled_orders, 7)
+
+    def test_no_crossing(self):
+        fills = clear_product([5.0], [1.0], [4.0], [2.0])
+        self.assertEqual(len(fills), 0)
+        self.assertEqual(fills.unsold, 2.0)
+        self.assertEqual(fills.unfilled_orders, 1.0)
+
+
+class TestMatchesSingleAuction(unittest.TestCase):
+    # the vectorized engine must give the same fills as the order book
+    def check_random_books(self, books, step):
+        rng = random.Random(42)
+        product = Product('a')
+        producers = make_producers(product, 6)
+        for _ in range(books):
+            sells, buys = random_offers(rng, product, producers, rng.randint(1, 20), rng.randint(1, 20), step)
+            fills = clear_product([x.cost_per_unit for x in sells], [x.total_offered for x in sells],
+                                  [x.max_price for x in buys], [x.total_wanted for x in buys])
+            single_auction = SingleAuction(product.id)
+            single_auction.sells = [x.copy() for x in sells]
+            single_auction.buys = [x.copy() for x in buys]
+            single_auction.perform()
+            expected = [(x.quantity, x.price) for x in single_auction.transactions]
+            self.assertEqual(list(zip(fills.quantity.tolist(), fills.price.tolist())), expected)
+            self.assertEqual(fills.unsold, single_auction.unsold)
+            self.assertEqual(fills.unfilled_orders, single_auction.unfilled_orders)
+
+    def test_random_books(self):
+        self.check_random_books(200, 1.0)
+
+    def test_fractional_books(self):
+        # both engines fill to the next running total, so even the tiny fills left by rounding are the same
+        self.check_random_books(1000, 0.1)
+
+    def test_random_producer_deltas(self):
+        rng = random.Random(7)
+        product = Product('a')
+        python_producers = make_producers(product, 5)
+        vector_producers = make_producers(product, 5)
+        for _ in range(50):
+            sells, buys = random_offers(rng, product, list(range(5)), rng.randint(1, 10), rng.randint(1, 10))
+            auction([SellOffer(python_producers[x.seller], x.product_id, x.total_offered, x.cost_per_unit)
+                     for x in sells],
+                    [BuyOffer(python_producers[x.buyer], x.product_id, x.total_wanted, x.max_price) for x in buys])
+            vector_auction([SellOffer(vector_producers[x.seller], x.product_id, x.total_offered, x.cost_per_unit)
+                            for x in sells],
+                           [BuyOffer(vector_producers[x.buyer], x.product_id, x.total_wanted, x.max_price)
+                            for x in buys])
+        for python_producer, vector_producer in zip(python_producers, vector_producers):
+            self.assertAlmostEqual(python_producer.money, vector_producer.money)
+            self.assertEqual(python_producer.stock, vector_producer.stock)
+            self.assertEqual(len(python_producer.cycle_history[-1].auction_sales),
+                             len(vector_producer.cycle_history[-1].auction_sales))
+
+    def test_transactions(self):
+        rng = random.Random(5)
+        product = Product('a')
+        sells, buys = random_offers(rng, product, make_producers(product, 4), 10, 10)
+        python_auctions = auction([x.copy() for x in sells], [x.copy() for x in buys])
+        vector_auctions = vector_auction([x.copy() for x in sells], [x.copy() for x in buys])
+        expected = [(x.product_id, x.quantity, x.price) for x in python_auctions[0].transactions]
+        self.assertEqual([(x.product_id, x.quantity, x.price) for x in vector_auctions[0].transactions], expected)
+        self.assertEqual([x.tolist() for x in vector_auctions[0].fill_arrays()],
+                         [x.tolist() for x in python_auctions[0].fill_arrays()])
+
+
+class TestVectorEconomy(unittest.TestCase):
+    def test_same_as_python_engine(self):
+        python_economy = load_economy(BASIC_CONFIG)
+        vector_economy = load_economy(BASIC_CONFIG, engine=vector_auction)
+        for _ in range(5):
+            python_economy.single_cycle()
+            vector_economy.single_cycle()
+        for python_producer, vector_producer in zip(python_economy.producers, vector_economy.producers):
+            self.assertAlmostEqual(python_producer.money, vector_producer.money)
+            self.assertEqual(list(python_producer.stock.values()), list(vector_producer.stock.values()))
+
+
+class TestParallelAuction(unittest.TestCase):
+    def run_auctions(self, engine, seed):
+        rng = random.Random(seed)
+        products = [Product(str(x)) for x in range(6)]
+        producers = make_producers(products[0], 8)
+        for producer in producers:
+            for product in products:
+                producer.stock[product.id] = 1000.0
+        all_auctions = []
+        for _ in range(5):
+            sells = []
+            buys = []
+            for product in products:
+                product_sells, product_buys = random_offers(rng, product, producers, 10, 10)
+                sells.extend(product_sells)
+                buys.extend(product_buys)
+            all_auctions.append(engine(sells, buys))
+        return producers, all_auctions
+
+    def test_same_as_serial(self):
+        serial_producers, serial_auctions = self.run_auctions(vector_auction, 3)
+        with ParallelAuction(max_workers=2, threshold=0) as engine:
+            parallel_producers, parallel_auctions = self.run_auctions(engine, 3)
+            self.assertIsNotNone(engine.executor)
+        for serial, parallel in zip(serial_producers, parallel_producers):
+            self.assertEqual(serial.money, parallel.money)
+            self.assertEqual(list(serial.stock.values()), list(parallel.stock.values()))
+        for serial, parallel in zip(serial_auctions, parallel_auctions):
+            self.assertEqual([len(x.transactions) for x in serial], [len(x.transactions) for x in parallel])
+
+    def test_small_markets_stay_serial(self):
+        engine = ParallelAuction(max_workers=2)
+        self.run_auctions(engine, 3)
+        self.assertIsNone(engine.executor)
+        engine.close()
+
+    def test_economy_closes_the_engine(self):
+        engine = ParallelAuction(max_workers=2, threshold=0)
+        with load_economy(BASIC_CONFIG, vectorized=True, engine=engine) as economy:
+            economy.run(2)
+            self.assertIsNotNone(engine.executor)
+        self.assertIsNone(engine.executor)
+        # closing an economy whose engine is a function does nothing
+        load_economy(BASIC_CONFIG).close()
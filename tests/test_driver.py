@@ -0,0 +1,75 @@
+import asyncio
+import unittest
+from pathlib import Path
+
+from economics.driver import AsyncDriver, take_snapshot
+from economics.loader import load_economy
+
+BASIC_CONFIG = Path('../examples/basic.json')
+
+
+class TestSnapshot(unittest.TestCase):
+    def test_matches_history(self):
+        economy = load_economy(BASIC_CONFIG)
+        economy.single_cycle()
+        snapshot = take_snapshot(economy)
+        self.assertEqual(snapshot.cycle, 1)
+        for product_id in economy.history.product_ids():
+            self.assertEqual(snapshot.price(product_id), economy.history.get_last_price(product_id))
+        self.assertEqual(snapshot.money.tolist(), [x.money for x in economy.producers])
+
+    def test_is_immutable(self):
+        snapshot = take_snapshot(load_economy(BASIC_CONFIG))
+        with self.assertRaises(ValueError):
+            snapshot.money[0] = 1.0
+        with self.assertRaises(TypeError):
+            snapshot.prices[0] = 1.0
+
+
+class TestAsyncDriver(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.economy = load_economy(BASIC_CONFIG)
+        self.driver = AsyncDriver(self.economy)
+
+    async def asyncTearDown(self):
+        self.driver.close()
+
+    async def test_subscriber_gets_every_cycle(self):
+        subscription = self.driver.subscribe(wait=True)
+        self.driver.start(cycles=5)
+        cycles = [x.cycle async for x in subscription]
+        self.assertEqual(cycles, [1, 2, 3, 4, 5])
+        self.assertEqual(self.driver.latest.cycle, 5)
+
+    async def test_slow_subscriber_drops_oldest(self):
+        subscription = self.driver.subscribe(max_queue=2)
+        await self.driver.run(cycles=5)
+        cycles = [x.cycle async for x in subscription]
+        self.assertEqual(cycles, [4, 5])
+        self.assertEqual(subscription.dropped, 3)
+
+    async def test_stop(self):
+        self.driver.interval = 0.01
+        subscription = self.driver.subscribe()
+        self.driver.start()
+        first = await subscription.__anext__()
+        await self.driver.stop()
+        # the subscription ends, and no cycle is left half done
+        remaining = [x async for x in subscription]
+        self.assertEqual(first.cycle, 1)
+        self.assertEqual(self.driver.latest.cycle, self.economy.history.total_cycles)
+        self.assertTrue(all([x.cycle > 1 for x in remaining]))
+
+    async def test_loop_is_not_blocked(self):
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        task = asyncio.get_running_loop().create_task(ticker())
+        await self.driver.run(cycles=3)
+        task.cancel()
+        self.assertTrue(ticks > 0)
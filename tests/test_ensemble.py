@@ -0,0 +1,81 @@
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+from economics.ensemble import Ensemble, set_parameter, randomize_parameter, main, run_economy
+from economics.errors import EconomyLoadError
+from economics.loader import create_economy, load_data_from_file
+
+BASIC_CONFIG = Path('../examples/basic.json')
+
+
+class TestParameters(unittest.TestCase):
+    def setUp(self):
+        self.data = load_data_from_file(BASIC_CONFIG)
+
+    def test_set_workers(self):
+        set_parameter(self.data, 'workers.total', 12)
+        self.assertEqual(self.data['workers']['total'], 12)
+
+    def test_set_requirement(self):
+        set_parameter(self.data, 'products.food.requires.labor', 5)
+        self.assertEqual(self.data['products'][1]['requires'][0]['labor'], 5)
+
+    def test_set_all_producers(self):
+        set_parameter(self.data, 'producers.*.stock.labor', 3)
+        self.assertEqual(self.data['producers'][0]['stock']['labor'], 3)
+
+    def test_missing_parameter(self):
+        with self.assertRaises(EconomyLoadError):
+            set_parameter(self.data, 'products.wood.requires.labor', 5)
+
+    def test_randomize(self):
+        rng = np.random.default_rng(1)
+        randomize_parameter(self.data, 'producers.0.money', {'scale': [2, 3]}, rng)
+        self.assertTrue(20 <= self.data['producers'][0]['money'] <= 30)
+
+
+class TestEnsemble(unittest.TestCase):
+    def setUp(self):
+        self.spec = {'runs': 3, 'cycles': 4, 'seed': 5,
+                     'sweep': {'workers.total': [10, 12]},
+                     'randomize': {'producers.*.money': {'uniform': [5, 15]}}}
+
+    def test_configurations(self):
+        runs = Ensemble(load_data_from_file(BASIC_CONFIG), self.spec).configurations()
+        self.assertEqual(len(runs), 6)
+        self.assertEqual(runs[4].data['workers']['total'], 12)
+        # every run has its own seed, but the same spec gives the same runs
+        again = Ensemble(load_data_from_file(BASIC_CONFIG), self.spec).configurations()
+        self.assertEqual([x.data for x in runs], [x.data for x in again])
+        self.assertNotEqual(runs[0].data, runs[1].data)
+
+    def test_run_seeds(self):
+        ensemble = Ensemble(load_data_from_file(BASIC_CONFIG), self.spec)
+        runs = ensemble.configurations()
+        self.assertEqual(len(set([x.seed for x in runs])), len(runs))
+        # a single run can be made again from what it recorded
+        for run in runs:
+            self.assertEqual(ensemble.configure(run.point, run.seed), run.data)
+
+    def test_economy_is_seeded(self):
+        run = Ensemble(load_data_from_file(BASIC_CONFIG), self.spec).configurations()[1]
+        with mock.patch('economics.ensemble.create_economy', wraps=create_economy) as create:
+            run_economy(run.data, 1, run.seed)
+        create.assert_called_once_with(run.data, seed=run.seed)
+
+    def test_run(self):
+        finished = []
+        ensemble = Ensemble(load_data_from_file(BASIC_CONFIG), self.spec)
+        result = ensemble.run(max_workers=2, callback=lambda run, summary: finished.append(run.index))
+        self.assertEqual(sorted(finished), list(range(6)))
+        self.assertEqual(result.names, ['labor', 'food'])
+        bands = result.bands('average_price')
+        self.assertEqual(bands.shape, (3, 4, 2))
+        self.assertTrue(np.all(bands[0] <= bands[2]))
+        self.assertEqual(result.stack('volume', point={'workers.total': 12}).shape, (3, 4, 2))
+
+    def test_cli(self):
+        main([str(BASIC_CONFIG), '--runs', '2', '--cycles', '2', '--workers', '1'])
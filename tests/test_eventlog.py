@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from economics.loader import load_economy
+from economics.eventlog import EventLog, EventLogReader, index_path
+
+BASIC_CONFIG = Path('../examples/basic.json')
+
+
+class TestEventLog(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filepath = os.path.join(self.directory.name, 'run.log')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_logged(self, cycles=7, **options):
+        economy = load_economy(BASIC_CONFIG, **options)
+        money = []
+        with EventLog(self.filepath, batch_cycles=3) as log:
+            economy.add_hook(log)
+            for _ in range(cycles):
+                economy.single_cycle()
+                money.append([x.money for x in economy.producers])
+        return economy, money
+
+    def test_product_series(self):
+        economy, _ = self.run_logged()
+        reader = EventLogReader(self.filepath)
+        self.assertEqual(len(reader), 7)
+        # 3 + 3 + 1 cycles
+        self.assertEqual(len(reader.index), 3)
+        for product_id in economy.history.product_ids():
+            cycles, prices = reader.product_series(product_id, 'average_price')
+            expected = economy.history.series(product_id, 'average_price')
+            self.assertEqual(prices.tolist(), expected[cycles].tolist())
+
+    def test_transactions(self):
+        economy, _ = self.run_logged()
+        reader = EventLogReader(self.filepath)
+        fills = reader.transactions(start=6)
+        last = [(x.product_id, y.quantity, y.price) for x in economy.auctions.values() for y in x.transactions]
+        logged = list(zip(fills['product'].tolist(), fills['quantity'].tolist(), fills['price'].tolist()))
+        self.assertEqual(sorted(logged), sorted(last))
+        self.assertTrue(np.all(fills['cycle'] == 6))
+
+    def test_staged_transactions(self):
+        # the fills of every level of a staged cycle are logged
+        economy, _ = self.run_logged(staged=True)
+        fills = EventLogReader(self.filepath).transactions(start=6)
+        last = [(x.product_id, y.quantity, y.price) for level in economy.level_auctions.values()
+                for x in level.values() for y in x.transactions]
+        logged = list(zip(fills['product'].tolist(), fills['quantity'].tolist(), fills['price'].tolist()))
+        self.assertEqual(sorted(logged), sorted(last))
+        self.assertEqual(len(economy.level_auctions), 2)
+
+    def test_producer_series(self):
+        for vectorized in [False, True]:
+            economy, money = self.run_logged(vectorized=vectorized)
+            reader = EventLogReader(self.filepath)
+            producer = economy.producers[0]
+            cycles, values = reader.producer_series(producer.id, start=2, stop=5)
+            self.assertEqual(cycles.tolist(), [2, 3, 4])
+            self.assertEqual(values.tolist(), [x[0] for x in money[2:5]])
+            _, stock = reader.producer_series(producer.id, producer.product.id)
+            self.assertEqual(stock[-1], producer.stock[producer.product.id])
+            with self.assertRaises(ValueError):
+                reader.producer_series(producer.id, -1)
+
+    def test_without_index(self):
+        self.run_logged()
+        os.remove(index_path(self.filepath))
+        reader = EventLogReader(self.filepath)
+        self.assertEqual(reader.cycles().tolist(), list(range(7)))
@@ -0,0 +1,149 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from economics.economy import Economy
+from economics.fastforward import SteadyStateDetector, FastForwardReport
+from economics.heuristics import PricingEngine, keep_price
+from economics.history import ColumnStore, ProductCycleStats, RepeatInfo
+from economics.loader import load_economy
+
+BASIC_CONFIG = Path('../examples/basic.json')
+
+
+def stats(price):
+    return {1: ProductCycleStats(price, price, price, 1.0, 0.0, 0.0)}
+
+
+class RandomPricing(PricingEngine):
+    # keeps prices, but draws a number every cycle
+    def __init__(self, economy):
+        super().__init__(keep_price)
+        self.economy = economy
+
+    def __call__(self, state):
+        self.economy.rng.random()
+        return super().__call__(state)
+
+
+class TestRepeats(unittest.TestCase):
+    def test_series_and_last(self):
+        store = ColumnStore()
+        for price in [1.0, 2.0, 3.0, 4.0]:
+            store.append(stats(price))
+        store.repeat(2, 4)
+        store.append(stats(9.0))
+        self.assertEqual(store.total_cycles, 9)
+        self.assertEqual(store.series(1, 'average_price').tolist(), [1, 2, 3, 4, 3, 4, 3, 4, 9])
+        self.assertEqual(store.series(1, 'average_price', last=3).tolist(), [3, 4, 9])
+        self.assertEqual([store.row(x) for x in range(9)], store.rows(0, 9).tolist())
+        self.assertEqual(store.last(1, 'average_price'), 9.0)
+
+    def test_two_repeats(self):
+        store = ColumnStore()
+        for price in [1.0, 2.0]:
+            store.append(stats(price))
+        store.repeat(1, 3)
+        store.append(stats(5.0))
+        store.repeat(2, 2)
+        expected = [1, 2, 2, 2, 2, 5, 2, 5]
+        self.assertEqual(store.series(1, 'average_price').tolist(), expected)
+        self.assertEqual([store.data['average_price'][store.row(x), 0] for x in range(8)], expected)
+
+    def test_ring_buffer(self):
+        store = ColumnStore(max_cycles=4)
+        for price in [1.0, 2.0, 3.0]:
+            store.append(stats(price))
+        store.repeat(2, 6)
+        self.assertEqual(store.total_cycles, 9)
+        self.assertEqual(store.series(1, 'average_price').tolist(), [2, 3, 2, 3])
+        self.assertEqual(store.repeats, [])
+
+
+class TestDetector(unittest.TestCase):
+    def test_period_two(self):
+        detector = SteadyStateDetector(max_period=3, repeats=2)
+        for cycle in range(12):
+            detector.driving.append(np.array([cycle % 2]))
+            detector.accumulated.append(np.array([cycle * 3.0]))
+            detector.rng_states.append(None)
+        self.assertEqual(detector.period(), 2)
+        self.assertEqual(detector.drift(2).tolist(), [6.0])
+
+    def test_changing_drift(self):
+        detector = SteadyStateDetector(repeats=2)
+        for cycle in range(12):
+            detector.driving.append(np.array([1.0]))
+            detector.accumulated.append(np.array([cycle * cycle]))
+            detector.rng_states.append(None)
+        self.assertIsNone(detector.period())
+
+
+class TestFastForward(unittest.TestCase):
+    def compare(self, cycles=2000, **options):
+        skipped = load_economy(BASIC_CONFIG, **options)
+        full = load_economy(BASIC_CONFIG, **options)
+        report = skipped.run(cycles, fast_forward=True)
+        full.run(cycles)
+        return report, skipped, full
+
+    def test_skips_the_steady_state(self):
+        for options in [{}, {'vectorized': True}]:
+            report, skipped, full = self.compare(**options)
+            self.assertGreater(report.skipped, 1000)
+            self.assertEqual(report.cycles, 2000)
+            self.assertEqual(report.period, 1)
+            self.assertEqual(skipped.history.total_cycles, 2000)
+            np.testing.assert_allclose([x.money for x in skipped.producers], [x.money for x in full.producers],
+                                       rtol=1e-6)
+            for first, second in zip(skipped.producers, full.producers):
+                self.assertEqual(list(first.stock.values()), list(second.stock.values()))
+            food = skipped.products[1].id
+            np.testing.assert_allclose(skipped.history.series(food, 'average_price'),
+                                       full.history.series(full.products[1].id, 'average_price'))
+            self.assertAlmostEqual(skipped.history.get_last_price(food), full.history.get_last_price(
+                full.products[1].id))
+
+    def test_history_has_a_repeat_entry(self):
+        report, skipped, _ = self.compare(1000)
+        entry = skipped.history.cycle_history[-1]
+        self.assertTrue(isinstance(entry, RepeatInfo))
+        self.assertEqual((entry.first_cycle, entry.cycles), (report.first_skipped, report.skipped))
+        self.assertEqual(len(skipped.history.cycle_history), report.ran + 1)
+
+    def test_not_settled(self):
+        economy = load_economy(BASIC_CONFIG)
+        report = economy.run(50, fast_forward=True)
+        self.assertEqual((report.ran, report.skipped), (50, 0))
+
+    def test_random_draws_are_never_skipped(self):
+        economy = load_economy(BASIC_CONFIG, seed=1)
+        economy.pricing = RandomPricing(economy)
+        report = economy.run(1000, fast_forward=True)
+        self.assertEqual(report.skipped, 0)
+
+    def test_without_fast_forward(self):
+        report = load_economy(BASIC_CONFIG).run(5)
+        self.assertTrue(isinstance(report, FastForwardReport))
+        self.assertEqual((report.ran, report.skipped), (5, 0))
+
+    def test_checkpoint_keeps_repeats(self):
+        economy = load_economy(BASIC_CONFIG)
+        economy.run(1000, fast_forward=True)
+        handle, filepath = tempfile.mkstemp(suffix='.npz')
+        os.close(handle)
+        try:
+            economy.save_checkpoint(filepath)
+            restored = Economy.load_checkpoint(filepath)
+        finally:
+            os.remove(filepath)
+        food = economy.products[1].id
+        self.assertEqual(restored.history.total_cycles, 1000)
+        self.assertEqual(len(restored.history.cycle_history), len(economy.history.cycle_history))
+        np.testing.assert_array_equal(restored.history.series(food, 'volume'), economy.history.series(food, 'volume'))
+        restored.single_cycle()
+        economy.single_cycle()
+        self.assertEqual([x.money for x in restored.producers], [x.money for x in economy.producers])
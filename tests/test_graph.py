@@ -0,0 +1,148 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from economics.clearing import vector_auction
+from economics.economy import Economy
+from economics.errors import EconomyLoadError
+from economics.graph import build_graph
+from economics.loader import create_economy, load_economy
+from economics.metrics import CycleHook
+from economics.producer import Product
+from economics.requirements import compile_requirements
+
+BASIC_CONFIG = Path('../examples/basic.json')
+
+
+def chain_config():
+    # labor -> grain -> food, with food also using labor
+    return {'workers': {'total': 10, 'money': 10},
+            'products': [{'name': 'labor'}, {'name': 'grain', 'requires': [{'labor': 1}]},
+                         {'name': 'food', 'requires': [{'grain': 2}, {'labor': 1}]}],
+            'producers': [{'product': 'grain', 'money': 10, 'stock': {'labor': 10}},
+                          {'product': 'food', 'money': 10, 'stock': {'grain': 20, 'labor': 10}}]}
+
+
+class PhaseNames(CycleHook):
+    def __init__(self):
+        self.phases = []
+
+    def after_phase(self, economy, phase, result):
+        self.phases.append(phase)
+
+
+class TestProductGraph(unittest.TestCase):
+    def setUp(self):
+        # a diamond: D is made from B and C, which are both made from A
+        self.a = Product('A')
+        self.b = Product('B', required=[self.a.requirement(2)])
+        self.c = Product('C', required=[self.a.requirement(1)])
+        self.d = Product('D', required=[self.b.requirement(1), self.c.requirement(3)])
+        self.graph = build_graph(compile_requirements([self.d, self.c, self.b, self.a]))
+
+    def test_levels(self):
+        self.assertEqual(self.graph.depth, 3)
+        self.assertEqual([self.graph.level_of(x.id) for x in [self.a, self.b, self.c, self.d]], [0, 1, 1, 2])
+        self.assertEqual([x.tolist() for x in self.graph.levels], [[0], [1, 2], [3]])
+
+    def test_closures(self):
+        self.assertEqual(self.graph.upstream_of(self.d.id), [self.a.id, self.b.id, self.c.id])
+        self.assertEqual(self.graph.downstream_of(self.a.id), [self.b.id, self.c.id, self.d.id])
+        self.assertEqual(self.graph.upstream_of(self.a.id), [])
+
+    def test_total_inputs(self):
+        # one D takes one B and three C, and so 2 + 3 of A
+        self.assertEqual(self.graph.total_inputs(self.d.id), {self.a.id: 5.0, self.b.id: 1.0, self.c.id: 3.0})
+        self.assertEqual(self.graph.total_inputs(self.a.id), {})
+
+    def test_cycle(self):
+        a = Product('A')
+        b = Product('B', required=[a.requirement(1)])
+        a.required.append(b.requirement(1))
+        c = Product('C', required=[b.requirement(1)])
+        with self.assertRaises(EconomyLoadError) as error:
+            build_graph(compile_requirements([a, b, c]))
+        self.assertEqual(str(error.exception), 'Error: Products require each other in a cycle: A -> B -> A')
+
+    def test_self_requirement(self):
+        a = Product('A')
+        a.required.append(a.requirement(1))
+        with self.assertRaises(EconomyLoadError):
+            build_graph(compile_requirements([a]))
+
+
+class TestLoadedGraph(unittest.TestCase):
+    def test_built_by_loader(self):
+        economy = load_economy(BASIC_CONFIG)
+        self.assertEqual(economy.graph.depth, 2)
+        self.assertEqual(economy.graph.level_of(economy.producers[1].product.id), 1)
+
+    def test_cycle_is_a_load_error(self):
+        config = chain_config()
+        config['products'][1]['requires'].append({'food': 1})
+        with self.assertRaises(EconomyLoadError):
+            create_economy(config)
+
+
+class TestStagedCycle(unittest.TestCase):
+    def test_inputs_are_used_in_the_same_cycle(self):
+        economy = create_economy(chain_config(), staged=True)
+        grain = economy.products[1].id
+        food_maker = economy.producers[2]
+        economy.single_cycle()
+        economy.single_cycle()
+        # the grain made this cycle was bought and used before the cycle ended
+        self.assertEqual(food_maker.cycle_history[-1].summaries[grain].bought, 10.0)
+        self.assertEqual(food_maker.last_consumption[grain], 10.0)
+        self.assertEqual(food_maker.stock[grain], 0.0)
+
+    def test_not_staged_keeps_inputs_for_the_next_cycle(self):
+        economy = create_economy(chain_config())
+        grain = economy.products[1].id
+        economy.single_cycle()
+        self.assertEqual(economy.producers[2].cycle_history[-1].summaries[grain].bought, 10.0)
+        self.assertEqual(economy.producers[2].stock[grain], 10.0)
+
+    def test_table_and_producers_agree(self):
+        plain = load_economy(BASIC_CONFIG, staged=True)
+        table = load_economy(BASIC_CONFIG, staged=True, vectorized=True)
+        vector = load_economy(BASIC_CONFIG, staged=True, vectorized=True, engine=vector_auction)
+        for _ in range(30):
+            for economy in [plain, table, vector]:
+                economy.single_cycle()
+        self.assertEqual(table.table.money.tolist(), [x.money for x in plain.producers])
+        np.testing.assert_allclose(vector.table.money, [x.money for x in plain.producers])
+        np.testing.assert_allclose(vector.table.sale_price, [x.sale_price for x in plain.producers])
+
+    def test_phases_by_level(self):
+        economy = load_economy(BASIC_CONFIG, staged=True)
+        hook = PhaseNames()
+        economy.add_hook(hook)
+        economy.single_cycle()
+        self.assertEqual(hook.phases, ['update_producers', 'init_cycle', 'get_all_buys', 'produce_0', 'get_sells_0',
+                                       'auction_0', 'produce_1', 'get_sells_1', 'auction_1', 'update_auctions',
+                                       'post_cycle'])
+        self.assertEqual(economy.history.total_cycles, 1)
+
+    def test_checkpoint_stays_staged(self):
+        economy = load_economy(BASIC_CONFIG, staged=True)
+        for _ in range(3):
+            economy.single_cycle()
+        handle, filepath = tempfile.mkstemp(suffix='.npz')
+        os.close(handle)
+        try:
+            economy.save_checkpoint(filepath)
+            restored = Economy.load_checkpoint(filepath)
+        finally:
+            os.remove(filepath)
+        self.assertTrue(restored.staged)
+        self.assertEqual({x: list(y.keys()) for x, y in restored.level_auctions.items()},
+                         {x: list(y.keys()) for x, y in economy.level_auctions.items()})
+        for _ in range(3):
+            restored.single_cycle()
+            economy.single_cycle()
+        self.assertEqual([x.money for x in restored.producers], [x.money for x in economy.producers])
+        self.assertEqual([x.stock for x in restored.producers], [x.stock for x in economy.producers])
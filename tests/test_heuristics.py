@@ -0,0 +1,136 @@
+import copy
+import unittest
+
+import numpy as np
+
+from benchmarks.scenarios import synthetic_config
+from economics.batch import BatchedEconomy
+from economics.clearing import vector_auction
+from economics.heuristics import PricingState, PricingEngine, PRICING_FIELDS, strategy
+from economics.heuristics import keep_price, sell_through, cost_plus, follow_market
+from economics.loader import create_economy
+
+from test_batch import variants
+
+
+def make_state(**values):
+    # three producers, each with a price of 2
+    fields = {'price': [2.0, 2.0, 2.0], 'buy_limit': [1.0, 1.0, 1.0], 'offered': [10.0, 10.0, 0.0],
+              'sold': [10.0, 5.0, 0.0], 'value': [20.0, 10.0, 0.0], 'is_worker': [False, False, False],
+              'market_price': [3.0, 0.0, 1.0], 'market_volume': [10.0, 0.0, 4.0], 'market_unsold': [0.0, 0.0, 0.0],
+              'market_unfilled': [0.0, 0.0, 0.0], 'traded': [True, False, True], 'input_cost': [1.0, 4.0, 0.0],
+              'input_units': [2.0, 4.0, 0.0]}
+    fields.update(values)
+    return PricingState(*[np.array(fields[x]) for x in PRICING_FIELDS])
+
+
+class TestStrategies(unittest.TestCase):
+    def test_keep_price(self):
+        price, buy_limit = keep_price(make_state())
+        self.assertEqual(price.tolist(), [2.0, 2.0, 2.0])
+        self.assertEqual(buy_limit.tolist(), [1.0, 1.0, 1.0])
+
+    def test_sell_through(self):
+        price, _ = sell_through(make_state(), target=0.9, step=0.5)
+        # sold out goes up, half sold goes down, and nothing offered stays the same
+        self.assertEqual(price.tolist(), [3.0, 1.0, 2.0])
+
+    def test_cost_plus(self):
+        price, buy_limit = cost_plus(make_state(), markup=0.5)
+        self.assertEqual(price.tolist(), [1.5, 6.0, 2.0])
+        self.assertEqual(buy_limit.tolist(), [0.75, 1.5, 1.0])
+
+    def test_follow_market(self):
+        price, _ = follow_market(make_state(), weight=0.5)
+        self.assertEqual(price.tolist(), [2.5, 2.0, 1.5])
+
+    def test_price_floor(self):
+        price, _ = sell_through(make_state(price=[0.0, 0.0, 0.0]))
+        self.assertTrue((price > 0).all())
+
+    def test_named(self):
+        price, _ = strategy('sell_through', step=0.5)(make_state())
+        self.assertEqual(price.tolist(), [3.0, 1.0, 2.0])
+        with self.assertRaises(ValueError):
+            strategy('guess')
+
+
+class TestPricingEngine(unittest.TestCase):
+    def test_assignment(self):
+        engine = PricingEngine([keep_price, strategy('follow_market', weight=1.0)], np.array([1, 0, 1]))
+        price, _ = engine(make_state())
+        self.assertEqual(price.tolist(), [3.0, 2.0, 1.0])
+
+    def test_workers_are_not_priced(self):
+        engine = PricingEngine(strategy('follow_market', weight=1.0))
+        price, _ = engine(make_state(is_worker=[True, False, False]))
+        self.assertEqual(price.tolist(), [2.0, 2.0, 1.0])
+
+    def test_assignment_length(self):
+        with self.assertRaises(ValueError):
+            PricingEngine([keep_price], np.zeros(2, dtype=np.int64))(make_state())
+
+
+class TestEconomyPricing(unittest.TestCase):
+    def setUp(self):
+        self.config = synthetic_config(40, 6)
+
+    def run_economy(self, cycles=6, **options):
+        economy = create_economy(copy.deepcopy(self.config), **options)
+        for _ in range(cycles):
+            economy.single_cycle()
+        return economy
+
+    def test_keep_price_is_the_same_as_no_engine(self):
+        plain = self.run_economy()
+        priced = self.run_economy(pricing=PricingEngine(keep_price))
+        self.assertEqual([x.money for x in priced.producers], [x.money for x in plain.producers])
+
+    def test_prices_change(self):
+        economy = self.run_economy(pricing=PricingEngine(strategy('sell_through', step=0.1)))
+        self.assertNotEqual(set([x.sale_price for x in economy.producers[1:]]), {1.0})
+
+    def test_table_and_producers_agree(self):
+        engine = PricingEngine([strategy('sell_through', step=0.1), strategy('cost_plus', markup=0.2),
+                                strategy('follow_market')], np.arange(41) % 3)
+        plain = self.run_economy(pricing=engine)
+        table = self.run_economy(pricing=engine, vectorized=True)
+        np.testing.assert_allclose(table.table.sale_price, [x.sale_price for x in plain.producers])
+        np.testing.assert_allclose(table.table.buy_limit, [x.buy_limit for x in plain.producers])
+        np.testing.assert_allclose(table.table.money, [x.money for x in plain.producers])
+
+    def test_table_sales(self):
+        # the sales of a table are summed from its arrays, without making the rows
+        for engine in [None, vector_auction]:
+            options = {} if engine is None else {'engine': engine}
+            expected = self.run_economy(**options).pricing_state()
+            table = self.run_economy(vectorized=True, **options)
+            state = table.pricing_state()
+            for field in ['offered', 'sold', 'value']:
+                self.assertEqual(getattr(state, field).tolist(), getattr(expected, field).tolist())
+        self.assertEqual(table.table.rows.views, {})
+
+    def test_buy_limit_is_bid(self):
+        economy = create_economy(copy.deepcopy(self.config), vectorized=True)
+        economy.table.buy_limit[:] = 2.5
+        for _ in range(2):
+            economy.single_cycle()
+        prices = [x.max_price for x in economy.get_all_buys() if x.buyer.index > 0]
+        self.assertEqual(set(prices), {2.5})
+
+
+class TestBatchPricing(unittest.TestCase):
+    def test_same_as_separate_economies(self):
+        configs = variants(3)
+        engine = PricingEngine([strategy('sell_through', step=0.1), strategy('cost_plus'),
+                                strategy('follow_market')], np.arange(31) % 3)
+        batch = BatchedEconomy.from_configs(configs, pricing=PricingEngine(engine.strategies, np.arange(93) % 31 % 3))
+        economies = [create_economy(x, vectorized=True, engine=vector_auction, pricing=engine) for x in configs]
+        for _ in range(5):
+            batch.single_cycle()
+            for economy in economies:
+                economy.single_cycle()
+        for index, economy in enumerate(economies):
+            view = batch.view(index)
+            np.testing.assert_allclose(view.sale_price, economy.table.sale_price)
+            np.testing.assert_allclose(view.money, economy.table.money)
@@ -11,12 +11,14 @@ A_ID = PRODUCT_A.id
 B_ID = PRODUCT_B.id
 
 
-def get_auctions(trans):
+def get_auctions(trans, unsold=0, unfilled=0):
     # trans is a list of lists
     all_auctions = []
     for trans_list in trans:
         auction = SingleAuction(trans_list[0].product_id)
         auction.transactions = trans_list
+        auction.unsold = unsold
+        auction.unfilled_orders = unfilled
         all_auctions.append(auction)
     return all_auctions
 
@@ -45,3 +47,61 @@ class TestBaseStats(unittest.TestCase):
         price_range = self.history.get_last_price_range(PRODUCT_A.id)
         self.assertEqual(price_range.max_price, 6)
         self.assertEqual(price_range.min_price, 5)
+
+    def test_last_unsold(self):
+        self.assertEqual(self.history.get_last_unsold(PRODUCT_A.id), 0)
+
+    def test_missing_product(self):
+        self.assertEqual(self.history.get_last_price(-1), -1)
+        self.assertIsNone(self.history.get_last_sales(-1))
+
+    def test_series(self):
+        prices = self.history.series(PRODUCT_B.id, 'average_price')
+        self.assertEqual(prices.tolist(), [5.0, 0.0, 5.0])
+        volumes = self.history.series(PRODUCT_A.id, 'volume', last=2)
+        self.assertEqual(volumes.tolist(), [17.0, 7.0])
+
+    def test_product_ids(self):
+        self.assertEqual(self.history.product_ids(), [A_ID, B_ID])
+
+
+class TestColumnStore(unittest.TestCase):
+    def test_grows(self):
+        history = History()
+        for i in range(100):
+            history.update(get_auctions([[Trans(A_ID, 1, i)]], unsold=i, unfilled=2 * i), [])
+        self.assertEqual(history.total_cycles, 100)
+        self.assertEqual(len(history.series(A_ID, 'average_price')), 100)
+        self.assertEqual(history.series(A_ID, 'max_price', last=3).tolist(), [97, 98, 99])
+        self.assertEqual(history.get_last_unsold(A_ID), 99)
+        self.assertEqual(history.get_last_unfilled(A_ID), 198)
+
+    def test_ring_buffer(self):
+        history = History(max_cycles=4)
+        for i in range(10):
+            history.update(get_auctions([[Trans(A_ID, 1, i)]]), [])
+        self.assertEqual(history.total_cycles, 10)
+        self.assertEqual(len(history.cycle_history), 4)
+        self.assertEqual(history.series(A_ID, 'average_price').tolist(), [6, 7, 8, 9])
+        self.assertEqual(history.series(A_ID, 'average_price', last=2).tolist(), [8, 9])
+        self.assertEqual(history.get_last_price(A_ID), 9)
+
+    def test_cycle_history_from_columns(self):
+        history = History()
+        for i in range(5):
+            history.update(get_auctions([[Trans(A_ID, 1, i)]]), [])
+        history.repeat(2, 6)
+        history.update(get_auctions([[Trans(B_ID, 2, 3)]]), [])
+        entries = history.cycle_history
+        # five cycles, one entry for the six repeated cycles, and the last cycle
+        self.assertEqual(len(entries), 7)
+        self.assertEqual([entries[x].trades[A_ID].average_price for x in range(5)], [0, 1, 2, 3, 4])
+        self.assertEqual((entries[5].first_cycle, entries[5].period, entries[5].cycles), (5, 2, 6))
+        self.assertEqual(entries[-1].trades[B_ID].volume, 2)
+        self.assertEqual(list(entries[-1].trades), [B_ID])
+
+    def test_many_products(self):
+        history = History()
+        products = [Product(str(x)) for x in range(10)]
+        history.update(get_auctions([[Trans(x.id, 1, 2)] for x in products]), [])
+        self.assertEqual([history.get_last_volume(x.id) for x in products], [1] * 10)
@@ -29,3 +29,8 @@ class TestBasicExample(unittest.TestCase):
         food_maker = self.economy.producers[1]
         food_product = food_maker.product
         self.assertTrue(len(food_product.required) > 0)
+
+    def test_requirements_compiled(self):
+        food_maker = self.economy.producers[1]
+        column = self.economy.requirements.columns[food_maker.product.id]
+        self.assertEqual(self.economy.requirements.amounts[column].tolist(), [10.0])
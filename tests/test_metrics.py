@@ -0,0 +1,96 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from economics.loader import load_economy
+from economics.metrics import CycleHook, PhaseMetrics, PHASES, load_metrics
+
+BASIC_CONFIG = Path('../examples/basic.json')
+
+
+class PhaseRecorder(CycleHook):
+    def __init__(self):
+        self.calls = []
+
+    def before_phase(self, economy, phase):
+        self.calls.append(('before', phase))
+
+    def after_phase(self, economy, phase, result):
+        self.calls.append(('after', phase))
+
+
+class TestHooks(unittest.TestCase):
+    def setUp(self):
+        self.economy = load_economy(BASIC_CONFIG)
+
+    def test_all_phases(self):
+        recorder = PhaseRecorder()
+        self.economy.add_hook(recorder)
+        self.economy.single_cycle()
+        self.assertEqual([x[1] for x in recorder.calls if x[0] == 'after'], PHASES)
+
+    def test_remove_hook(self):
+        recorder = PhaseRecorder()
+        self.economy.add_hook(recorder)
+        self.economy.remove_hook(recorder)
+        self.economy.single_cycle()
+        self.assertEqual(recorder.calls, [])
+
+    def test_same_results(self):
+        plain = load_economy(BASIC_CONFIG)
+        self.economy.add_hook(PhaseMetrics())
+        for _ in range(3):
+            plain.single_cycle()
+            self.economy.single_cycle()
+        self.assertEqual([x.money for x in plain.producers], [x.money for x in self.economy.producers])
+
+
+class TestPhaseMetrics(unittest.TestCase):
+    def setUp(self):
+        self.economy = load_economy(BASIC_CONFIG)
+        self.metrics = PhaseMetrics()
+        self.economy.add_hook(self.metrics)
+        for _ in range(3):
+            self.economy.single_cycle()
+
+    def test_cycles_recorded(self):
+        registry = self.metrics.registry
+        self.assertEqual(len(registry.cycles), 3)
+        self.assertEqual(set(registry.cycles[0].phases), set(PHASES))
+        self.assertEqual(registry.cycles[0].counts['buys'], 2)
+        self.assertEqual(registry.cycles[0].counts['transactions'], 2)
+        self.assertEqual(len(registry.cycles[0].auction_sizes), 2)
+
+    def test_summary(self):
+        summary = self.metrics.registry.summary()
+        self.assertEqual(summary['cycles'], 3)
+        self.assertEqual(summary['counts']['sells'], 6)
+
+    def test_export(self):
+        handle, filepath = tempfile.mkstemp(suffix='.jsonl')
+        os.close(handle)
+        try:
+            self.metrics.registry.export(filepath)
+            self.assertEqual(len(self.metrics.registry.cycles), 0)
+            records = load_metrics(filepath)
+            self.assertEqual(len(records), 3)
+            self.assertEqual(records[2]['cycle'], 2)
+        finally:
+            os.remove(filepath)
+
+
+class TestStagedMetrics(unittest.TestCase):
+    def test_levels_are_added_up(self):
+        economy = load_economy(BASIC_CONFIG, staged=True)
+        metrics = PhaseMetrics()
+        economy.add_hook(metrics)
+        economy.single_cycle()
+        cycle = metrics.registry.cycles[0]
+        self.assertTrue(set(PHASES) <= set(cycle.phases))
+        self.assertNotIn('auction_0', cycle.phases)
+        auctions = [x for level in economy.level_auctions.values() for x in level.values()]
+        self.assertEqual(cycle.counts['sells'], 2)
+        self.assertEqual(cycle.counts['auctions'], len(auctions))
+        self.assertEqual(cycle.counts['transactions'], sum([len(x.transactions) for x in auctions]))
+        self.assertEqual(len(cycle.auction_sizes), len(auctions))
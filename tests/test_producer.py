@@ -0,0 +1,48 @@
+import unittest
+
+from economics.producer import Product, Producer, ProducerCycleHistory, SellResult, BuyResult, HISTORY_MAX_LENGTH
+from economics.offers import SellOffer
+
+
+class TestProducerCycleHistory(unittest.TestCase):
+    def setUp(self):
+        self.product = Product('a')
+        self.producer = Producer(self.product, 10.0)
+
+    def test_no_sales(self):
+        info = ProducerCycleHistory().get_sale_info(self.product.id)
+        self.assertEqual(info.offers, 0)
+        self.assertEqual(info.sales, 0)
+        self.assertEqual(info.average, 0.0)
+
+    def test_sale_info(self):
+        history = ProducerCycleHistory()
+        history.add_sell_offer(SellOffer(self.producer, self.product.id, 5.0, 2.0))
+        # only the first offer sets the offered total and price
+        history.add_sell_offer(SellOffer(self.producer, self.product.id, 1.0, 9.0))
+        history.add_sale(SellResult(2.0, 3.0, 1.0, self.product.id))
+        history.add_sale(SellResult(2.0, 6.0, 3.0, self.product.id))
+        info = history.get_sale_info(self.product.id)
+        self.assertEqual(info.offers, 5.0)
+        self.assertEqual(info.sales, 4.0)
+        self.assertEqual(info.set_price, 2.0)
+        self.assertEqual(info.average, 4.5)
+        self.assertEqual(history.summaries[self.product.id].vwap, 5.25)
+        self.assertEqual(len(history.auction_sales), 2)
+
+    def test_purchases(self):
+        history = ProducerCycleHistory()
+        history.add_purchase(BuyResult(4.0, 3.0, 2.0, self.product.id))
+        history.add_purchase(BuyResult(4.0, 2.0, 1.0, self.product.id))
+        summary = history.summaries[self.product.id]
+        self.assertEqual(summary.bought, 3.0)
+        self.assertEqual(summary.purchases, 2)
+        self.assertEqual(summary.spent, 8.0)
+
+    def test_history_is_bounded(self):
+        for _ in range(HISTORY_MAX_LENGTH + 3):
+            self.producer.init_cycle()
+        last = self.producer.cycle_history[-1]
+        self.producer.init_cycle()
+        self.assertEqual(len(self.producer.cycle_history), HISTORY_MAX_LENGTH)
+        self.assertIs(self.producer.cycle_history[-2], last)
@@ -18,3 +18,7 @@ class TestProduct(unittest.TestCase):
         c = Product('C', required=[a.requirement(2), b.requirement(3)])
         stock = {a.id:10, b.id: 6}
         self.assertEqual(c.get_max_production(stock), 2)
+
+    def test_no_requirements_no_production(self):
+        a = Product('A')
+        self.assertEqual(a.get_max_production({a.id: 10}), 0.0)
@@ -0,0 +1,134 @@
+import copy
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from benchmarks.scenarios import synthetic_config
+from economics.clearing import vector_auction
+from economics.economy import Economy
+from economics.heuristics import PricingEngine, keep_price
+from economics.loader import create_economy
+from economics.replay import HashRecorder, Recording, state_hash, find_divergence, bisect_divergence, replay, main
+
+
+class LateDrift(PricingEngine):
+    # agrees with keep_price until a cycle, and then raises every price a little
+    def __init__(self, economy, from_cycle):
+        super().__init__(keep_price)
+        self.economy = economy
+        self.from_cycle = from_cycle
+
+    def __call__(self, state):
+        price, buy_limit = super().__call__(state)
+        if self.economy.history.total_cycles > self.from_cycle:
+            price = price * 1.001
+        return price, buy_limit
+
+
+def drifting(from_cycle):
+    # a build of the engine whose pricing differs from the cycle on
+    def build(filepath):
+        economy = Economy.load_checkpoint(filepath)
+        economy.pricing = LateDrift(economy, from_cycle)
+        return economy
+    return build
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self.config = synthetic_config(20, 5)
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def record(self, economy, cycles=12, name=None, checkpoint_every=None, phases=False):
+        directory = None
+        if name is not None:
+            directory = os.path.join(self.directory.name, name)
+            os.makedirs(directory)
+        recorder = HashRecorder(directory, checkpoint_every, phases)
+        economy.add_hook(recorder)
+        for _ in range(cycles):
+            economy.single_cycle()
+        if directory is not None:
+            recorder.save()
+        return recorder.recording()
+
+    def economy(self, **options):
+        return create_economy(copy.deepcopy(self.config), **options)
+
+    def test_runs_repeat(self):
+        first = self.record(self.economy(seed=1))
+        second = self.record(self.economy(seed=1))
+        self.assertEqual(first.hashes.tolist(), second.hashes.tolist())
+        self.assertEqual(len(set(first.hashes.tolist())), len(first.hashes))
+        self.assertIsNone(find_divergence(first, second))
+
+    def test_seeded_rng(self):
+        self.assertEqual(self.economy(seed=3).rng.random(), self.economy(seed=3).rng.random())
+
+    def test_rng_is_checkpointed(self):
+        economy = self.economy(seed=5)
+        economy.rng.random()
+        filepath = os.path.join(self.directory.name, 'state.npz')
+        economy.save_checkpoint(filepath)
+        self.assertEqual(Economy.load_checkpoint(filepath).rng.random(), economy.rng.random())
+
+    def test_table_and_producers_hash_the_same(self):
+        plain = self.economy()
+        table = self.economy(vectorized=True)
+        self.assertEqual(state_hash(plain), state_hash(table))
+        self.assertEqual(self.record(plain).hashes.tolist(), self.record(table).hashes.tolist())
+
+    def test_engines_differ_in_rounding(self):
+        # vector_auction adds up the money of each producer in another order, so the runs part a little
+        plain = self.record(self.economy())
+        vector = self.record(self.economy(vectorized=True, engine=vector_auction))
+        self.assertIsNotNone(find_divergence(plain, vector))
+
+    def test_phase_of_divergence(self):
+        first = self.record(self.economy(), phases=True)
+        economy = self.economy()
+        economy.pricing = LateDrift(economy, 5)
+        second = self.record(economy, phases=True)
+        divergence = find_divergence(first, second)
+        # the prices are set at the end of the cycle that takes the history past the given cycle
+        self.assertEqual((divergence.cycle, divergence.phase), (5, 'post_cycle'))
+
+    def test_bisect_from_checkpoint(self):
+        first = self.record(self.economy(), name='first', checkpoint_every=4)
+        economy = self.economy()
+        economy.pricing = LateDrift(economy, 6)
+        second = self.record(economy, name='second')
+        first = Recording.load(first.directory)
+        self.assertEqual(first.checkpoints(), [0, 4, 8])
+        divergence = find_divergence(first, Recording.load(second.directory))
+        self.assertEqual((divergence.cycle, divergence.phase, divergence.checkpoint), (6, None, 4))
+        divergence = bisect_divergence(first, second, second_build=drifting(6))
+        self.assertEqual((divergence.cycle, divergence.phase, divergence.checkpoint), (6, 'post_cycle', 4))
+        # replayed without its pricing, the second run does not repeat its recording
+        with self.assertRaises(ValueError):
+            bisect_divergence(first, second)
+
+    def test_checkpoints_need_a_directory(self):
+        with self.assertRaises(ValueError):
+            HashRecorder(checkpoint_every=5)
+
+    def test_replay_keeps_the_engine(self):
+        recording = self.record(self.economy(engine=vector_auction), cycles=20, name='vector', checkpoint_every=10)
+        self.assertEqual(recording.options, {'engine': 'vector', 'staged': False})
+        replayed = replay(os.path.join(recording.directory, 'checkpoint_10.npz'), 10)
+        self.assertEqual(replayed.hashes.tolist(), recording.hashes[10:].tolist())
+
+    def test_command_line(self):
+        first = os.path.join(self.directory.name, 'a')
+        second = os.path.join(self.directory.name, 'b')
+        main(['record', '../examples/basic.json', '--cycles', '6', '--output', first, '--checkpoint-every', '3'])
+        main(['record', '../examples/basic.json', '--cycles', '6', '--output', second, '--vectorized'])
+        self.assertTrue(os.path.exists(os.path.join(first, 'checkpoint_3.npz')))
+        self.assertIsNone(find_divergence(Recording.load(first), Recording.load(second)))
+        np.testing.assert_array_equal(Recording.load(first).hashes, Recording.load(second).hashes)
+        main(['compare', first, second])
@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from economics.loader import load_economy
+from economics.archive import HistoryReader, save_history
+from economics.reporting import show_average_price_graph, show_volume_graph
+
+BASIC_CONFIG = Path('../examples/basic.json')
+
+
+class TestLazyImport(unittest.TestCase):
+    def test_simulation_does_not_import_matplotlib(self):
+        code = 'import sys, economics.loader; print("matplotlib" in sys.modules)'
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                                cwd='..', check=True)
+        self.assertEqual(result.stdout.strip(), 'False')
+
+
+class TestHeadlessGraphs(unittest.TestCase):
+    def setUp(self):
+        self.economy = load_economy(BASIC_CONFIG)
+        for _ in range(3):
+            self.economy.single_cycle()
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_price_graph_to_file(self):
+        filepath = os.path.join(self.directory.name, 'prices.png')
+        show_average_price_graph(self.economy, filepath)
+        self.assertTrue(os.path.getsize(filepath) > 0)
+
+    def test_volume_graph_to_file(self):
+        filepath = os.path.join(self.directory.name, 'volume.png')
+        show_volume_graph(self.economy, filepath)
+        self.assertTrue(os.path.getsize(filepath) > 0)
+
+    def test_graph_from_saved_history(self):
+        directory = os.path.join(self.directory.name, 'history')
+        save_history(self.economy, directory)
+        filepath = os.path.join(self.directory.name, 'saved.png')
+        show_average_price_graph(HistoryReader(directory), filepath, points=2)
+        self.assertTrue(os.path.getsize(filepath) > 0)
@@ -0,0 +1,35 @@
+import unittest
+
+import numpy as np
+
+from economics.producer import Product
+from economics.requirements import compile_requirements
+
+
+class TestRequirementMatrix(unittest.TestCase):
+    def setUp(self):
+        self.a = Product('A')
+        self.b = Product('B')
+        self.c = Product('C', required=[self.a.requirement(2), self.b.requirement(3)])
+        self.matrix = compile_requirements([self.c, self.b, self.a])
+
+    def test_coefficients(self):
+        self.assertEqual(self.matrix.coefficients.tolist(), [[0, 0, 0], [0, 0, 0], [2, 3, 0]])
+        self.assertEqual(self.matrix.width, 2)
+
+    def test_slot(self):
+        self.assertEqual(self.matrix.slot(2, 1), 1)
+        self.assertIsNone(self.matrix.slot(2, 2))
+
+    def test_max_production(self):
+        # the same as Product.get_max_production for every row
+        stock = np.array([[10.0, 6.0, 0.0], [4.0, 9.0, 0.0], [10.0, 6.0, 0.0]])
+        production = self.matrix.max_production(stock, np.array([2, 2, 0]))
+        self.assertEqual(production.tolist(), [2.0, 2.0, 0.0])
+        self.assertEqual(production[0], self.c.get_max_production({self.a.id: 10, self.b.id: 6}))
+
+    def test_consume(self):
+        stock = np.array([[10.0, 6.0, 0.0], [10.0, 6.0, 0.0]])
+        consumed = self.matrix.consume(stock, np.array([2.0, 0.0]), np.array([2, 0]))
+        self.assertEqual(stock.tolist(), [[6.0, 0.0, 0.0], [10.0, 6.0, 0.0]])
+        self.assertEqual(consumed.tolist(), [[4.0, 6.0], [0.0, 0.0]])
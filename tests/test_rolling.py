@@ -0,0 +1,84 @@
+import math
+import unittest
+
+from economics.history import History
+from economics.offers import Transaction as Trans
+from economics.producer import Product
+from economics.rolling import RollingWindow
+from test_history import get_auctions
+
+A_ID = Product('A').id
+B_ID = Product('B').id
+
+
+class TestRollingWindow(unittest.TestCase):
+    def setUp(self):
+        self.window = RollingWindow(3)
+        for cycle, price in enumerate([4.0, 2.0, 6.0, 3.0, 5.0]):
+            self.window.add(cycle, price, price - 1, price + 1, 2.0)
+
+    def test_moving_average(self):
+        self.assertAlmostEqual(self.window.moving_average, 14.0 / 3)
+
+    def test_low_high(self):
+        self.assertEqual(self.window.low, 2.0)
+        self.assertEqual(self.window.high, 7.0)
+
+    def test_volume(self):
+        self.assertAlmostEqual(self.window.volume, 6.0)
+        self.assertAlmostEqual(self.window.vwap, 14.0 / 3)
+
+    def test_ewma(self):
+        expected = 4.0
+        for price in [2.0, 6.0, 3.0, 5.0]:
+            expected += 0.5 * (price - expected)
+        self.assertAlmostEqual(self.window.ewma, expected)
+
+    def test_empty_cycles_expire(self):
+        for cycle in range(5, 8):
+            self.window.add(cycle)
+        self.assertIsNone(self.window.moving_average)
+        self.assertIsNone(self.window.low)
+        self.assertIsNone(self.window.vwap)
+        self.assertEqual(self.window.volume, 0.0)
+
+    def test_volatility(self):
+        prices = [4.0, 2.0, 6.0, 3.0, 5.0][-3:]
+        mean = sum(prices) / 3
+        self.assertAlmostEqual(self.window.volatility, math.sqrt(sum([(x - mean) ** 2 for x in prices]) / 3))
+
+    def test_no_drift(self):
+        # large prices that move by little lose everything to rounding in a sum of squares
+        window = RollingWindow(10)
+        prices = [1e8 + (x * 7919 % 13) * 1e-3 for x in range(20000)]
+        for cycle, price in enumerate(prices):
+            window.add(cycle, price, price, price, 1e-3 * price)
+        last = prices[-10:]
+        mean = math.fsum(last) / 10
+        self.assertAlmostEqual(window.moving_average, mean, delta=1e-6)
+        self.assertAlmostEqual(window.volatility, math.sqrt(math.fsum([(x - mean) ** 2 for x in last]) / 10),
+                               delta=1e-6)
+        self.assertAlmostEqual(window.volume, math.fsum([1e-3 * x for x in last]), delta=1e-6)
+
+
+class TestHistoryRolling(unittest.TestCase):
+    def setUp(self):
+        self.history = History(windows=(2, 5))
+        self.history.update(get_auctions([[Trans(A_ID, 5, 6), Trans(A_ID, 3, 8)], [Trans(B_ID, 2, 5)]]), [])
+        self.history.update(get_auctions([[Trans(A_ID, 8, 7), Trans(A_ID, 9, 6)]]), [])
+        self.history.update(get_auctions([[Trans(A_ID, 3, 5), Trans(A_ID, 4, 6)]]), [])
+
+    def test_windows(self):
+        short = self.history.rolling(A_ID, 2)
+        longer = self.history.rolling(A_ID, 5)
+        self.assertAlmostEqual(short.volume, 24.0)
+        self.assertAlmostEqual(longer.volume, 32.0)
+        self.assertEqual(short.high, 7.0)
+        self.assertEqual(longer.high, 8.0)
+
+    def test_untraded_product(self):
+        self.assertIsNone(self.history.rolling(B_ID, 2).moving_average)
+        self.assertEqual(self.history.rolling(B_ID, 5).moving_average, 5.0)
+
+    def test_unknown_product(self):
+        self.assertIsNone(self.history.rolling(-1, 2))
@@ -0,0 +1,50 @@
+import unittest
+
+import numpy as np
+
+from benchmarks.scenarios import synthetic_config
+from economics.batch import BatchedEconomy
+from economics.clearing import vector_auction
+from economics.history import STAT_FIELDS
+from economics.loader import create_economy
+from economics.shards import ShardedEconomy, SharedArrays
+
+
+class TestSharedArrays(unittest.TestCase):
+    def test_attach(self):
+        shared = SharedArrays.create({'money': np.arange(4.0), 'empty': np.zeros(0)})
+        other = SharedArrays.attach(shared.layout)
+        other.arrays['money'][1] = 10.0
+        self.assertEqual(shared.arrays['money'].tolist(), [0.0, 10.0, 2.0, 3.0])
+        other.close()
+        shared.close()
+        shared.unlink()
+
+
+class TestShardedEconomy(unittest.TestCase):
+    def test_same_as_single_process(self):
+        config = synthetic_config(40, 6, seed=2)
+        economy = create_economy(config, vectorized=True, engine=vector_auction)
+        with ShardedEconomy.from_configs([config], shards=3) as sharded:
+            self.assertEqual(len(sharded.starts), 3)
+            for _ in range(5):
+                economy.single_cycle()
+                sharded.single_cycle()
+            view = sharded.view(0)
+            self.assertEqual(view.money.tolist(), economy.table.money.tolist())
+            self.assertEqual(view.stock.tolist(), economy.table.stock.tolist())
+            history = view.history
+            for batch_id, product_id in zip(history.product_ids(), economy.history.product_ids()):
+                for field in STAT_FIELDS:
+                    self.assertEqual(history.series(batch_id, field).tolist(),
+                                     economy.history.series(product_id, field).tolist())
+
+    def test_same_as_batch(self):
+        configs = [synthetic_config(20, 5, seed=4) for _ in range(3)]
+        batch = BatchedEconomy.from_configs(configs)
+        with ShardedEconomy.from_configs(configs, shards=2) as sharded:
+            batch.run(4)
+            sharded.run(4)
+        # the table is kept after the shared memory is freed
+        self.assertEqual(sharded.table.money.tolist(), batch.table.money.tolist())
+        self.assertEqual(sharded.table.stock.tolist(), batch.table.stock.tolist())
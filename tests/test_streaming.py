@@ -0,0 +1,203 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from economics.clearing import vector_auction
+from economics.errors import EconomyLoadError
+from economics.loader import load_data_from_file, create_economy
+from economics.producer import Workers
+from economics.streaming import JsonStream, stream_economy, save_scenario, load_scenario
+from economics.table import TABLE_ARRAYS
+
+BASIC_CONFIG = Path('../examples/basic.json')
+
+
+def large_config(total):
+    # a bread economy with many producers of each product
+    config = {'workers': {'total': 100, 'money': 100},
+              'products': [{'name': 'labor'},
+                           {'name': 'food', 'requires': [{'labor': 1}, {'wheat': 2}]},
+                           {'name': 'wheat', 'requires': [{'labor': 0.5}]}],
+              'producers': []}
+    for index in range(total):
+        product = ['food', 'wheat'][index % 2]
+        config['producers'].append({'product': product, 'money': 10 + index,
+                                    'stock': {'labor': index % 7, 'wheat': 3.5, 'food': 1}})
+    return config
+
+
+class TestJsonStream(unittest.TestCase):
+    def test_reads_values_across_reads(self):
+        text = '{"a": [1, 22, 333, {"b": "c"}], "d": 4.5}'
+        stream = JsonStream(io.StringIO(text), read_size=2)
+        found = {}
+        for key, location in stream.members():
+            if key == 'a':
+                found[key] = [x for x, _ in stream.elements()]
+            else:
+                found[key] = stream.value()[0]
+        self.assertEqual(found, json.loads(text))
+
+    def test_locations(self):
+        stream = JsonStream(io.StringIO('[1,\n  2,\n    3]'), read_size=3)
+        self.assertEqual([x for _, x in stream.elements()], [(1, 2), (2, 3), (3, 5)])
+
+    def test_chunks(self):
+        # small reads split the values between chunks, and numbers across reads
+        text = '[' + ', '.join([str(x * 1001) for x in range(200)]) + ', {"a": [1, 2]}]'
+        for read_size in [1, 7, 64, 1 << 16]:
+            stream = JsonStream(io.StringIO(text), read_size=read_size)
+            chunks = list(stream.chunks())
+            self.assertEqual([x for values, _ in chunks for x in values], json.loads(text))
+        self.assertEqual(len(chunks), 1)
+
+    def test_syntax_error_location(self):
+        stream = JsonStream(io.StringIO('[1,\n  2,\n  x]'))
+        with self.assertRaisesRegex(EconomyLoadError, 'line 3, column 3'):
+            list(stream.elements())
+
+
+class TestStreamEconomy(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filepath = os.path.join(self.directory.name, 'config.json')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, config, indent=None):
+        with open(self.filepath, 'w') as config_file:
+            json.dump(config, config_file, indent=indent)
+
+    def assert_same(self, first, second):
+        for name in TABLE_ARRAYS:
+            if name != 'ids':
+                np.testing.assert_array_equal(getattr(first.table, name), getattr(second.table, name))
+        self.assertEqual([x.name for x in first.products], [x.name for x in second.products])
+
+    def test_same_as_create_economy(self):
+        config = large_config(301)
+        self.write(config)
+        streamed = stream_economy(self.filepath, engine=vector_auction)
+        loaded = create_economy(config, vectorized=True, engine=vector_auction)
+        self.assert_same(streamed, loaded)
+        for _ in range(5):
+            streamed.single_cycle()
+            loaded.single_cycle()
+        self.assert_same(streamed, loaded)
+
+    def test_basic_example(self):
+        streamed = stream_economy(BASIC_CONFIG)
+        loaded = create_economy(load_data_from_file(BASIC_CONFIG), vectorized=True)
+        self.assertTrue(isinstance(streamed.producers[0], Workers))
+        self.assertEqual(len(streamed.producers), 2)
+        self.assert_same(streamed, loaded)
+
+    def test_ids_follow_on(self):
+        streamed = stream_economy(BASIC_CONFIG)
+        loaded = create_economy(load_data_from_file(BASIC_CONFIG), vectorized=True)
+        # the ids are given out in the same order, so they differ by the same amount
+        self.assertEqual(np.diff(streamed.table.ids).tolist(), np.diff(loaded.table.ids).tolist())
+        self.assertEqual(len(set(streamed.table.ids.tolist()) & set(loaded.table.ids.tolist())), 0)
+
+    def test_producers_before_products(self):
+        config = large_config(10)
+        reordered = {'producers': config['producers'], 'workers': config['workers'],
+                     'products': config['products']}
+        self.write(reordered)
+        self.assert_same(stream_economy(self.filepath), create_economy(config, vectorized=True))
+
+    def test_unknown_stock_product(self):
+        config = large_config(20)
+        config['producers'][12]['stock']['wood'] = 1
+        self.write(config, indent=4)
+        with self.assertRaisesRegex(EconomyLoadError, r'producers\[12\]\.stock\.wood at line \d+'):
+            stream_economy(self.filepath)
+
+    def test_product_is_not_a_name(self):
+        config = large_config(20)
+        config['producers'][12]['product'] = ['food']
+        self.write(config, indent=4)
+        with open(self.filepath) as config_file:
+            line = config_file.read().split('\n').index('            "product": [') + 1
+        with self.assertRaisesRegex(EconomyLoadError, rf'producers\[12\]\.product at line {line - 1}, column 9'):
+            stream_economy(self.filepath)
+
+    def test_unknown_requirement(self):
+        config = large_config(2)
+        config['products'][2]['requires'].append({'water': 1})
+        self.write(config, indent=4)
+        with self.assertRaisesRegex(EconomyLoadError, r'products\[2\]\.requires\[1\]\.water at line 21'):
+            stream_economy(self.filepath)
+
+    def test_bad_values(self):
+        for change, message in [(lambda x: x['producers'][1].update(money='ten'), r'producers\[1\]\.money'),
+                                (lambda x: x['producers'][0].update(product='wood'), r'producers\[0\]\.product'),
+                                (lambda x: x['products'].append({'name': 'food'}), 'defined twice'),
+                                (lambda x: x['products'].pop(1), 'missing required product food'),
+                                (lambda x: x.pop('workers'), 'Missing workers')]:
+            config = large_config(3)
+            change(config)
+            self.write(config)
+            with self.assertRaisesRegex(EconomyLoadError, message):
+                stream_economy(self.filepath)
+
+    def test_missing_file(self):
+        with self.assertRaises(EconomyLoadError):
+            stream_economy(os.path.join(self.directory.name, 'missing.json'))
+
+
+class TestScenario(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filepath = os.path.join(self.directory.name, 'world.scn')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        original = create_economy(large_config(50), vectorized=True, engine=vector_auction)
+        for _ in range(3):
+            original.single_cycle()
+        save_scenario(original, self.filepath)
+        loaded = load_scenario(self.filepath, engine=vector_auction)
+        self.assertEqual([x.name for x in loaded.products], [x.name for x in original.products])
+        for name in TABLE_ARRAYS:
+            if name != 'ids':
+                np.testing.assert_array_equal(getattr(loaded.table, name), getattr(original.table, name))
+        for _ in range(3):
+            original.single_cycle()
+            loaded.single_cycle()
+        np.testing.assert_array_equal(loaded.table.money, original.table.money)
+        np.testing.assert_array_equal(loaded.table.stock, original.table.stock)
+
+    def test_file_is_not_changed(self):
+        economy = load_scenario_of(self.filepath, large_config(10))
+        money = economy.table.money.tolist()
+        economy.single_cycle()
+        self.assertNotEqual(economy.table.money.tolist(), money)
+        again = load_scenario(self.filepath)
+        self.assertEqual(again.table.money.tolist(), money)
+        self.assertNotEqual(economy.table.ids.tolist(), again.table.ids.tolist())
+
+    def test_plain_producers(self):
+        economy = create_economy(load_data_from_file(BASIC_CONFIG))
+        save_scenario(economy, self.filepath)
+        loaded = load_scenario(self.filepath)
+        self.assertEqual(loaded.table.money.tolist(), [x.money for x in economy.producers])
+
+    def test_not_a_scenario(self):
+        with open(self.filepath, 'wb') as scenario_file:
+            scenario_file.write(b'not a scenario at all')
+        with self.assertRaises(EconomyLoadError):
+            load_scenario(self.filepath)
+
+
+def load_scenario_of(filepath, config):
+    save_scenario(create_economy(config, vectorized=True), filepath)
+    return load_scenario(filepath)
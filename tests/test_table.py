@@ -0,0 +1,113 @@
+import unittest
+from pathlib import Path
+
+from economics.clearing import vector_auction
+from economics.economy import Economy
+from economics.loader import load_economy
+from economics.producer import Product, Producer, Workers
+from economics.table import ProducerTable
+
+BASIC_CONFIG = Path('../examples/basic.json')
+
+
+def make_world():
+    # a small world with a chain of requirements
+    labor = Product('labor')
+    food = Product('food', [labor.requirement(2)])
+    wood = Product('wood', [labor.requirement(1)])
+    chair = Product('chair', [wood.requirement(2), labor.requirement(1)])
+    products = [labor, food, wood, chair]
+    producers = [Workers(20.0, labor, food.id),
+                 Producer(food, 10.0, {labor.id: 6.0}),
+                 Producer(food, 12.0, {labor.id: 4.0}),
+                 Producer(wood, 5.0, {labor.id: 3.0}),
+                 Producer(chair, 5.0, {labor.id: 2.0, wood.id: 4.0})]
+    return products, producers
+
+
+class TestProducerTable(unittest.TestCase):
+    def setUp(self):
+        self.products, self.producers = make_world()
+        self.table = ProducerTable.from_producers(self.products, self.producers)
+
+    def test_rows(self):
+        self.assertEqual(len(self.table), 5)
+        self.assertTrue(isinstance(self.table.rows[0], Workers))
+        self.assertEqual(self.table.rows[1].money, 10.0)
+
+    def test_row_is_a_view(self):
+        row = self.table.rows[1]
+        row.money += 5.0
+        row.add_stock(self.products[0].id, 1.0)
+        self.assertEqual(self.table.money[1], 15.0)
+        self.assertEqual(self.table.stock[1, 0], 7.0)
+
+    def test_max_production(self):
+        production = self.table.get_max_production()
+        self.assertEqual(production.tolist(), [0.0, 3.0, 2.0, 3.0, 2.0])
+
+    def test_produce(self):
+        self.table.produce()
+        chair_maker = self.table.rows[4]
+        self.assertEqual(chair_maker.stock[self.products[3].id], 2.0)
+        self.assertEqual(chair_maker.stock[self.products[2].id], 0.0)
+        self.assertEqual(chair_maker.last_consumption, {self.products[2].id: 4.0, self.products[0].id: 2.0})
+
+    def test_orders_match_producers(self):
+        self.table.init_cycle()
+        self.table.produce()
+        for producer in self.producers:
+            producer.init_cycle()
+            producer.produce()
+        expected = [(x.seller.id, x.product_id, x.total_offered, x.cost_per_unit)
+                    for producer in self.producers for x in producer.get_sell_offers()]
+        offers = [(x.seller.id, x.product_id, x.total_offered, x.cost_per_unit) for x in self.table.sell_offers()]
+        self.assertEqual(offers, expected)
+        expected = sorted([(x.buyer.id, x.product_id, x.total_wanted, x.max_price)
+                           for producer in self.producers for x in producer.get_buy_orders()])
+        offers = sorted([(x.buyer.id, x.product_id, x.total_wanted, x.max_price) for x in self.table.buy_offers()])
+        self.assertEqual(offers, expected)
+
+
+class TestVectorizedEconomy(unittest.TestCase):
+    def compare(self, object_economy, table_economy, cycles):
+        for _ in range(cycles):
+            object_economy.single_cycle()
+            table_economy.single_cycle()
+        for producer, row in zip(object_economy.producers, table_economy.producers):
+            self.assertEqual(producer.money, row.money)
+            # the two economies have different product ids, so compare in product order
+            for object_product, table_product in zip(object_economy.products, table_economy.products):
+                self.assertEqual(producer.stock.get(object_product.id, 0.0), row.stock[table_product.id])
+
+    def test_basic_example(self):
+        self.compare(load_economy(BASIC_CONFIG), load_economy(BASIC_CONFIG, vectorized=True), 5)
+
+    def test_supply_chain(self):
+        products, producers = make_world()
+        object_economy = Economy(products, producers)
+        products, producers = make_world()
+        table_economy = Economy(products, producers, vectorized=True)
+        self.compare(object_economy, table_economy, 5)
+
+    def test_history_from_arrays(self):
+        object_economy = load_economy(BASIC_CONFIG, engine=vector_auction)
+        table_economy = load_economy(BASIC_CONFIG, vectorized=True, engine=vector_auction)
+        for _ in range(3):
+            object_economy.single_cycle()
+            table_economy.single_cycle()
+        # no row was made to run the cycles
+        self.assertEqual(table_economy.table.rows.views, {})
+        # the two economies have different product ids, so compare in product order
+        positions = {x.id: i for economy in [object_economy, table_economy] for i, x in enumerate(economy.products)}
+        for producer, row in zip(object_economy.producers, table_economy.producers):
+            self.assertEqual(len(row.cycle_history), len(producer.cycle_history))
+            for expected, cycle in zip(producer.cycle_history, row.cycle_history):
+                for name, fields in [('sell_offers', ['total_offered', 'cost_per_unit']),
+                                     ('buy_offers', ['total_wanted', 'max_price']),
+                                     ('auction_sales', ['quantity', 'asking_price', 'actual_price']),
+                                     ('auction_buys', ['quantity', 'offer_price', 'actual_price'])]:
+                    self.assertEqual([[positions[x.product_id]] + [getattr(x, y) for y in fields]
+                                      for x in getattr(cycle, name)],
+                                     [[positions[x.product_id]] + [getattr(x, y) for y in fields]
+                                      for x in getattr(expected, name)])
@@ -0,0 +1,212 @@
+import os
+import tempfile
+import tracemalloc
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from economics.economy import Economy
+from economics.history import History, CycleInfo, ProductCycleStats
+from economics.loader import load_economy
+from economics.reporting import show_average_price_graph
+from economics.tiers import Buckets, Retention
+
+BASIC_CONFIG = Path('../examples/basic.json')
+
+
+def price_of(cycle):
+    # a price that moves about, so every bucket has a different open, high, low and close
+    return 10.0 + (cycle * 7) % 11
+
+
+def stats(cycle, products=(1,)):
+    # the product is not traded in every fifth cycle
+    if cycle % 5 == 3:
+        return {}
+    price = price_of(cycle)
+    return {x: ProductCycleStats(price + 1, price - 1, price, 1.0 + cycle % 3, 0.5, 0.0) for x in products}
+
+
+def run_history(history, cycles, products=(1,)):
+    for cycle in range(cycles):
+        history.add_cycle(CycleInfo(stats(cycle, products), []))
+    return history
+
+
+class TestBuckets(unittest.TestCase):
+    def test_merge(self):
+        data = {'average_price': np.array([[2.0], [0.0], [5.0], [3.0]]),
+                'min_price': np.array([[1.0], [0.0], [4.0], [3.0]]),
+                'max_price': np.array([[3.0], [0.0], [6.0], [3.0]]),
+                'volume': np.array([[1.0], [0.0], [2.0], [1.0]]),
+                'unsold': np.array([[1.0], [1.0], [0.0], [0.0]]),
+                'unfilled_orders': np.zeros((4, 1))}
+        traded = np.array([[True], [False], [True], [True]])
+        merged = Buckets.from_cycles(10, data, traded).merge(4)
+        self.assertEqual(merged.first_cycle.tolist(), [10])
+        self.assertEqual(merged.cycles.tolist(), [4])
+        self.assertEqual([merged.fields[x][0, 0] for x in ['open', 'high', 'low', 'close', 'volume', 'traded']],
+                         [2.0, 6.0, 1.0, 3.0, 4.0, 3.0])
+        # the volume weighted price, and the volume and unsold per cycle
+        self.assertEqual(merged.values('average_price')[0, 0], 15.0 / 4)
+        self.assertEqual(merged.values('volume')[0, 0], 1.0)
+        self.assertEqual(merged.values('unsold')[0, 0], 0.5)
+
+    def test_untraded(self):
+        data = {x: np.zeros((2, 1)) for x in ['average_price', 'min_price', 'max_price', 'volume', 'unsold',
+                                               'unfilled_orders']}
+        merged = Buckets.from_cycles(0, data, np.zeros((2, 1), dtype=bool)).merge(2)
+        self.assertEqual(merged.values('average_price').tolist(), [[0.0]])
+        self.assertEqual(merged.fields['high'].tolist(), [[0.0]])
+
+
+class TestRetention(unittest.TestCase):
+    def test_sizes(self):
+        with self.assertRaises(ValueError):
+            Retention(sizes=(10, 15))
+        with self.assertRaises(ValueError):
+            Retention(sizes=())
+
+    def test_budget(self):
+        retention = Retention.from_budget(100000, 3)
+        self.assertGreater(retention.recent, 0)
+        with self.assertRaises(ValueError):
+            Retention.from_budget(100, 3)
+
+    def test_either_max_cycles_or_retention(self):
+        with self.assertRaises(ValueError):
+            History(max_cycles=10, retention=Retention())
+
+
+class TestTieredHistory(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def retention(self, directory=None):
+        return Retention(recent=20, sizes=(5, 20), buckets=4, directory=directory, flush=10)
+
+    def test_last_is_unchanged(self):
+        tiered = run_history(History(retention=self.retention()), 500)
+        plain = run_history(History(), 500)
+        self.assertEqual(tiered.total_cycles, 500)
+        self.assertEqual(tiered.get_last_price(1), plain.get_last_price(1))
+        self.assertEqual(tiered.get_last_volume(1), plain.get_last_volume(1))
+        self.assertEqual(tiered.series(1, 'average_price', last=20).tolist(),
+                         plain.series(1, 'average_price', last=20).tolist())
+        self.assertEqual(tiered.rolling(1).vwap, plain.rolling(1).vwap)
+
+    def test_full_series(self):
+        history = run_history(History(retention=self.retention(self.directory.name)), 500)
+        plain = run_history(History(), 500)
+        cycles, prices = history.full_series(1, 'average_price')
+        self.assertEqual(cycles[0], 0)
+        self.assertEqual(cycles[-1], 499)
+        self.assertTrue((np.diff(cycles) > 0).all())
+        # every value is the volume weighted price of its bucket
+        ends = np.append(cycles[1:], 500)
+        price = plain.series(1, 'average_price')
+        volume = plain.series(1, 'volume')
+        # a single cycle with no trade has no price
+        expected = [(price[x:y] * volume[x:y]).sum() / max(volume[x:y].sum(), 1.0) for x, y in zip(cycles, ends)]
+        np.testing.assert_allclose(prices, expected)
+        _, volumes = history.full_series(1, 'volume')
+        np.testing.assert_allclose(volumes, [volume[x:y].mean() for x, y in zip(cycles, ends)])
+        # the last cycles are in full
+        self.assertEqual(prices[-20:].tolist(), price[-20:].tolist())
+        self.assertGreater(len(os.listdir(self.directory.name)), 0)
+
+    def test_ohlc(self):
+        history = run_history(History(retention=self.retention(self.directory.name)), 500)
+        buckets = history.ohlc(1, 20)
+        self.assertEqual(buckets['cycle'].tolist()[:3], [0, 20, 40])
+        first = [price_of(x) for x in range(20) if x % 5 != 3]
+        self.assertEqual(buckets['open'][0], first[0])
+        self.assertEqual(buckets['close'][0], first[-1])
+        self.assertEqual(buckets['high'][0], max(first) + 1)
+        self.assertEqual(buckets['low'][0], min(first) - 1)
+        self.assertEqual(buckets['volume'][0], sum([1.0 + x % 3 for x in range(20) if x % 5 != 3]))
+        with self.assertRaises(ValueError):
+            history.ohlc(1, 7)
+        with self.assertRaises(ValueError):
+            History().ohlc(1, 20)
+
+    def test_dropped_without_a_directory(self):
+        history = run_history(History(retention=self.retention()), 500)
+        cycles, _ = history.full_series(1, 'average_price')
+        self.assertGreater(cycles[0], 0)
+        self.assertEqual(history.tiers.dropped_cycles, cycles[0])
+
+    def test_new_products(self):
+        history = History(retention=self.retention(self.directory.name))
+        for cycle in range(300):
+            history.add_cycle(CycleInfo(stats(cycle, (1,) if cycle < 150 else range(1, 7)), []))
+        cycles, volumes = history.full_series(6, 'volume')
+        self.assertEqual(len(cycles), len(history.full_series(1, 'volume')[0]))
+        self.assertEqual(volumes[cycles < 140].tolist(), [0.0] * int((cycles < 140).sum()))
+        self.assertGreater(volumes[-1], 0)
+
+    def test_memory_budget(self):
+        budget = 40000
+        history = History(retention=Retention.from_budget(budget, 2))
+        run_history(history, 20000, (1, 2))
+        self.assertLessEqual(history.memory_bytes(), budget)
+        self.assertGreater(history.tiers.dropped_cycles, 0)
+
+    def test_real_memory(self):
+        # all that the history holds, as counted by python, and not only its arrays
+        budget = 200000
+        tracemalloc.start()
+        try:
+            start = tracemalloc.get_traced_memory()[0]
+            history = History(retention=Retention.from_budget(budget, 2))
+            run_history(history, 4000, (1, 2))
+            held = tracemalloc.get_traced_memory()[0] - start
+            run_history(history, 4000, (1, 2))
+            later = tracemalloc.get_traced_memory()[0] - start
+        finally:
+            tracemalloc.stop()
+        self.assertLessEqual(held, budget)
+        # a longer run holds no more
+        self.assertLessEqual(later, held + 1000)
+
+
+class TestTieredEconomy(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        retention = Retention(recent=30, sizes=(10, 100), buckets=5, directory=self.directory.name, flush=20)
+        self.economy = load_economy(BASIC_CONFIG, history=History(retention=retention))
+        self.food = self.economy.products[1].id
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_checkpoint(self):
+        self.economy.run(1234)
+        filepath = os.path.join(self.directory.name, 'state.npz')
+        self.economy.save_checkpoint(filepath)
+        restored = Economy.load_checkpoint(filepath)
+        for economy in [self.economy, restored]:
+            economy.run(100)
+        for field in ['average_price', 'volume']:
+            first = self.economy.history.full_series(self.food, field)
+            second = restored.history.full_series(self.food, field)
+            self.assertEqual(first[0].tolist(), second[0].tolist())
+            self.assertEqual(first[1].tolist(), second[1].tolist())
+
+    def test_fast_forward(self):
+        report = self.economy.run(100000, fast_forward=True)
+        self.assertGreater(report.skipped, 0)
+        cycles, prices = self.economy.history.full_series(self.food, 'average_price')
+        self.assertEqual((cycles[0], cycles[-1]), (0, 99999))
+        self.assertAlmostEqual(prices[-1], self.economy.history.get_last_price(self.food))
+        self.assertAlmostEqual(prices[-50], prices[-1])
+
+    def test_graph(self):
+        self.economy.run(500)
+        filepath = os.path.join(self.directory.name, 'prices.png')
+        show_average_price_graph(self.economy, filepath, points=50)
+        self.assertTrue(os.path.exists(filepath))